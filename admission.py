@@ -0,0 +1,211 @@
+"""
+Admission Control
+
+This module limits how many tool calls the MCP server executes at once. Calls over
+the limit wait in a bounded queue ordered by priority class, so interactive
+questions are admitted ahead of batch work such as exports, and one slot is kept
+free of batch work. Once the queue is full, or a call has waited too long, it is
+rejected straight away with a hint of when to retry instead of piling up.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+# Lower rank is admitted first
+PRIORITIES = {INTERACTIVE: 0, BATCH: 1}
+
+# Recent wait times kept per class for the percentiles in stats()
+_WAIT_SAMPLES = 1000
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call cannot be queued or waited past the queue timeout."""
+
+    def __init__(self, message: str, retry_after_ms: int):
+        super().__init__(message)
+        self.retry_after_ms = retry_after_ms
+
+
+class _Waiter:
+    def __init__(self, priority: str, future: "asyncio.Future[None]"):
+        self.priority = priority
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class AdmissionController:
+    """Concurrency limit plus priority wait queue for one event loop."""
+
+    def __init__(
+        self,
+        max_concurrent: int = 4,
+        max_queue: int = 64,
+        queue_timeout_ms: Optional[int] = 30_000,
+        batch_slots: Optional[int] = None,
+    ):
+        """
+        Args:
+            max_concurrent: Calls executing at the same time
+            max_queue: Calls allowed to wait; further calls are rejected immediately
+            queue_timeout_ms: Longest wait before a queued call is rejected (None waits forever)
+            batch_slots: Executing slots batch calls may occupy; defaults to all but one,
+                so an interactive call never waits behind batch work alone
+        """
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout_ms = queue_timeout_ms
+        self.batch_slots = batch_slots if batch_slots is not None else max(1, max_concurrent - 1)
+
+        self._active = {INTERACTIVE: 0, BATCH: 0}
+        self._queue: List[Tuple[int, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        # Smoothed execution time, used for retry hints
+        self._service_ms = 100.0
+
+        self.admitted = {INTERACTIVE: 0, BATCH: 0}
+        self.rejected = {INTERACTIVE: 0, BATCH: 0}
+        self.timed_out = {INTERACTIVE: 0, BATCH: 0}
+        self.peak_queue_depth = 0
+        self._waits: Dict[str, Deque[float]] = {
+            INTERACTIVE: deque(maxlen=_WAIT_SAMPLES),
+            BATCH: deque(maxlen=_WAIT_SAMPLES),
+        }
+
+    def _can_run(self, priority: str) -> bool:
+        if sum(self._active.values()) >= self.max_concurrent:
+            return False
+        return priority != BATCH or self._active[BATCH] < self.batch_slots
+
+    def _queued(self) -> int:
+        return sum(1 for _, _, waiter in self._queue if not waiter.future.done())
+
+    def retry_after_ms(self) -> int:
+        """Estimate how long until a new call would likely be admitted."""
+        backlog = self._queued() + 1
+        return max(50, int(self._service_ms * backlog / self.max_concurrent))
+
+    def _start(self, priority: str, waited: float):
+        self._active[priority] += 1
+        self.admitted[priority] += 1
+        self._waits[priority].append(waited * 1000)
+
+    def _wake(self):
+        """Admit queued calls while slots are free, best priority first."""
+        skipped = []
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            waiter = entry[2]
+            if waiter.future.done():
+                # Cancelled or timed out while waiting
+                continue
+            if not self._can_run(waiter.priority):
+                skipped.append(entry)
+                if sum(self._active.values()) >= self.max_concurrent:
+                    break
+                # Batch slots are used up; an interactive call further back may still run
+                continue
+            self._start(waiter.priority, time.monotonic() - waiter.enqueued)
+            waiter.future.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+
+    @asynccontextmanager
+    async def admit(self, priority: str = INTERACTIVE):
+        """
+        Hold an execution slot for the duration of the block.
+
+        Raises:
+            AdmissionRejected: The queue is full or the call waited past queue_timeout_ms
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority class: {priority}")
+
+        # Queued calls are woken whenever a slot frees up, so any call still waiting
+        # cannot use the free slot this one fits into
+        if self._can_run(priority):
+            self._start(priority, 0.0)
+        else:
+            if self._queued() >= self.max_queue:
+                self.rejected[priority] += 1
+                raise AdmissionRejected("Server busy: request queue is full", self.retry_after_ms())
+
+            waiter = _Waiter(priority, asyncio.get_running_loop().create_future())
+            heapq.heappush(self._queue, (PRIORITIES[priority], next(self._sequence), waiter))
+            self.peak_queue_depth = max(self.peak_queue_depth, self._queued())
+            timeout = self.queue_timeout_ms / 1000 if self.queue_timeout_ms else None
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+            except asyncio.TimeoutError:
+                if not waiter.future.done():
+                    waiter.future.cancel()
+                    self.timed_out[priority] += 1
+                    raise AdmissionRejected(
+                        f"Server busy: waited {self.queue_timeout_ms} ms for an execution slot",
+                        self.retry_after_ms(),
+                    )
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # Admitted just as the caller gave up; hand the slot on
+                    self._finish(priority, None)
+                else:
+                    waiter.future.cancel()
+                raise
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._finish(priority, time.monotonic() - started)
+
+    def _finish(self, priority: str, elapsed: Optional[float]):
+        self._active[priority] -= 1
+        if elapsed is not None:
+            self._service_ms = 0.8 * self._service_ms + 0.2 * elapsed * 1000
+        self._wake()
+
+    def _wait_stats(self, priority: str) -> Dict[str, Any]:
+        waits = sorted(self._waits[priority])
+        if not waits:
+            return {"avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        return {
+            "avg_ms": round(sum(waits) / len(waits), 3),
+            "p95_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3),
+            "max_ms": round(waits[-1], 3),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, slot usage and wait-time metrics per priority class."""
+        queued = {INTERACTIVE: 0, BATCH: 0}
+        for _, _, waiter in self._queue:
+            if not waiter.future.done():
+                queued[waiter.priority] += 1
+        return {
+            "max_concurrent": self.max_concurrent,
+            "batch_slots": self.batch_slots,
+            "max_queue": self.max_queue,
+            "queue_depth": sum(queued.values()),
+            "peak_queue_depth": self.peak_queue_depth,
+            "avg_service_ms": round(self._service_ms, 3),
+            "classes": {
+                priority: {
+                    "active": self._active[priority],
+                    "queued": queued[priority],
+                    "admitted": self.admitted[priority],
+                    "rejected": self.rejected[priority],
+                    "timed_out": self.timed_out[priority],
+                    "wait": self._wait_stats(priority),
+                }
+                for priority in PRIORITIES
+            },
+        }
@@ -1,17 +1,23 @@
+import atexit
 import os
-from typing import TypedDict
+from typing import Any, Dict, List, Optional, TypedDict
+import pandas as pd
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langgraph.graph import StateGraph, END
 from dotenv import load_dotenv
+from column_stats import format_stats
 from mcp_client import SyncDatabaseMCPClient
+from query_plan import format_plan
 from sql_optimizer import SQLOptimizer
 
 # Load environment variables
 load_dotenv()
 
-# MCP Client setup
-mcp_client = SyncDatabaseMCPClient()
+# MCP Client setup: one server session for all questions, so the connection pool, result cache and
+# column statistics stay warm between them
+mcp_client = SyncDatabaseMCPClient(keep_alive=True)
+atexit.register(mcp_client.close)
 
 # Optimizer
 sql_optimizer = SQLOptimizer()
@@ -23,11 +29,18 @@ llm = ChatOpenAI(model="gpt-4-turbo", temperature=0)
 class AgentState(TypedDict):
     question: str
     db_schema: str
+    table_samples: str
+    column_stats: str
     sql_query: str
     optimized_query: str
     optimization_details: str
+    query_plan: str
     query_analysis: str
+    query_profiles: List[Dict[str, Any]]
+    profile: bool
     result: str
+    result_frame: Optional[pd.DataFrame]
+    result_notice: str
     error: str
 
 def get_schema_node(state: AgentState) -> AgentState:
@@ -39,6 +52,27 @@ def get_schema_node(state: AgentState) -> AgentState:
     except Exception as e:
         state["error"] = f"Error getting schema via MCP: {str(e)}"
         print(f"❌ Error getting schema via MCP: {str(e)}")
+        return state
+    
+    # Real example values keep generated literals (case, date format) matching the data;
+    # generation still works without them
+    try:
+        samples = mcp_client.sample_tables(rows=3)
+        state["table_samples"] = "\n\n".join(
+            f"Table: {table}\n{rows}" for table, rows in samples.items()
+        )
+        print("✅ Table samples retrieved via MCP")
+    except Exception as e:
+        state["table_samples"] = ""
+        print(f"⚠️ Error sampling tables via MCP: {str(e)}")
+    
+    # Computed in the background on the shared session; only the first question waits for it
+    try:
+        state["column_stats"] = format_stats(mcp_client.column_stats()["tables"])
+        print("✅ Column statistics retrieved via MCP")
+    except Exception as e:
+        state["column_stats"] = ""
+        print(f"⚠️ Error getting column statistics via MCP: {str(e)}")
     
     return state
 
@@ -55,15 +89,24 @@ def generate_sql_node(state: AgentState) -> AgentState:
             3. Return only the SQL query, no explanations
             4. Use appropriate JOINs when needed
             5. Handle aggregations properly
+            6. Write literal values the way they appear in the sample rows (case, spelling, date format)
             
             Database Schema:
-            {db_schema}"""),
+            {db_schema}
+            
+            Sample Rows:
+            {table_samples}
+            
+            Column Statistics:
+            {column_stats}"""),
             ("human", "Question: {question}")
         ])
         
         chain = prompt_template | llm
         response = chain.invoke({
             "db_schema": state["db_schema"],
+            "table_samples": state.get("table_samples", ""),
+            "column_stats": state.get("column_stats", ""),
             "question": state["question"]
         })
         
@@ -93,13 +136,24 @@ def optimize_sql_node(state: AgentState) -> AgentState:
         if state.get("error") or not state.get("sql_query"):
             return state
 
+        # Ground the optimizer in SQLite's actual plan rather than the SQL text alone
+        try:
+            plan = format_plan(mcp_client.explain_query(state["sql_query"]))
+        except RuntimeError:
+            plan = ""
+        state["query_plan"] = plan
+
         optimization_result = sql_optimizer.optimize_query(
             state["sql_query"],
-            state.get("db_schema", "")
+            state.get("db_schema", ""),
+            plan,
+            state.get("column_stats", "")
         )
         analysis_result = sql_optimizer.analyze_query(
             state["sql_query"],
-            state.get("db_schema", "")
+            state.get("db_schema", ""),
+            plan,
+            state.get("column_stats", "")
         )
 
         state["optimized_query"] = optimization_result.get("optimized_query", state["sql_query"])
@@ -112,6 +166,32 @@ def optimize_sql_node(state: AgentState) -> AgentState:
     
     return state
 
+def profile_sql_node(state: AgentState) -> AgentState:
+    """Measure the original and optimized queries on the server, if state["profile"] asks for it."""
+    try:
+        # Each profile executes the query, so only on request and only once per query
+        if state.get("error") or not state.get("sql_query") or not state.get("profile"):
+            return state
+
+        queries = [state["sql_query"]]
+        optimized = state.get("optimized_query")
+        if optimized and optimized != state["sql_query"]:
+            queries.append(optimized)
+        profiles = mcp_client.profile_queries(queries, runs=1)
+        for label, profile in zip(("original", "optimized"), profiles):
+            profile["label"] = label
+        state["query_profiles"] = profiles
+
+        # Never run an optimized query that fails where the original works
+        if len(profiles) == 2 and "error" in profiles[1] and "error" not in profiles[0]:
+            state["optimized_query"] = state["sql_query"]
+        print("✅ Queries profiled via MCP")
+
+    except Exception as e:
+        print(f"❌ Error profiling SQL via MCP: {str(e)}")
+    
+    return state
+
 def execute_sql_node(state: AgentState) -> AgentState:
     """Execute the SQL query using MCP client."""
     try:
@@ -120,8 +200,26 @@ def execute_sql_node(state: AgentState) -> AgentState:
         
         # Use optimized query if available and different
         query_to_run = state.get("optimized_query") or state.get("sql_query", "")
-        result = mcp_client.query_database(query_to_run)
-        state["result"] = result
+        try:
+            # Columnar results become a DataFrame without a text round-trip
+            frame = mcp_client.query_dataframe(query_to_run)
+        except RuntimeError as e:
+            if query_to_run != state.get("sql_query"):
+                # Never fail with an optimized query where the original may work
+                state["optimized_query"] = state["sql_query"]
+                return execute_sql_node(state)
+            # Database errors are reported as the result text
+            state["result"] = str(e)
+        else:
+            state["result_frame"] = frame
+            state["result"] = frame.to_string(index=False) if not frame.empty else "No results found."
+            # The server cuts results at its row and byte budgets
+            if frame.attrs.get("truncated"):
+                state["result_notice"] = (
+                    f"Showing the first {len(frame)} rows; the full result exceeds the server's result limit. "
+                    "Refine the question (filters, aggregation) to see everything."
+                )
+                state["result"] += f"\n\n[{state['result_notice']}]"
         print(f"✅ Query executed successfully via MCP")
         
     except Exception as e:
@@ -139,13 +237,15 @@ def create_graph():
     workflow.add_node("get_schema", get_schema_node)
     workflow.add_node("generate_sql", generate_sql_node)
     workflow.add_node("optimize_sql", optimize_sql_node)
+    workflow.add_node("profile_sql", profile_sql_node)
     workflow.add_node("execute_sql", execute_sql_node)
     
     # Define edges
     workflow.set_entry_point("get_schema")
     workflow.add_edge("get_schema", "generate_sql")
     workflow.add_edge("generate_sql", "optimize_sql")
-    workflow.add_edge("optimize_sql", "execute_sql")
+    workflow.add_edge("optimize_sql", "profile_sql")
+    workflow.add_edge("profile_sql", "execute_sql")
     workflow.add_edge("execute_sql", END)
     
     # Compile the graph
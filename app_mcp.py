@@ -26,6 +26,11 @@ with st.sidebar:
         index=1,
         help="Original uses direct database access, MCP-based uses Model Context Protocol server"
     )
+    profile_queries = st.checkbox(
+        "⏱️ Measure original vs optimized SQL",
+        value=False,
+        help="Runs each query once more on the server before the result is fetched, so answers take longer"
+    )
     
     st.header("ℹ️ About")
     if agent_version == "MCP-based":
@@ -118,11 +123,18 @@ if st.button("🚀 Generate & Optimize SQL", type="primary"):
                 initial_state = {
                     "question": user_question,
                     "db_schema": "",
+                    "table_samples": "",
+                    "column_stats": "",
                     "sql_query": "",
                     "optimized_query": "",
                     "optimization_details": "",
+                    "query_plan": "",
                     "query_analysis": "",
+                    "query_profiles": [],
+                    "profile": profile_queries,
                     "result": "",
+                    "result_frame": None,
+                    "result_notice": "",
                     "error": ""
                 }
                 
@@ -153,8 +165,13 @@ if st.button("🚀 Generate & Optimize SQL", type="primary"):
 
                 with tab2:
                     st.subheader("Query Result")
+                    result_frame = result.get("result_frame")
                     if result.get("error"):
                         st.error(f"❌ Error: {result['error']}")
+                    elif result_frame is not None and not result_frame.empty:
+                        if result.get("result_notice"):
+                            st.warning(f"⚠️ {result['result_notice']}")
+                        st.dataframe(result_frame, use_container_width=True)
                     elif result.get("result"):
                         result_text = result["result"]
                         if result_text and not result_text.startswith("Error"):
@@ -166,6 +183,16 @@ if st.button("🚀 Generate & Optimize SQL", type="primary"):
 
                 with tab3:
                     st.subheader("Optimization Analysis")
+                    if result.get("query_profiles"):
+                        st.markdown("**⏱️ Measured Performance**")
+                        profiles = pd.DataFrame(result["query_profiles"]).set_index("label")
+                        st.dataframe(
+                            profiles.drop(columns=["query", "wall_ms_all"], errors="ignore"),
+                            use_container_width=True
+                        )
+                    if result.get("query_plan"):
+                        st.markdown("**🗺️ Query Plan**")
+                        st.code(result["query_plan"], language='text')
                     if result.get("query_analysis"):
                         st.markdown("**🔬 Query Analysis**")
                         st.write(result["query_analysis"])
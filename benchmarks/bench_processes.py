@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Process Query Pool Benchmark
+
+Runs an aggregate-heavy query_database workload from concurrent asyncio tasks in
+the two ways the MCP server can execute it and reports throughput:
+
+- threads: QueryExecutor, worker threads sharing one Python process (and its GIL)
+- processes: ProcessQueryPool, one worker process per connection
+
+Both execute the query and format the full result as text, as query_database
+does. Throughput with processes should grow with --workers up to the number of
+cores; with threads it stays near one core's worth.
+
+Usage:
+    python benchmarks/bench_processes.py [--rows 200000] [--workers 1 2 4] [--seconds 5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_read_only import create_database
+from db_pool import DEFAULT_PROFILE, QueryExecutor, QueryGuard, SQLiteConnectionPool, engine_pragmas
+from process_pool import ProcessQueryPool
+from result_formats import execute_formatted
+
+# Aggregate over the join that returns many rows to format
+QUERY = """
+SELECT s.sale_date, p.category, s.region, COUNT(*) AS sales, SUM(s.quantity * p.price) AS revenue
+FROM sales AS s JOIN products AS p ON p.product_id = s.product_id
+GROUP BY s.sale_date, p.category, s.region
+"""
+MAX_ROWS = 100_000
+MAX_BYTES = 64 * 1024 * 1024
+
+
+async def drive(run, concurrency: int, seconds: float) -> float:
+    """Keep concurrency calls of run() in flight for seconds; return calls per second."""
+    deadline = time.monotonic() + seconds
+    completed = 0
+
+    async def client():
+        nonlocal completed
+        while time.monotonic() < deadline:
+            await run()
+            completed += 1
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return completed / seconds
+
+
+async def bench_threads(path: str, pragmas: dict, workers: int, seconds: float) -> float:
+    pool = SQLiteConnectionPool(path, size=workers, pragmas=pragmas, read_only=True)
+    executor = QueryExecutor(pool, max_workers=workers)
+
+    async def run():
+        await executor.run(execute_formatted, QUERY, (), "text", MAX_ROWS, MAX_BYTES)
+
+    try:
+        return await drive(run, workers, seconds)
+    finally:
+        executor.shutdown()
+        pool.close()
+
+
+async def bench_processes(path: str, pragmas: dict, workers: int, seconds: float) -> float:
+    processes = ProcessQueryPool(path, workers, pragmas=pragmas)
+    # Spawned workers import the server modules; keep that out of the measurement
+    await asyncio.gather(*(
+        processes.run("SELECT 1", (), 1, 1024, "text", QueryGuard(None)) for _ in range(workers)
+    ))
+
+    async def run():
+        await processes.run(QUERY, (), MAX_ROWS, MAX_BYTES, "text", QueryGuard(None))
+
+    try:
+        return await drive(run, workers, seconds)
+    finally:
+        processes.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        create_database(path, args.rows)
+        pragmas = engine_pragmas(**DEFAULT_PROFILE, read_only=True)
+
+        print(f"{args.rows} sales rows, {os.cpu_count()} CPUs, {args.seconds:.0f}s per run")
+        print(f"{'workers':>8} {'threads q/s':>12} {'processes q/s':>14}")
+        for workers in args.workers:
+            threads = asyncio.run(bench_threads(path, pragmas, workers, args.seconds))
+            processes = asyncio.run(bench_processes(path, pragmas, workers, args.seconds))
+            print(f"{workers:>8} {threads:>12.1f} {processes:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Read-Only Mode Concurrency Benchmark
+
+Runs several reader processes against the same database file in each connection
+mode the MCP server supports and reports aggregate query throughput:
+
+- read-write: plain sqlite3.connect, as the server did originally
+- read-only: URI mode=ro plus PRAGMA query_only
+- immutable: mode=ro&immutable=1, no locking at all (run against a snapshot copy)
+
+With --writer, a separate process commits small insert transactions throughout the
+read-write and read-only runs, which shows how much lock contention readers see.
+An immutable snapshot is by definition not written to, so it runs without one.
+
+Usage:
+    python benchmarks/bench_read_only.py [--rows 200000] [--readers 4] [--seconds 5] [--writer]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_pool import SQLiteConnectionPool
+
+QUERY = """
+SELECT p.category, s.region, SUM(s.quantity * p.price) AS revenue
+FROM sales AS s JOIN products AS p ON p.product_id = s.product_id
+WHERE s.sale_date >= ?
+GROUP BY p.category, s.region
+"""
+
+MODES = {
+    "read-write": {},
+    "read-only": {"read_only": True},
+    "immutable": {"immutable": True},
+}
+
+
+def create_database(path: str, rows: int):
+    """Create a sales database with the sample products and rows random sales."""
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE products (product_id INTEGER PRIMARY KEY, name TEXT NOT NULL,
+                               category TEXT NOT NULL, price REAL NOT NULL);
+        CREATE TABLE sales (sale_id INTEGER PRIMARY KEY, product_id INTEGER, quantity INTEGER NOT NULL,
+                            sale_date TEXT NOT NULL, region TEXT NOT NULL,
+                            FOREIGN KEY (product_id) REFERENCES products (product_id));
+        """
+    )
+    conn.executemany(
+        "INSERT INTO products VALUES (?, ?, ?, ?)",
+        [
+            (1, "Laptop", "Electronics", 999.99),
+            (2, "Mouse", "Electronics", 29.99),
+            (3, "Keyboard", "Electronics", 79.99),
+            (4, "Monitor", "Electronics", 299.99),
+            (5, "Office Chair", "Furniture", 199.99),
+            (6, "Desk", "Furniture", 349.99),
+            (7, "Notebook", "Stationery", 4.99),
+        ],
+    )
+    rng = random.Random(42)
+    regions = ["North", "South", "East", "West"]
+    conn.executemany(
+        "INSERT INTO sales (product_id, quantity, sale_date, region) VALUES (?, ?, ?, ?)",
+        (
+            (
+                rng.randint(1, 7),
+                rng.randint(1, 10),
+                f"2023-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                rng.choice(regions),
+            )
+            for _ in range(rows)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def reader(path: str, options: dict, seconds: float, results):
+    """Run QUERY in a loop on a pooled connection and report the count."""
+    pool = SQLiteConnectionPool(path, size=1, **options)
+    queries = 0
+    busy = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            with pool.connection() as conn:
+                conn.execute(QUERY, ("2023-06-01",)).fetchall()
+            queries += 1
+        except sqlite3.OperationalError:
+            busy += 1
+    pool.close()
+    results.put((queries, busy))
+
+
+def writer(path: str, stop):
+    """Commit small insert transactions until told to stop."""
+    conn = sqlite3.connect(path, timeout=30)
+    while not stop.is_set():
+        conn.execute(
+            "INSERT INTO sales (product_id, quantity, sale_date, region) VALUES (1, 1, '2023-12-31', 'North')"
+        )
+        conn.commit()
+        time.sleep(0.005)
+    conn.close()
+
+
+def run_mode(path: str, options: dict, readers: int, seconds: float, with_writer: bool):
+    """Return (queries per second, busy errors) for one mode."""
+    results = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    writer_process = None
+    if with_writer:
+        writer_process = multiprocessing.Process(target=writer, args=(path, stop))
+        writer_process.start()
+
+    processes = [
+        multiprocessing.Process(target=reader, args=(path, options, seconds, results))
+        for _ in range(readers)
+    ]
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    if writer_process is not None:
+        stop.set()
+        writer_process.join()
+
+    queries = sum(result[0] for result in totals)
+    busy = sum(result[1] for result in totals)
+    return queries / seconds, busy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--writer", action="store_true", help="Run a concurrent writer in the mutable modes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        create_database(path, args.rows)
+        snapshot = os.path.join(tmp, "snapshot.db")
+        shutil.copyfile(path, snapshot)
+
+        print(f"{args.readers} readers, {args.rows} sales rows, {args.seconds:.0f}s per mode, "
+              f"writer {'on' if args.writer else 'off'}")
+        print(f"{'mode':>12} {'queries/s':>11} {'busy errors':>12}")
+        for mode, options in MODES.items():
+            immutable = options.get("immutable", False)
+            qps, busy = run_mode(
+                snapshot if immutable else path,
+                options,
+                args.readers,
+                args.seconds,
+                args.writer and not immutable,
+            )
+            print(f"{mode:>12} {qps:>11.1f} {busy:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+In-Memory Replica Benchmark
+
+Runs the same queries from several threads against pooled connections in the two
+ways the MCP server can read the database and reports throughput and latency:
+
+- file: read-only connections to the database file (mmap and page cache settings
+  of the default engine profile)
+- replica: connections to a MemoryReplica, a shared-cache in-memory copy loaded
+  with the backup API
+
+Each mode runs an aggregate over a join (long, CPU-bound) and a point lookup by
+key (short, dominated by per-statement overhead). The replica's load time and
+size are reported as well, since every refresh pays them again.
+
+Usage:
+    python benchmarks/bench_replica.py [--rows 200000] [--threads 4] [--seconds 5]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_read_only import QUERY as AGGREGATE, create_database
+from db_pool import DEFAULT_PROFILE, SQLiteConnectionPool, engine_pragmas
+from replica import MemoryReplica
+
+LOOKUP = "SELECT s.sale_id, s.quantity, p.name FROM sales AS s JOIN products AS p USING (product_id) WHERE s.sale_id = ?"
+
+
+def run_queries(pool: SQLiteConnectionPool, rows: int, threads: int, seconds: float):
+    """Return {query kind: (queries per second, p50 ms, p95 ms)} for threads running each kind in turn."""
+    kinds = {
+        "aggregate": lambda conn, rng: conn.execute(AGGREGATE, ("2023-06-01",)).fetchall(),
+        "lookup": lambda conn, rng: conn.execute(LOOKUP, (rng.randint(1, rows),)).fetchall(),
+    }
+    results = {}
+    for kind, run in kinds.items():
+        latencies = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + seconds
+
+        def worker(seed: int):
+            rng = random.Random(seed)
+            local = []
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                with pool.connection() as conn:
+                    run(conn, rng)
+                local.append((time.perf_counter() - started) * 1000)
+            with lock:
+                latencies.extend(local)
+
+        workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        latencies.sort()
+        results[kind] = (
+            len(latencies) / seconds,
+            statistics.median(latencies),
+            latencies[int(len(latencies) * 0.95)],
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        create_database(path, args.rows)
+        pragmas = engine_pragmas(**DEFAULT_PROFILE, read_only=True)
+
+        started = time.monotonic()
+        replica = MemoryReplica(path)
+        replica.refresh(force=True)
+        load_ms = (time.monotonic() - started) * 1000
+        print(f"{args.threads} threads, {args.rows} sales rows, {args.seconds:.0f}s per query kind")
+        print(f"replica: {replica.bytes / 1024 / 1024:.1f} MiB loaded in {load_ms:.0f} ms")
+
+        pools = {
+            "file": SQLiteConnectionPool(path, size=args.threads, pragmas=pragmas, read_only=True),
+            "replica": SQLiteConnectionPool(
+                path, size=args.threads, pragmas=pragmas, read_only=True, target=replica.target
+            ),
+        }
+        print(f"{'mode':>8} {'query':>10} {'queries/s':>11} {'p50 ms':>9} {'p95 ms':>9}")
+        for mode, pool in pools.items():
+            for kind, (qps, p50, p95) in run_queries(pool, args.rows, args.threads, args.seconds).items():
+                print(f"{mode:>8} {kind:>10} {qps:>11.1f} {p50:>9.3f} {p95:>9.3f}")
+            pool.close()
+        replica.close()
+
+
+if __name__ == "__main__":
+    main()
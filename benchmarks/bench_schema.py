@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Schema Introspection Benchmark
+
+Compares the single-statement schema query used by get_schema against per-table
+PRAGMA calls, on databases with a growing number of tables:
+
+- columns only: the previous get_schema (PRAGMA table_info per table)
+- per-table full: the same information as get_schema now reports (columns, indexes
+  and foreign keys) gathered with one PRAGMA call per table and index
+- single-pass: describe_schema, one statement over the pragma table-valued functions
+
+Usage:
+    python benchmarks/bench_schema.py [--tables 10 100 1000 5000] [--repeat 5]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcp_server import describe_schema
+
+
+def create_database(path: str, table_count: int):
+    """Create a database with table_count tables, each with an index and a foreign key."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE parent (id INTEGER PRIMARY KEY, name TEXT)")
+    for i in range(table_count):
+        conn.execute(
+            f"CREATE TABLE t{i} (id INTEGER PRIMARY KEY, parent_id INTEGER REFERENCES parent(id), "
+            f"label TEXT NOT NULL, amount REAL, created TEXT)"
+        )
+        conn.execute(f"CREATE INDEX t{i}_created ON t{i} (created)")
+    conn.commit()
+    conn.close()
+
+
+def describe_schema_per_table(conn: sqlite3.Connection) -> str:
+    """The previous N+1 introspection: list tables, then PRAGMA table_info for each."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+    schema_info = []
+    for (table_name,) in cursor.fetchall():
+        schema_info.append(f"\nTable: {table_name}")
+        cursor.execute(f"PRAGMA table_info({table_name});")
+        for column in cursor.fetchall():
+            is_nullable = "NOT NULL" if column[3] else "NULL"
+            is_pk = "PRIMARY KEY" if column[5] else ""
+            schema_info.append(f"  - {column[1]} ({column[2]}) {is_nullable} {is_pk}".strip())
+    return "\n".join(schema_info)
+
+
+def describe_schema_per_table_full(conn: sqlite3.Connection) -> int:
+    """Columns, indexes and foreign keys with PRAGMA calls per table and per index."""
+    cursor = conn.cursor()
+    rows = 0
+    for (table_name,) in cursor.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall():
+        rows += len(cursor.execute(f"PRAGMA table_info({table_name})").fetchall())
+        for index in cursor.execute(f"PRAGMA index_list({table_name})").fetchall():
+            rows += len(cursor.execute(f"PRAGMA index_info({index[1]})").fetchall())
+        rows += len(cursor.execute(f"PRAGMA foreign_key_list({table_name})").fetchall())
+    return rows
+
+
+def best_of(fn, conn: sqlite3.Connection, repeat: int) -> float:
+    """Best wall time of repeat runs, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(conn)
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'tables':>8} {'columns only ms':>16} {'per-table full ms':>18} {'single-pass ms':>15} {'vs full':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for table_count in args.tables:
+            path = os.path.join(tmp, f"schema_{table_count}.db")
+            create_database(path, table_count)
+            conn = sqlite3.connect(path)
+            # Warm the page cache so both variants read the schema from memory
+            describe_schema(conn)
+
+            columns_only = best_of(describe_schema_per_table, conn, args.repeat)
+            full = best_of(describe_schema_per_table_full, conn, args.repeat)
+            single = best_of(describe_schema, conn, args.repeat)
+            print(f"{table_count:>8} {columns_only:>16.2f} {full:>18.2f} {single:>15.2f} {full / single:>7.2f}x")
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Column Statistics
+
+This module precomputes per-column statistics for every table: null fraction,
+distinct count, min/max, the most common values and, for numeric and date
+columns, an equi-depth histogram. A background thread keeps them current. When
+the data version moves, it recomputes only the tables whose fingerprint (schema,
+row count and highest key) changed, so a question never waits for a full pass.
+
+The fingerprint misses in-place UPDATEs that keep the row count and keys, so stats
+older than max_age are recomputed regardless.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+from sampling import sample_key
+
+# Declared type fragments with numeric affinity (SQLite type affinity rules)
+_NUMERIC_TYPES = ("INT", "REAL", "FLOA", "DOUB", "NUMERIC", "DECIMAL")
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _jsonable(value: Any) -> Any:
+    """Keep stats JSON-serializable; BLOBs are summarized by size."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<blob {len(value)} bytes>"
+    return value
+
+
+def column_kind(declared: Optional[str], low: Any, high: Any) -> str:
+    """Classify a column as "numeric", "date" or "other" from its type and range."""
+    declared = (declared or "").upper()
+    if "DATE" in declared or "TIME" in declared:
+        return "date"
+    if any(fragment in declared for fragment in _NUMERIC_TYPES):
+        return "numeric"
+    if isinstance(low, (int, float)) and isinstance(high, (int, float)):
+        return "numeric"
+    if isinstance(low, str) and isinstance(high, str) and _ISO_DATE.match(low) and _ISO_DATE.match(high):
+        return "date"
+    return "other"
+
+
+def table_fingerprint(conn: sqlite3.Connection, table: str) -> tuple:
+    """Return a cheap value that changes when rows are added, deleted or the schema changes."""
+    schema = conn.execute(
+        "SELECT group_concat(sql, ';') FROM sqlite_master WHERE tbl_name = ? COLLATE NOCASE", (table,)
+    ).fetchone()[0]
+    source = _quote(table)
+    count = conn.execute(f"SELECT COUNT(*) FROM {source}").fetchone()[0]
+    key = sample_key(conn, table)
+    highest = conn.execute(f"SELECT MAX({key}) FROM {source}").fetchone()[0] if key else None
+    return (schema, count, highest)
+
+
+def compute_table_stats(
+    conn: sqlite3.Connection, table: str, top_k: int = 5, buckets: int = 10
+) -> Dict[str, Any]:
+    """
+    Compute statistics for every column of a table.
+
+    Counts, distinct counts and ranges of all columns come from one scan; top
+    values and histograms take one grouped or sorted query per column.
+
+    Returns:
+        Dictionary with "rows" and per-column "columns" entries holding "type",
+        "kind", "null_frac", "distinct", "min", "max", "top_values" and, for numeric
+        and date columns, "histogram" as [lower, upper, rows] buckets of equal depth
+    """
+    source = _quote(table)
+    columns = conn.execute("SELECT name, type FROM pragma_table_info(?)", (table,)).fetchall()
+    if not columns:
+        raise ValueError(f"No such table: {table}")
+
+    aggregates = ["COUNT(*)"]
+    for name, _ in columns:
+        column = _quote(name)
+        aggregates += [f"COUNT({column})", f"COUNT(DISTINCT {column})", f"MIN({column})", f"MAX({column})"]
+    totals = conn.execute(f"SELECT {', '.join(aggregates)} FROM {source}").fetchone()
+    rows = totals[0]
+
+    stats: Dict[str, Any] = {}
+    for index, (name, declared) in enumerate(columns):
+        non_null, distinct, low, high = totals[1 + index * 4: 5 + index * 4]
+        column = _quote(name)
+        kind = column_kind(declared, low, high)
+        entry: Dict[str, Any] = {
+            "type": declared or None,
+            "kind": kind,
+            "null_frac": round(1 - non_null / rows, 4) if rows else 0.0,
+            "distinct": distinct,
+            "min": _jsonable(low),
+            "max": _jsonable(high),
+            "top_values": [],
+        }
+        if 0 < distinct < non_null:
+            # Unique columns have no most common values worth listing
+            entry["top_values"] = [
+                [_jsonable(value), count]
+                for value, count in conn.execute(
+                    f"SELECT {column}, COUNT(*) FROM {source} WHERE {column} IS NOT NULL "
+                    f"GROUP BY {column} ORDER BY 2 DESC, 1 LIMIT ?",
+                    (top_k,),
+                )
+            ]
+        if kind in ("numeric", "date") and non_null:
+            entry["histogram"] = [
+                [_jsonable(lower), _jsonable(upper), count]
+                for lower, upper, count in conn.execute(
+                    f"SELECT MIN(value), MAX(value), COUNT(*) FROM ("
+                    f"SELECT {column} AS value, NTILE(?) OVER (ORDER BY {column}) AS bucket "
+                    f"FROM {source} WHERE {column} IS NOT NULL) GROUP BY bucket ORDER BY bucket",
+                    (buckets,),
+                )
+            ]
+        stats[name] = entry
+    return {"rows": rows, "columns": stats}
+
+
+class ColumnStatsStore:
+    """Column statistics for all tables, refreshed on a background thread."""
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        version: Callable[[], Hashable],
+        interval: float = 5.0,
+        max_age: float = 600.0,
+        top_k: int = 5,
+        buckets: int = 10,
+        exclude: Sequence[str] = (),
+    ):
+        """
+        Args:
+            connect: Factory for the refresher's private connection
+            version: Returns the current data version, e.g. DataVersionMonitor.token
+            interval: Seconds between data version checks
+            max_age: Seconds after which a table's stats are recomputed even if its
+                fingerprint did not change
+            top_k: Most common values kept per column
+            buckets: Histogram buckets per numeric or date column
+            exclude: Tables to skip, e.g. internal bookkeeping tables
+        """
+        self.connect = connect
+        self.version = version
+        self.interval = interval
+        self.max_age = max_age
+        self.top_k = top_k
+        self.buckets = buckets
+        self.exclude = {name.lower() for name in exclude}
+
+        self._tables: Dict[str, Dict[str, Any]] = {}
+        self._version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._thread: Optional[threading.Thread] = None
+
+        self.refreshes = 0
+        self.tables_computed = 0
+        self.tables_unchanged = 0
+        self.last_refresh_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        """Compute the first stats and keep refreshing them in the background."""
+        self._thread = threading.Thread(target=self._run, name="column-stats", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+                self.last_error = None
+            except sqlite3.Error as e:
+                self.last_error = str(e)
+            self._ready.set()
+            self._stop.wait(self.interval)
+
+    def _tables_to_refresh(self, conn: sqlite3.Connection) -> List[str]:
+        names = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        ).fetchall()
+        return [name for (name,) in names if name.lower() not in self.exclude]
+
+    def refresh(self, force: bool = False):
+        """Recompute the stats of tables that changed since the last refresh."""
+        version = self.version()
+        now = time.monotonic()
+        with self._lock:
+            expired = any(now - entry["computed_at"] > self.max_age for entry in self._tables.values())
+            if not force and version == self._version and not expired:
+                return
+
+        started = time.monotonic()
+        if self._conn is None:
+            self._conn = self.connect()
+        conn = self._conn
+        tables = self._tables_to_refresh(conn)
+        for table in tables:
+            if self._stop.is_set():
+                return
+            fingerprint = table_fingerprint(conn, table)
+            with self._lock:
+                current = self._tables.get(table)
+            if (
+                not force
+                and current is not None
+                and current["fingerprint"] == fingerprint
+                and now - current["computed_at"] <= self.max_age
+            ):
+                self.tables_unchanged += 1
+                continue
+            stats = compute_table_stats(conn, table, self.top_k, self.buckets)
+            entry = {"fingerprint": fingerprint, "computed_at": time.monotonic(), "updated": time.time(), **stats}
+            with self._lock:
+                self._tables[table] = entry
+            self.tables_computed += 1
+
+        with self._lock:
+            for dropped in set(self._tables) - set(tables):
+                del self._tables[dropped]
+            self._version = version
+        self.refreshes += 1
+        self.last_refresh_ms = round((time.monotonic() - started) * 1000, 3)
+
+    def wait_ready(self, timeout: Optional[float]) -> bool:
+        """Wait until the first refresh has finished."""
+        return self._ready.wait(timeout)
+
+    def get(self, table: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the current stats per table, or for one table (matched case-insensitively).
+
+        Entries carry "rows", "columns" and "updated" (epoch seconds of the computation).
+        """
+        with self._lock:
+            entries = dict(self._tables)
+        if table is not None:
+            entries = {name: entry for name, entry in entries.items() if name.lower() == table.lower()}
+        return {
+            name: {"rows": entry["rows"], "updated": round(entry["updated"], 3), "columns": entry["columns"]}
+            for name, entry in entries.items()
+        }
+
+    def is_current(self) -> bool:
+        """Return True if the stats were refreshed at the current data version."""
+        with self._lock:
+            return self._version is not None and self._version == self.version()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return refresh counters."""
+        with self._lock:
+            tables = len(self._tables)
+        return {
+            "tables": tables,
+            "refreshes": self.refreshes,
+            "tables_computed": self.tables_computed,
+            "tables_unchanged": self.tables_unchanged,
+            "last_refresh_ms": self.last_refresh_ms,
+            "last_error": self.last_error,
+        }
+
+    def close(self):
+        self._stop.set()
+        conn = self._conn
+        if conn is not None:
+            # Stop a long statistics query instead of waiting it out
+            conn.interrupt()
+        if self._thread is not None:
+            self._thread.join()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def format_stats(tables: Dict[str, Dict[str, Any]], max_values: int = 3) -> str:
+    """Render column stats as a compact outline, e.g. for LLM prompts."""
+    lines: List[str] = []
+    for table, entry in tables.items():
+        lines.append(f"{table} ({entry['rows']} rows)")
+        for name, column in entry["columns"].items():
+            parts = [f"{column['null_frac']:.0%} null", f"{column['distinct']} distinct"]
+            if column["min"] is not None:
+                parts.append(f"range {column['min']!r}..{column['max']!r}")
+            if column["top_values"]:
+                top = ", ".join(f"{value!r} ({count})" for value, count in column["top_values"][:max_values])
+                parts.append(f"top {top}")
+            histogram = column.get("histogram")
+            if histogram and len(histogram) > 1:
+                bounds = " | ".join(repr(bucket[1]) for bucket in histogram[:-1])
+                parts.append(f"bucket upper bounds {bounds}")
+            lines.append(f"  - {name} {column['type'] or ''}: {', '.join(parts)}")
+    return "\n".join(lines)
@@ -0,0 +1,190 @@
+"""
+Server-Side Result Cursors
+
+This module keeps open SQLite cursors between MCP tool calls so that large results
+can be paged through with fetch_next instead of being materialized in one response.
+Cursors are addressed by opaque tokens, expire after a TTL and are evicted in LRU
+order once the configured number of open cursors is reached.
+"""
+
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+
+from result_formats import cursor_columns
+
+
+class ServerCursor:
+    """An open query result owned by the cursor store."""
+
+    def __init__(self, conn: sqlite3.Connection, cursor: sqlite3.Cursor, page_size: int):
+        self.conn = conn
+        self.cursor = cursor
+        self.page_size = page_size
+        # Output format and column types chosen by the caller that opened the cursor
+        self.fmt = "text"
+        self.column_types: List[Optional[str]] = [None] * len(cursor.description or [])
+        self.columns = cursor_columns(cursor)
+        self.rows_fetched = 0
+        # Row read ahead to detect the final page
+        self.pending: Optional[Tuple[Any, ...]] = None
+        self.last_access = time.monotonic()
+        self.closed = False
+        # Pages of one cursor are never fetched concurrently
+        self.lock = threading.Lock()
+
+    def close(self):
+        """Close the cursor and its dedicated connection."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            try:
+                self.cursor.close()
+                self.conn.close()
+            except sqlite3.Error:
+                pass
+
+
+class CursorStore:
+    """TTL- and LRU-bounded registry of open result cursors."""
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        ttl_seconds: float = 300.0,
+        max_cursors: int = 32,
+    ):
+        """
+        Create a cursor store.
+
+        Args:
+            connect: Factory for the dedicated connection each cursor reads from
+            ttl_seconds: Cursors untouched for this long are closed
+            max_cursors: Maximum number of open cursors; the least recently used is evicted
+
+        Every open cursor holds a read transaction on its own connection, which keeps
+        writers (or WAL checkpoints) waiting, so both limits should stay small.
+        """
+        self.connect = connect
+        self.ttl_seconds = ttl_seconds
+        self.max_cursors = max_cursors
+        self._cursors: "OrderedDict[str, ServerCursor]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self) -> List[ServerCursor]:
+        """Remove expired cursors. Caller must hold the lock."""
+        now = time.monotonic()
+        expired = []
+        for token, server_cursor in list(self._cursors.items()):
+            if now - server_cursor.last_access > self.ttl_seconds:
+                expired.append(self._cursors.pop(token))
+        return expired
+
+    def open(self, query: str, page_size: int, guard=None, params=()) -> Tuple[str, ServerCursor]:
+        """
+        Execute a query on a dedicated connection and register its cursor.
+
+        guard, when given, is a db_pool.QueryGuard enforcing the statement deadline;
+        params are bound to the query's placeholders.
+        """
+        conn = self.connect()
+        try:
+            if guard is not None:
+                with guard.watch(conn):
+                    cursor = conn.execute(query, params)
+            else:
+                cursor = conn.execute(query, params)
+        except Exception:
+            conn.close()
+            raise
+
+        server_cursor = ServerCursor(conn, cursor, page_size)
+        token = secrets.token_urlsafe(16)
+
+        with self._lock:
+            stale = self._expire()
+            self._cursors[token] = server_cursor
+            while len(self._cursors) > self.max_cursors:
+                stale.append(self._cursors.popitem(last=False)[1])
+
+        for old in stale:
+            old.close()
+        return token, server_cursor
+
+    def get(self, token: str) -> Optional[ServerCursor]:
+        """Look up a cursor by token, refreshing its TTL and LRU position."""
+        with self._lock:
+            stale = self._expire()
+            server_cursor = self._cursors.get(token)
+            if server_cursor is not None:
+                server_cursor.last_access = time.monotonic()
+                self._cursors.move_to_end(token)
+
+        for old in stale:
+            old.close()
+        return server_cursor
+
+    def fetch(
+        self, token: str, server_cursor: ServerCursor, size: int, guard=None
+    ) -> Tuple[List[Tuple[Any, ...]], bool]:
+        """
+        Fetch the next page of rows from a cursor.
+
+        Returns:
+            The rows and whether the cursor is exhausted (in which case it is closed)
+        """
+        try:
+            if guard is not None:
+                with guard.watch(server_cursor.conn):
+                    rows, exhausted = self._fetch(server_cursor, size)
+            else:
+                rows, exhausted = self._fetch(server_cursor, size)
+        except Exception:
+            # An interrupted or failed statement cannot be resumed
+            self.discard(token)
+            raise
+
+        # Closed only now: the watch resets the progress handler on the connection
+        if exhausted:
+            self.discard(token)
+        return rows, exhausted
+
+    def _fetch(self, server_cursor: ServerCursor, size: int) -> Tuple[List[Tuple[Any, ...]], bool]:
+        with server_cursor.lock:
+            if server_cursor.closed:
+                raise LookupError("Cursor has expired or was evicted")
+            rows = []
+            if server_cursor.pending is not None:
+                rows.append(server_cursor.pending)
+                server_cursor.pending = None
+            if size > len(rows):
+                rows.extend(server_cursor.cursor.fetchmany(size - len(rows)))
+            # Look one row ahead so the last page is reported as final
+            if len(rows) == size:
+                server_cursor.pending = server_cursor.cursor.fetchone()
+            exhausted = server_cursor.pending is None
+            server_cursor.rows_fetched += len(rows)
+        return rows, exhausted
+
+    def discard(self, token: str):
+        """Close and forget a cursor."""
+        with self._lock:
+            server_cursor = self._cursors.pop(token, None)
+        if server_cursor is not None:
+            server_cursor.close()
+
+    def close(self):
+        """Close every open cursor."""
+        with self._lock:
+            cursors = list(self._cursors.values())
+            self._cursors.clear()
+        for server_cursor in cursors:
+            server_cursor.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._cursors)
@@ -0,0 +1,562 @@
+"""
+SQLite Connection Pool
+
+This module provides a bounded pool of long-lived SQLite connections for the MCP
+database server. Reusing connections keeps SQLite's page cache and prepared-statement
+cache warm between tool calls instead of paying for connect/teardown on every request.
+"""
+
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+from urllib.request import pathname2url
+
+T = TypeVar("T")
+
+# VM instructions between progress handler calls used for deadlines
+PROGRESS_INTERVAL = 1000
+
+
+# Engine profile applied to every pooled connection unless overridden. A negative
+# cache_size is in KiB; mmap_size lets reads come straight from the OS page cache.
+DEFAULT_PROFILE = {
+    "journal_mode": None,
+    "synchronous": None,
+    "cache_size": -16384,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# PRAGMA values are interpolated into SQL, so only plain numbers and words are accepted
+_PRAGMA_VALUE = re.compile(r"^-?[A-Za-z0-9_]+$")
+
+# Prepared statements kept per connection (sqlite3's default is 128)
+DEFAULT_CACHED_STATEMENTS = 128
+
+
+def engine_pragmas(
+    journal_mode: Optional[str] = None,
+    synchronous: Optional[str] = None,
+    cache_size: Optional[int] = None,
+    mmap_size: Optional[int] = None,
+    temp_store: Optional[str] = None,
+    read_only: bool = False,
+) -> Dict[str, Any]:
+    """
+    Build the PRAGMA settings for an engine profile, skipping unset values.
+
+    journal_mode comes first because it changes how the others behave; it is left
+    out for read-only connections, which cannot switch the journal mode.
+    """
+    pragmas = {
+        "journal_mode": None if read_only else journal_mode,
+        "synchronous": synchronous,
+        "cache_size": cache_size,
+        "mmap_size": mmap_size,
+        "temp_store": temp_store,
+    }
+    return {name: value for name, value in pragmas.items() if value is not None}
+
+
+def warm_page_cache(db_path: str, chunk_size: int = 4 * 1024 * 1024) -> int:
+    """
+    Read the database file once so its pages are in the OS page cache.
+
+    With mmap_size covering the file, SQLite reads pages straight from that cache,
+    so the first queries after startup do not wait on disk. Returns bytes read.
+    """
+    total = 0
+    with open(db_path, "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            total += len(chunk)
+    return total
+
+
+class QueryCancelled(Exception):
+    """Raised when a statement is stopped by its deadline or by the caller."""
+
+
+class QueryGuard:
+    """Deadline and cancellation flag for one tool call's SQLite work."""
+
+    def __init__(self, timeout_ms: Optional[int] = None):
+        """
+        Args:
+            timeout_ms: Wall-clock budget for the statement; None means no deadline
+        """
+        self.timeout_ms = timeout_ms
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout_ms / 1000 if timeout_ms else None
+        self.cancelled = False
+        # Progress handler invocations, i.e. VM instructions divided by the interval
+        self.progress_calls = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def elapsed_ms(self) -> int:
+        return int((time.monotonic() - self.started) * 1000)
+
+    def expired(self) -> bool:
+        """Return True once the deadline has passed or the caller cancelled."""
+        return self.cancelled or (self.deadline is not None and time.monotonic() > self.deadline)
+
+    def check(self):
+        """Raise QueryCancelled once the deadline has passed or the caller cancelled, for work outside watch()."""
+        if self.expired():
+            reason = "timeout" if not self.cancelled else "cancelled by client"
+            raise QueryCancelled(f"Query cancelled after {self.elapsed_ms()} ms ({reason})")
+
+    def _check(self) -> int:
+        """Progress handler: a non-zero return makes SQLite abort the statement."""
+        self.progress_calls += 1
+        return 1 if self.expired() else 0
+
+    @contextmanager
+    def watch(self, conn: sqlite3.Connection, interval: int = PROGRESS_INTERVAL):
+        """
+        Enforce the deadline on conn while the block runs.
+
+        interval is the number of VM instructions between deadline checks; smaller
+        values make progress_calls a finer instruction count at some overhead.
+        """
+        if self.cancelled:
+            raise QueryCancelled(f"Query cancelled after {self.elapsed_ms()} ms")
+        with self._lock:
+            self._conn = conn
+        conn.set_progress_handler(self._check, interval)
+        try:
+            yield conn
+        except sqlite3.OperationalError as e:
+            if str(e) != "interrupted":
+                raise
+            reason = "timeout" if not self.cancelled else "cancelled by client"
+            raise QueryCancelled(f"Query cancelled after {self.elapsed_ms()} ms ({reason})") from e
+        finally:
+            conn.set_progress_handler(None, 0)
+            with self._lock:
+                self._conn = None
+
+    def cancel(self):
+        """Stop the statement now, e.g. because the MCP request was cancelled."""
+        with self._lock:
+            self.cancelled = True
+            if self._conn is not None:
+                self._conn.interrupt()
+
+
+class StatementCacheStats:
+    """Statement cache hits and misses summed over a pool's connections."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+            }
+
+
+class _TrackingCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        self.connection._track(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.connection._track(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+
+class TrackingConnection(sqlite3.Connection):
+    """
+    sqlite3 connection that counts prepared-statement cache hits.
+
+    sqlite3 keeps an LRU cache of compiled statements keyed by SQL text but does
+    not expose its hit rate. This connection mirrors the cache's keys in an LRU of
+    the same size, so a statement counts as a hit exactly when sqlite3 reuses it.
+    PRAGMAs and the pool's own statements take cache entries but are not counted,
+    so the hit rate reflects the queries clients send.
+    """
+
+    def __init__(self, *args, cached_statements: int = DEFAULT_CACHED_STATEMENTS, **kwargs):
+        super().__init__(*args, cached_statements=cached_statements, **kwargs)
+        self.cached_statements = cached_statements
+        self.statement_stats: Optional[StatementCacheStats] = None
+        # Path or URI the connection was opened with, set by the pool
+        self.target: Optional[str] = None
+        self._statements: "OrderedDict[str, None]" = OrderedDict()
+        self._counting = True
+
+    @contextmanager
+    def uncounted(self):
+        """Run the pool's own statements, e.g. health checks, without counting them."""
+        self._counting = False
+        try:
+            yield self
+        finally:
+            self._counting = True
+
+    def _track(self, sql: str):
+        hit = sql in self._statements
+        if hit:
+            self._statements.move_to_end(sql)
+        else:
+            self._statements[sql] = None
+            if len(self._statements) > self.cached_statements:
+                self._statements.popitem(last=False)
+        if self.statement_stats is not None and self._counting and sql.lstrip()[:6].upper() != "PRAGMA":
+            self.statement_stats.record(hit)
+
+    def cursor(self, factory=_TrackingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        # sqlite3.Connection.execute does not go through cursor()
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class PooledConnection:
+    """A SQLite connection together with its pool bookkeeping."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.last_checked = self.created_at
+
+
+class SQLiteConnectionPool:
+    """Bounded pool of long-lived SQLite connections."""
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = 4,
+        pragmas: Optional[Dict[str, Any]] = None,
+        max_idle_seconds: float = 300.0,
+        health_check_interval: float = 30.0,
+        acquire_timeout: float = 30.0,
+        read_only: bool = False,
+        immutable: bool = False,
+        on_connect: Optional[Callable[[sqlite3.Connection], None]] = None,
+        cached_statements: int = DEFAULT_CACHED_STATEMENTS,
+        target: Optional[Callable[[], str]] = None,
+    ):
+        """
+        Create a connection pool.
+
+        Args:
+            db_path: Path to the SQLite database file
+            size: Maximum number of open connections
+            pragmas: PRAGMA name/value pairs applied to every new connection
+            max_idle_seconds: Idle connections older than this are closed and reopened
+            health_check_interval: Idle time after which a connection is pinged before reuse
+            acquire_timeout: Seconds to wait for a free connection before giving up
+            read_only: Open connections with mode=ro and PRAGMA query_only, so no
+                statement can modify the database
+            immutable: Also pass immutable=1 (implies read_only); SQLite then skips all
+                locking and change detection, which is only safe for files that
+                nothing writes to, such as snapshots
+            on_connect: Called with every new connection after the PRAGMAs and before
+                query_only are applied, e.g. to ATTACH databases or create TEMP views
+            cached_statements: Prepared statements each connection keeps; a query
+                repeated with new bound parameters skips parsing and planning
+            target: Returns the URI to open instead of db_path, e.g. the current
+                in-memory replica; connections to an earlier target are closed
+                when they come back to the pool
+        """
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+
+        self.db_path = db_path
+        self.size = size
+        self.pragmas = dict(pragmas or {})
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.immutable = immutable
+        self.read_only = read_only or immutable
+        self.on_connect = on_connect
+        self.cached_statements = cached_statements
+        self.statement_cache = StatementCacheStats()
+        self.target = target
+
+        self._idle: List[PooledConnection] = []
+        self._open_count = 0
+        self._closed = False
+        self._lock = threading.Condition()
+
+        # Counters reported through stats()
+        self._created = 0
+        self._recycled = 0
+        self._failed_health_checks = 0
+
+    def open_connection(self) -> sqlite3.Connection:
+        """Open a new connection with the pool's settings, outside the pool."""
+        while True:
+            if self.target is not None:
+                target, uri = self.target(), True
+            elif self.read_only:
+                target, uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro", True
+                if self.immutable:
+                    target += "&immutable=1"
+            else:
+                target, uri = self.db_path, False
+            conn = sqlite3.connect(
+                target,
+                uri=uri,
+                check_same_thread=False,
+                cached_statements=self.cached_statements,
+                factory=TrackingConnection,
+            )
+            # An in-memory target freed while connecting would have been recreated empty
+            if self.target is None or self.target() == target:
+                break
+            conn.close()
+        conn.target = target
+        try:
+            for name, value in self.pragmas.items():
+                if not _PRAGMA_VALUE.match(str(name)) or not _PRAGMA_VALUE.match(str(value)):
+                    raise ValueError(f"Invalid PRAGMA setting: {name} = {value}")
+                conn.execute(f"PRAGMA {name} = {value}")
+            # After the PRAGMAs, since changing temp_store drops TEMP objects
+            if self.on_connect is not None:
+                self.on_connect(conn)
+            if self.read_only:
+                # Rejects writes even to TEMP tables created by generated SQL
+                conn.execute("PRAGMA query_only = ON")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _is_healthy(self, pooled: PooledConnection) -> bool:
+        """Ping a connection that has been idle for a while."""
+        try:
+            with pooled.conn.uncounted():
+                pooled.conn.execute("SELECT 1").fetchone()
+            pooled.last_checked = time.monotonic()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _is_stale(self, pooled: PooledConnection) -> bool:
+        """Return True for connections to a target that has since been replaced."""
+        return self.target is not None and pooled.conn.target != self.target()
+
+    def _discard(self, pooled: PooledConnection):
+        """Close a connection and free its slot. Caller must hold the lock."""
+        self._open_count -= 1
+        try:
+            pooled.conn.close()
+        except sqlite3.Error:
+            pass
+        self._lock.notify()
+
+    def acquire(self) -> PooledConnection:
+        """Check out a connection, opening a new one if the pool has room."""
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+
+                pooled = None
+                while self._idle:
+                    candidate = self._idle.pop()
+                    if time.monotonic() - candidate.last_used > self.max_idle_seconds or self._is_stale(candidate):
+                        # Recycle connections that sat idle for too long or outlived their target
+                        self._recycled += 1
+                        self._discard(candidate)
+                        continue
+                    pooled = candidate
+                    break
+
+                if pooled is None:
+                    if self._open_count < self.size:
+                        # Reserve the slot before connecting outside the lock
+                        self._open_count += 1
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError(
+                                f"Timed out waiting for a database connection (pool size {self.size})"
+                            )
+                        self._lock.wait(remaining)
+                        continue
+
+            if pooled is None:
+                try:
+                    pooled = PooledConnection(self.open_connection())
+                except Exception:
+                    with self._lock:
+                        self._open_count -= 1
+                        self._lock.notify()
+                    raise
+                # Only statements run on pooled connections count, not those run while
+                # connecting or on background connections from open_connection
+                pooled.conn.statement_stats = self.statement_cache
+                with self._lock:
+                    self._created += 1
+                return pooled
+
+            if time.monotonic() - pooled.last_checked > self.health_check_interval:
+                if not self._is_healthy(pooled):
+                    with self._lock:
+                        self._failed_health_checks += 1
+                        self._discard(pooled)
+                    continue
+
+            return pooled
+
+    def release(self, pooled: PooledConnection, discard: bool = False):
+        """Return a connection to the pool."""
+        if not discard and pooled.conn.in_transaction:
+            # Never hand out a connection with a half-finished transaction
+            try:
+                pooled.conn.rollback()
+            except sqlite3.Error:
+                discard = True
+
+        with self._lock:
+            if not (discard or self._closed) and self._is_stale(pooled):
+                # Its target, e.g. an in-memory replica, has been replaced
+                self._recycled += 1
+                discard = True
+            if discard or self._closed:
+                self._discard(pooled)
+                return
+            pooled.last_used = time.monotonic()
+            self._idle.append(pooled)
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled sqlite3.Connection."""
+        pooled = self.acquire()
+        try:
+            yield pooled.conn
+        except sqlite3.DatabaseError as e:
+            # Drop connections whose underlying handle may be unusable
+            broken = not isinstance(
+                e,
+                (sqlite3.OperationalError, sqlite3.IntegrityError, sqlite3.ProgrammingError, sqlite3.DataError),
+            )
+            self.release(pooled, discard=broken)
+            raise
+        except BaseException:
+            self.release(pooled)
+            raise
+        else:
+            self.release(pooled)
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts."""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            self._lock.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool counters."""
+        with self._lock:
+            return {
+                "size": self.size,
+                "read_only": self.read_only,
+                "immutable": self.immutable,
+                "open": self._open_count,
+                "idle": len(self._idle),
+                "in_use": self._open_count - len(self._idle),
+                "created": self._created,
+                "recycled": self._recycled,
+                "failed_health_checks": self._failed_health_checks,
+                "cached_statements": self.cached_statements,
+                "statement_cache": self.statement_cache.stats(),
+            }
+
+
+class QueryExecutor:
+    """Runs blocking SQLite work on worker threads instead of the asyncio event loop."""
+
+    def __init__(self, pool: SQLiteConnectionPool, max_workers: Optional[int] = None):
+        """
+        Create an executor bound to a connection pool.
+
+        Args:
+            pool: Pool the workers check connections out of
+            max_workers: Number of worker threads (defaults to the pool size)
+
+        Each worker holds at most one pooled connection at a time, so the pool is
+        never smaller than the number of workers and no worker waits on another.
+        """
+        self.pool = pool
+        self.max_workers = max_workers or pool.size
+        if self.max_workers > pool.size:
+            raise ValueError(
+                f"max_workers ({self.max_workers}) cannot exceed the pool size ({pool.size})"
+            )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="sqlite-worker",
+        )
+
+    def _call(self, fn: Callable[..., T], args: tuple) -> T:
+        """Run fn with a pooled connection on the current worker thread."""
+        with self.pool.connection() as conn:
+            return fn(conn, *args)
+
+    async def run(self, fn: Callable[..., T], *args: Any, guard: Optional[QueryGuard] = None) -> T:
+        """
+        Run fn(conn, *args) on a worker thread and await its result.
+
+        If the awaiting task is cancelled, guard (when given) interrupts the running
+        statement so the worker is freed instead of finishing abandoned work.
+        """
+        loop = asyncio.get_running_loop()
+        return await self._await(loop.run_in_executor(self._executor, self._call, fn, args), guard)
+
+    async def call(self, fn: Callable[..., T], *args: Any, guard: Optional[QueryGuard] = None) -> T:
+        """Run fn(*args) on a worker thread without checking out a pooled connection."""
+        loop = asyncio.get_running_loop()
+        return await self._await(loop.run_in_executor(self._executor, fn, *args), guard)
+
+    async def _await(self, future: "asyncio.Future[T]", guard: Optional[QueryGuard]) -> T:
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if guard is not None:
+                guard.cancel()
+            raise
+
+    def shutdown(self):
+        """Wait for running work to finish and stop the worker threads."""
+        self._executor.shutdown(wait=True)
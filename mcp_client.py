@@ -3,56 +3,166 @@ MCP Client for SQL Database Operations
 
 This module provides a client interface to communicate with the MCP SQL database server.
 It handles the connection, tool calls, and response parsing.
+
+By default the client starts its own server as a stdio subprocess. With a server
+URL (or SQL_MCP_SERVER_URL) it connects to a shared server started with
+`mcp_server.py --transport http` instead, so all clients reuse one warm
+connection pool and cache.
 """
 
 import asyncio
+import base64
 import json
+import os
 import subprocess
 import sys
-from typing import Any, Dict, List, Optional
+import threading
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
 
+import pandas as pd
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+try:
+    import pyarrow as pa
+except ImportError:  # only needed for arrow-format results
+    pa = None
+
+T = TypeVar("T")
+
+# Values for a query's placeholders: a sequence for ?, a mapping for :name
+Params = Union[Sequence[Any], Dict[str, Any]]
+
+
+class QueryStream:
+    """
+    Async iterator over the chunks of a stream_query call.
+    
+    Chunks arrive as the server reads the cursor; concatenated they form the whole
+    result. Once iteration ends, summary holds the server's final message (rows,
+    chunks, bytes, truncation and timing). Leaving the loop early cancels the
+    request, which stops the query on the server.
+    """
+    
+    def __init__(self, session: ClientSession, arguments: Dict[str, Any]):
+        self.session = session
+        self.arguments = arguments
+        self.summary: Optional[Dict[str, Any]] = None
+    
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._chunks()
+    
+    async def _chunks(self) -> AsyncIterator[str]:
+        chunks: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        
+        async def on_progress(progress: float, total: Optional[float], message: Optional[str]):
+            if message:
+                chunks.put_nowait(message)
+        
+        # The server registers the stream under this id, so it can be stopped by id
+        stream_id = uuid.uuid4().hex
+        call = asyncio.create_task(
+            self.session.call_tool(
+                "stream_query", {**self.arguments, "stream_id": stream_id}, progress_callback=on_progress
+            )
+        )
+        # Progress notifications are handled before the response, so this marker comes last
+        call.add_done_callback(lambda _: chunks.put_nowait(None))
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                yield chunk
+            result = call.result()
+        finally:
+            if not call.done():
+                # The session does not cancel abandoned requests on the server
+                call.cancel()
+                await self.session.call_tool("cancel_stream", {"stream_id": stream_id})
+        
+        if not result.content:
+            raise RuntimeError("No results returned from database.")
+        text = result.content[0].text
+        if result.isError or not text.startswith("{"):
+            # Errors, including the deadline, come back as plain text
+            raise RuntimeError(text)
+        self.summary = json.loads(text)
 
 
 class DatabaseMCPClient:
     """Client for communicating with the SQL database MCP server."""
     
-    def __init__(self, server_script_path: str = "mcp_server.py"):
+    def __init__(
+        self,
+        server_script_path: str = "mcp_server.py",
+        server_args: Optional[List[str]] = None,
+        server_url: Optional[str] = None,
+    ):
         self.server_script_path = server_script_path
+        # Extra command-line options for the server, e.g. ["--read-only"]
+        self.server_args = list(server_args or [])
+        # Shared streamable HTTP server, e.g. http://127.0.0.1:8000/mcp; None spawns one
+        self.server_url = server_url or os.getenv("SQL_MCP_SERVER_URL") or None
         self.session: Optional[ClientSession] = None
     
     async def __aenter__(self):
         """Async context manager entry."""
-        # Start the MCP server as a subprocess
-        server_params = StdioServerParameters(
-            command=sys.executable,
-            args=[self.server_script_path],
-        )
-        
-        # Create stdio client connection
-        self.stdio_client = stdio_client(server_params)
-        self.read_stream, self.write_stream = await self.stdio_client.__aenter__()
+        if self.server_url:
+            # Connect to the running shared server
+            self.transport = streamablehttp_client(self.server_url)
+            self.read_stream, self.write_stream, _ = await self.transport.__aenter__()
+        else:
+            # Start the MCP server as a subprocess
+            server_params = StdioServerParameters(
+                command=sys.executable,
+                args=[self.server_script_path, *self.server_args],
+            )
+            self.transport = stdio_client(server_params)
+            self.read_stream, self.write_stream = await self.transport.__aenter__()
         
-        # Initialize the client session
+        # Initialize the client session (entering it starts its receive loop)
         self.session = ClientSession(self.read_stream, self.write_stream)
+        await self.session.__aenter__()
         await self.session.initialize()
         
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit."""
+        # Shut the transport down cleanly; passing the caller's exception into the
+        # anyio task groups would re-raise it wrapped in an ExceptionGroup
         if self.session:
-            await self.session.close()
-        await self.stdio_client.__aexit__(exc_type, exc_val, exc_tb)
+            await self.session.__aexit__(None, None, None)
+        await self.transport.__aexit__(None, None, None)
     
-    async def query_database(self, query: str) -> str:
-        """Execute a SQL query against the database."""
+    async def query_database(
+        self,
+        query: str,
+        format: str = "text",
+        timeout_ms: Optional[int] = None,
+        params: Optional[Params] = None,
+    ) -> str:
+        """
+        Execute a SQL query against the database.
+        
+        params are bound to the query's placeholders, e.g.
+        query_database("SELECT * FROM sales WHERE region = ?", params=["West"]).
+        Cancelling the awaiting task cancels the MCP request, which interrupts the
+        statement on the server.
+        """
         if not self.session:
             raise RuntimeError("Client session not initialized")
         
         try:
-            result = await self.session.call_tool("query_database", {"query": query})
+            arguments: Dict[str, Any] = {"query": query, **_params_argument(params)}
+            if format != "text":
+                arguments["format"] = format
+            if timeout_ms:
+                arguments["timeout_ms"] = timeout_ms
+            result = await self.session.call_tool("query_database", arguments)
             
             # Extract text content from the result
             if result.content and len(result.content) > 0:
@@ -63,6 +173,270 @@ class DatabaseMCPClient:
         except Exception as e:
             return f"Error executing query: {str(e)}"
     
+    def stream_query(
+        self,
+        query: str,
+        format: str = "jsonl",
+        chunk_rows: Optional[int] = None,
+        max_rows: Optional[int] = None,
+        timeout_ms: Optional[int] = None,
+        params: Optional[Params] = None,
+    ) -> QueryStream:
+        """
+        Execute a SQL query and iterate over its result chunk by chunk.
+        
+        Example:
+            stream = client.stream_query("SELECT * FROM sales", format="csv")
+            async for chunk in stream:
+                out.write(chunk)
+            print(stream.summary["rows_streamed"])
+        """
+        if not self.session:
+            raise RuntimeError("Client session not initialized")
+        
+        arguments: Dict[str, Any] = {"query": query, "format": format, **_params_argument(params)}
+        if chunk_rows:
+            arguments["chunk_rows"] = chunk_rows
+        if max_rows:
+            arguments["max_rows"] = max_rows
+        if timeout_ms:
+            arguments["timeout_ms"] = timeout_ms
+        return QueryStream(self.session, arguments)
+    
+    async def query_batch(
+        self,
+        queries: List[str],
+        parallel: bool = False,
+        format: str = "text",
+        params: Optional[Sequence[Optional[Params]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Execute several queries in one round trip.
+        
+        params holds one entry per query (None for a query without placeholders).
+        
+        Returns:
+            Dictionary with per-statement "results" in query order; each has "ok",
+            "elapsed_ms" and either "result" plus truncation metadata or "error"
+        """
+        if not self.session:
+            raise RuntimeError("Client session not initialized")
+        
+        arguments: Dict[str, Any] = {"queries": list(queries), "parallel": parallel}
+        if format != "text":
+            arguments["format"] = format
+        if params is not None:
+            arguments["params"] = [_params_argument(values).get("params") for values in params]
+        result = await self.session.call_tool("query_batch", arguments)
+        if not result.content:
+            raise RuntimeError("No results returned from database.")
+        text = result.content[0].text
+        if result.isError or not text.startswith("{"):
+            # Batch-level errors (validation, bad format) come back as plain text
+            raise RuntimeError(text)
+        return json.loads(text)
+    
+    async def explain_query(self, query: str, timeout_ms: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Get the query plan without running the query.
+        
+        Returns:
+            Dictionary with the classified "plan" tree and its "summary"
+        """
+        if not self.session:
+            raise RuntimeError("Client session not initialized")
+        
+        arguments: Dict[str, Any] = {"query": query}
+        if timeout_ms:
+            arguments["timeout_ms"] = timeout_ms
+        result = await self.session.call_tool("explain_query", arguments)
+        if not result.content:
+            raise RuntimeError("No plan returned from database.")
+        text = result.content[0].text
+        if result.isError or not text.startswith("{"):
+            raise RuntimeError(text)
+        return json.loads(text)
+    
+    async def profile_query(
+        self, query: str, runs: int = 1, format: str = "text", params: Optional[Params] = None
+    ) -> Dict[str, Any]:
+        """
+        Run a query on the server and return its profile.
+        
+        Returns:
+            Dictionary with wall_ms, cpu_ms, prepare_ms, step_ms, format_ms, vm_steps,
+            rows_produced and bytes_formatted of the fastest run
+        """
+        if not self.session:
+            raise RuntimeError("Client session not initialized")
+        
+        arguments: Dict[str, Any] = {"query": query, "runs": runs, **_params_argument(params)}
+        if format != "text":
+            arguments["format"] = format
+        result = await self.session.call_tool("profile_query", arguments)
+        if not result.content:
+            raise RuntimeError("No profile returned from database.")
+        text = result.content[0].text
+        if result.isError or not text.startswith("{"):
+            raise RuntimeError(text)
+        return json.loads(text)
+    
+    async def sample_table(self, table: str, rows: int = 5) -> str:
+        """Get a few random rows of a table as a text table."""
+        if not self.session:
+            raise RuntimeError("Client session not initialized")
+        
+        result = await self.session.call_tool("sample_table", {"table": table, "rows": rows})
+        if not result.content:
+            raise RuntimeError("No sample returned from database.")
+        if len(result.content) < 2:
+            # Errors come back as a single text item without metadata
+            raise RuntimeError(result.content[0].text)
+        return result.content[0].text
+    
+    async def column_stats(self, table: Optional[str] = None, wait_ms: int = 5000) -> Dict[str, Any]:
+        """
+        Get precomputed column statistics.
+        
+        Args:
+            table: Only this table (defaults to all tables)
+            wait_ms: How long a freshly started server may take for its first computation
+        
+        Returns:
+            Dictionary with "current" and per-table "tables" entries (see column_stats.py)
+        """
+        if not self.session:
+            raise RuntimeError("Client session not initialized")
+        
+        arguments: Dict[str, Any] = {"wait_ms": wait_ms}
+        if table:
+            arguments["table"] = table
+        result = await self.session.call_tool("column_stats", arguments)
+        if not result.content:
+            raise RuntimeError("No statistics returned from database.")
+        text = result.content[0].text
+        if result.isError or not text.startswith("{"):
+            raise RuntimeError(text)
+        return json.loads(text)
+    
+    async def query_columns(self, query: str, params: Optional[Params] = None) -> Dict[str, Any]:
+        """
+        Execute a SQL query and return the json-columns payload.
+        
+        Returns:
+            Dictionary with "columns", "types" and per-column "data" arrays, plus the
+            result "metadata" (rows_returned, rows_total, truncated, ...); a
+            truncated result holds only the rows within the server's budgets
+        """
+        if not self.session:
+            raise RuntimeError("Client session not initialized")
+        
+        result = await self.session.call_tool(
+            "query_database", {"query": query, "format": "json-columns", **_params_argument(params)}
+        )
+        if not result.content:
+            raise RuntimeError("No results returned from database.")
+        if len(result.content) < 2:
+            # Errors come back as a single text item without metadata
+            raise RuntimeError(result.content[0].text)
+        payload = json.loads(result.content[0].text)
+        payload["metadata"] = json.loads(result.content[1].text)
+        return payload
+    
+    async def query_arrow(self, query: str, params: Optional[Params] = None) -> "pa.Table":
+        """Execute a SQL query and decode the Arrow IPC result into a pyarrow Table."""
+        table, _ = await self._query_arrow(query, params)
+        return table
+    
+    async def _query_arrow(self, query: str, params: Optional[Params]) -> Tuple["pa.Table", Dict[str, Any]]:
+        """Execute a SQL query in the arrow format; return the Table and the result metadata."""
+        if not self.session:
+            raise RuntimeError("Client session not initialized")
+        if pa is None:
+            raise RuntimeError("The arrow format requires pyarrow (pip install pyarrow)")
+        
+        result = await self.session.call_tool(
+            "query_database", {"query": query, "format": "arrow", **_params_argument(params)}
+        )
+        if not result.content:
+            raise RuntimeError("No results returned from database.")
+        
+        content = result.content[0]
+        if content.type != "resource":
+            # Errors come back as plain text
+            raise RuntimeError(content.text)
+        
+        payload = base64.b64decode(content.resource.blob)
+        metadata = json.loads(result.content[1].text) if len(result.content) > 1 else {}
+        return pa.ipc.open_stream(pa.py_buffer(payload)).read_all(), metadata
+    
+    async def query_dataframe(
+        self, query: str, format: str = "json-columns", params: Optional[Params] = None
+    ) -> pd.DataFrame:
+        """
+        Execute a SQL query and build a DataFrame without parsing text.
+        
+        Args:
+            query: The SQL query to execute
+            format: "json-columns", or "arrow" for large results; arrow columns stay
+                in Arrow memory (ArrowDtype) instead of becoming per-cell Python objects
+            params: Values for the query's placeholders
+        
+        Returns:
+            The rows, with the result metadata in frame.attrs; frame.attrs["truncated"]
+            means the frame stops at the server's row or byte budget
+        """
+        if format == "arrow":
+            table, metadata = await self._query_arrow(query, params)
+            frame = table.to_pandas(types_mapper=pd.ArrowDtype)
+        else:
+            payload = await self.query_columns(query, params)
+            metadata = payload["metadata"]
+            frame = columns_to_dataframe(payload)
+        frame.attrs.update(metadata)
+        return frame
+    
+    async def query_page(
+        self, query: str, page_size: int = 100, params: Optional[Params] = None
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Execute a SQL query and return only its first page of rows.
+        
+        Returns:
+            The formatted page and a cursor token for fetch_next (None when done)
+        """
+        if not self.session:
+            raise RuntimeError("Client session not initialized")
+        
+        result = await self.session.call_tool(
+            "query_database", {"query": query, "page_size": page_size, **_params_argument(params)}
+        )
+        return self._parse_page(result)
+    
+    async def fetch_next(self, cursor: str, page_size: Optional[int] = None) -> Tuple[str, Optional[str]]:
+        """Fetch the page following a cursor returned by query_page."""
+        if not self.session:
+            raise RuntimeError("Client session not initialized")
+        
+        arguments: Dict[str, Any] = {"cursor": cursor}
+        if page_size:
+            arguments["page_size"] = page_size
+        result = await self.session.call_tool("fetch_next", arguments)
+        return self._parse_page(result)
+    
+    def _parse_page(self, result) -> Tuple[str, Optional[str]]:
+        """Split a paginated tool result into page text and next cursor."""
+        if not result.content:
+            return "No results returned from database.", None
+        
+        page_text = result.content[0].text
+        if len(result.content) < 2:
+            # Errors come back as a single text item without a cursor
+            return page_text, None
+        
+        page_info = json.loads(result.content[1].text)
+        return page_text, page_info.get("cursor")
+    
     async def get_schema(self) -> str:
         """Get the database schema information."""
         if not self.session:
@@ -98,12 +472,51 @@ class DatabaseMCPClient:
             return f"Error listing tables: {str(e)}"
 
 
+def columns_to_dataframe(payload: Dict[str, Any]) -> pd.DataFrame:
+    """Convert a json-columns payload into a DataFrame."""
+    # Build by position so duplicate column names from joins survive
+    frame = pd.DataFrame(dict(enumerate(payload["data"])), columns=range(len(payload["columns"])))
+    frame.columns = payload["columns"]
+    return frame
+
+
+def _params_argument(params: Optional[Params]) -> Dict[str, Any]:
+    """Build the params tool argument; JSON has no tuples, so sequences become lists."""
+    if params is None:
+        return {}
+    return {"params": dict(params) if isinstance(params, dict) else list(params)}
+
+
 class SyncDatabaseMCPClient:
-    """Synchronous wrapper for the async MCP client."""
+    """
+    Synchronous wrapper for the async MCP client.
+    
+    By default every call opens its own session, which for a stdio server means
+    starting a server process per call. With keep_alive=True the wrapper keeps one
+    session open on a background event loop and runs every call on it, so callers
+    making many calls (e.g. the agent) pay for one server start and reuse its warm
+    caches and column statistics. Call close() when done.
+    """
     
-    def __init__(self, server_script_path: str = "mcp_server.py"):
+    def __init__(
+        self,
+        server_script_path: str = "mcp_server.py",
+        server_args: Optional[List[str]] = None,
+        server_url: Optional[str] = None,
+        keep_alive: bool = False,
+    ):
         self.server_script_path = server_script_path
+        self.server_args = server_args
+        self.server_url = server_url
+        self.keep_alive = keep_alive
         self.loop = None
+        
+        # Background loop holding the kept-alive session
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[DatabaseMCPClient] = None
+        self._stop: Optional[asyncio.Event] = None
     
     def _get_event_loop(self):
         """Get or create an event loop."""
@@ -114,35 +527,139 @@ class SyncDatabaseMCPClient:
             asyncio.set_event_loop(loop)
             return loop
     
-    def query_database(self, query: str) -> str:
+    def _run(self, call: Callable[["DatabaseMCPClient"], Awaitable[T]]) -> T:
+        """Run call(client) on the kept-alive session, or on a session of its own."""
+        if self.keep_alive:
+            loop, client = self._session()
+            return asyncio.run_coroutine_threadsafe(call(client), loop).result()
+        
+        async def run_once() -> T:
+            async with DatabaseMCPClient(self.server_script_path, self.server_args, self.server_url) as client:
+                return await call(client)
+        
+        return self._get_event_loop().run_until_complete(run_once())
+    
+    def _session(self) -> Tuple[asyncio.AbstractEventLoop, "DatabaseMCPClient"]:
+        """Return the background loop and its open client, starting them if needed."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                ready = threading.Event()
+                failure: List[BaseException] = []
+                self._thread = threading.Thread(
+                    target=self._hold_session, args=(ready, failure), name="mcp-session", daemon=True
+                )
+                self._thread.start()
+                ready.wait()
+                if failure:
+                    self._thread.join()
+                    raise failure[0]
+            return self._session_loop, self._client
+    
+    def _hold_session(self, ready: threading.Event, failure: List[BaseException]):
+        """Thread body: open the session, keep it open until close(), then shut it down."""
+        loop = asyncio.new_event_loop()
+        
+        async def hold():
+            self._stop = asyncio.Event()
+            try:
+                client = DatabaseMCPClient(self.server_script_path, self.server_args, self.server_url)
+                async with client:
+                    self._session_loop, self._client = loop, client
+                    ready.set()
+                    await self._stop.wait()
+            except BaseException as e:
+                failure.append(e)
+            finally:
+                self._client = None
+                ready.set()
+        
+        try:
+            loop.run_until_complete(hold())
+        finally:
+            loop.close()
+    
+    def close(self):
+        """Close the kept-alive session and stop its server, if one is open."""
+        with self._lock:
+            thread, loop, stop = self._thread, self._session_loop, self._stop
+            if thread is None or not thread.is_alive():
+                return
+            loop.call_soon_threadsafe(stop.set)
+            thread.join()
+            self._thread = None
+    
+    def query_database(self, query: str, params: Optional[Params] = None) -> str:
         """Execute a SQL query against the database (sync)."""
-        loop = self._get_event_loop()
-        return loop.run_until_complete(self._async_query_database(query))
+        return self._run(lambda client: client.query_database(query, params=params))
+    
+    def query_dataframe(
+        self, query: str, format: str = "json-columns", params: Optional[Params] = None
+    ) -> pd.DataFrame:
+        """Execute a SQL query and return a DataFrame (sync)."""
+        return self._run(lambda client: client.query_dataframe(query, format, params))
+    
+    def explain_query(self, query: str) -> Dict[str, Any]:
+        """Get the query plan without running the query (sync)."""
+        return self._run(lambda client: client.explain_query(query))
+    
+    def profile_queries(self, queries: List[str], runs: int = 1) -> List[Dict[str, Any]]:
+        """
+        Profile several queries over one server session (sync).
+        
+        Failed queries get a dictionary with only "query" and "error", so results
+        stay aligned with the input.
+        """
+        return self._run(lambda client: self._async_profile_queries(client, queries, runs))
+    
+    def sample_tables(self, tables: Optional[List[str]] = None, rows: int = 3) -> Dict[str, str]:
+        """
+        Sample rows of several tables over one server session (sync).
+        
+        Args:
+            tables: Tables to sample; defaults to every table list_tables reports
+            rows: Rows per table
+        
+        Returns:
+            Text table of sampled rows per table name; tables that fail are left out
+        """
+        return self._run(lambda client: self._async_sample_tables(client, tables, rows))
+    
+    def column_stats(self, table: Optional[str] = None) -> Dict[str, Any]:
+        """Get precomputed column statistics (sync)."""
+        return self._run(lambda client: client.column_stats(table))
     
     def get_schema(self) -> str:
         """Get the database schema information (sync)."""
-        loop = self._get_event_loop()
-        return loop.run_until_complete(self._async_get_schema())
+        return self._run(lambda client: client.get_schema())
     
     def list_tables(self) -> str:
         """List all tables in the database (sync)."""
-        loop = self._get_event_loop()
-        return loop.run_until_complete(self._async_list_tables())
-    
-    async def _async_query_database(self, query: str) -> str:
-        """Async implementation of query_database."""
-        async with DatabaseMCPClient(self.server_script_path) as client:
-            return await client.query_database(query)
-    
-    async def _async_get_schema(self) -> str:
-        """Async implementation of get_schema."""
-        async with DatabaseMCPClient(self.server_script_path) as client:
-            return await client.get_schema()
-    
-    async def _async_list_tables(self) -> str:
-        """Async implementation of list_tables."""
-        async with DatabaseMCPClient(self.server_script_path) as client:
-            return await client.list_tables()
+        return self._run(lambda client: client.list_tables())
+    
+    @staticmethod
+    async def _async_profile_queries(client: "DatabaseMCPClient", queries: List[str], runs: int) -> List[Dict[str, Any]]:
+        """Async implementation of profile_queries."""
+        profiles = []
+        for query in queries:
+            try:
+                profiles.append(await client.profile_query(query, runs))
+            except RuntimeError as e:
+                profiles.append({"query": query, "error": str(e)})
+        return profiles
+    
+    @staticmethod
+    async def _async_sample_tables(client: "DatabaseMCPClient", tables: Optional[List[str]], rows: int) -> Dict[str, str]:
+        """Async implementation of sample_tables."""
+        samples = {}
+        if tables is None:
+            listing = await client.list_tables()
+            tables = [line[2:] for line in listing.splitlines() if line.startswith("- ")]
+        for table in tables:
+            try:
+                samples[table] = await client.sample_table(table, rows)
+            except RuntimeError:
+                continue
+        return samples
 
 
 # Example usage
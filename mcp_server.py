@@ -6,11 +6,17 @@ This server provides database query capabilities through the Model Context Proto
 It exposes tools for querying a SQLite database and retrieving schema information.
 """
 
+import argparse
 import asyncio
+import base64
+import contextlib
 import json
+import os
 import sqlite3
 import sys
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 from mcp.server import Server, NotificationOptions
 from mcp.server.models import InitializationOptions
@@ -18,15 +24,339 @@ import mcp.server.stdio
 import mcp.types as types
 from pydantic import AnyUrl
 
+from admission import BATCH, INTERACTIVE, PRIORITIES, AdmissionController, AdmissionRejected
+from column_stats import ColumnStatsStore
+from cursor_store import CursorStore
+from db_pool import (
+    DEFAULT_CACHED_STATEMENTS,
+    DEFAULT_PROFILE,
+    QueryCancelled,
+    QueryExecutor,
+    QueryGuard,
+    SQLiteConnectionPool,
+    engine_pragmas,
+    warm_page_cache,
+)
+from partitions import MANIFEST_TABLE, PartitionRouter, RoutedQuery, Unroutable, load_partitions
+from query_cache import DataVersionMonitor, ResultCache, is_volatile, normalize_sql
+from process_pool import ProcessQueryPool
+from query_plan import explain_plan
+from replica import MemoryReplica
+from rollups import MODES as ROLLUP_MODES, RollupManager, load_rollups, stored_tables
+from sampling import MAX_SAMPLE_ROWS, sample_table
+from result_formats import (
+    ARROW_MIME_TYPE,
+    FETCH_BATCH_SIZE,
+    FORMATS,
+    STREAM_FORMATS,
+    DeclaredTypes,
+    FormattedResult,
+    cursor_columns,
+    execute_formatted,
+    format_result,
+    iter_batches,
+    iter_chunks,
+)
+
+# VM instructions between progress callbacks while profiling; finer than the
+# deadline interval so the instruction count is meaningful for short queries
+PROFILE_INTERVAL = 100
+
+# Upper bound on profile_query repetitions
+MAX_PROFILE_RUNS = 10
+
+# query_database formats treated as exports, admitted as batch work by default
+EXPORT_FORMATS = ("csv", "jsonl", "arrow")
+
+
+# Columns, indexes and foreign keys of every table in one statement, instead of a
+# PRAGMA table_info round trip per table. Rows come back as all columns (in
+# sqlite_master order), then all indexes, then all foreign key columns; they are
+# grouped per table in Python, which is cheaper than an ORDER BY over the union.
+SCHEMA_QUERY = """
+SELECT m.name, 0 AS kind, c.name, c.type, c."notnull", c.pk, NULL
+FROM sqlite_master AS m
+JOIN pragma_table_info(m.name) AS c
+WHERE m.type = 'table'
+UNION ALL
+SELECT m.name, 1, il.name, il."unique", il.partial, NULL,
+       (SELECT group_concat(ii.name, ', ') FROM pragma_index_info(il.name) AS ii)
+FROM sqlite_master AS m
+JOIN pragma_index_list(m.name) AS il
+WHERE m.type = 'table' AND il.origin != 'pk'
+UNION ALL
+SELECT m.name, 2, fk."from", fk."table", fk."to", fk.id, NULL
+FROM sqlite_master AS m
+JOIN pragma_foreign_key_list(m.name) AS fk
+WHERE m.type = 'table'
+"""
+
+
+def describe_schema(conn: sqlite3.Connection, exclude: Sequence[str] = ()) -> str:
+    """Render tables, columns, indexes and foreign keys as the get_schema text, leaving out exclude."""
+    tables: Dict[str, Dict[str, Any]] = {}
+    hidden = {name.lower() for name in exclude}
+    
+    for table_name, kind, name, a, b, c, index_columns in conn.execute(SCHEMA_QUERY):
+        if table_name.lower() in hidden:
+            continue
+        table = tables.setdefault(table_name, {"columns": [], "indexes": [], "foreign_keys": {}})
+        if kind == 0:
+            # Column: a=type, b=notnull, c=pk
+            is_nullable = "NOT NULL" if b else "NULL"
+            is_pk = "PRIMARY KEY" if c else ""
+            table["columns"].append(f"- {name} ({a}) {is_nullable} {is_pk}".strip())
+        elif kind == 1:
+            # Index: a=unique, b=partial
+            unique = "UNIQUE " if a else ""
+            partial = " (partial)" if b else ""
+            table["indexes"].append(f"- {unique}INDEX {name} ON ({index_columns}){partial}")
+        else:
+            # Foreign key column: name=from, a=parent table, b=parent column, c=constraint id
+            table["foreign_keys"].setdefault(c, []).append((name, a, b))
+    
+    schema_info = []
+    for table_name, table in tables.items():
+        schema_info.append(f"\nTable: {table_name}")
+        schema_info.extend(table["columns"])
+        schema_info.extend(table["indexes"])
+        for parts in table["foreign_keys"].values():
+            local = ", ".join(part[0] for part in parts)
+            remote = ", ".join(part[2] or "?" for part in parts)
+            schema_info.append(f"- FOREIGN KEY ({local}) REFERENCES {parts[0][1]} ({remote})")
+    
+    return "\n".join(schema_info)
+
+
+def bind_params(params: Any) -> Union[tuple, Dict[str, Any]]:
+    """
+    Validate tool call parameters for binding to a statement's placeholders.
+
+    Args:
+        params: A list for ? placeholders, an object for :name placeholders, or None
+
+    Returns:
+        A tuple or dict for sqlite3's execute; () when there are no parameters
+    """
+    if params is None:
+        return ()
+    if isinstance(params, dict):
+        values = params.values()
+    elif isinstance(params, (list, tuple)):
+        values = params
+    else:
+        raise ValueError("params must be an array (for ? placeholders) or an object (for :name placeholders)")
+    for value in values:
+        if value is not None and not isinstance(value, (str, int, float)):
+            raise ValueError(f"params values must be strings, numbers, booleans or null, not {type(value).__name__}")
+    return dict(params) if isinstance(params, dict) else tuple(params)
+
+
+def params_key(params: Union[tuple, Dict[str, Any]]) -> tuple:
+    """Return a hashable form of bound parameters for cache keys."""
+    if isinstance(params, dict):
+        return tuple(sorted(params.items()))
+    return params
+
+
+@contextlib.contextmanager
+def _query_only(conn: sqlite3.Connection) -> Iterator[None]:
+    """Make SQLite reject writes on conn while the block runs (PRAGMA query_only)."""
+    previous = conn.execute("PRAGMA query_only").fetchone()[0]
+    conn.execute("PRAGMA query_only = ON")
+    try:
+        yield
+    finally:
+        conn.execute(f"PRAGMA query_only = {int(previous)}")
+
 
 class DatabaseMCPServer:
     """MCP Server for database operations."""
     
-    def __init__(self, db_path: str = "sales.db"):
+    def __init__(
+        self,
+        db_path: str = "sales.db",
+        pool_size: int = 4,
+        pragmas: Optional[Dict[str, Any]] = None,
+        max_idle_seconds: float = 300.0,
+        max_workers: Optional[int] = None,
+        cursor_ttl_seconds: float = 300.0,
+        max_cursors: int = 32,
+        max_result_rows: int = 10_000,
+        max_result_bytes: int = 4 * 1024 * 1024,
+        max_batch_statements: int = 50,
+        result_cache_bytes: int = 64 * 1024 * 1024,
+        query_timeout_ms: int = 30_000,
+        max_query_timeout_ms: int = 300_000,
+        read_only: bool = False,
+        immutable: bool = False,
+        journal_mode: Optional[str] = DEFAULT_PROFILE["journal_mode"],
+        synchronous: Optional[str] = DEFAULT_PROFILE["synchronous"],
+        cache_size: Optional[int] = DEFAULT_PROFILE["cache_size"],
+        mmap_size: Optional[int] = DEFAULT_PROFILE["mmap_size"],
+        temp_store: Optional[str] = DEFAULT_PROFILE["temp_store"],
+        warm_cache: bool = False,
+        max_concurrent: Optional[int] = None,
+        max_queue: int = 64,
+        queue_timeout_ms: Optional[int] = 30_000,
+        stats_interval: Optional[float] = 5.0,
+        cached_statements: int = DEFAULT_CACHED_STATEMENTS,
+        rollups: Optional[str] = None,
+        rollup_definitions: Optional[str] = None,
+        replica: bool = False,
+        replica_interval: float = 1.0,
+        processes: int = 0,
+    ):
         self.db_path = db_path
+        # Default and maximum per-call statement deadlines
+        self.query_timeout_ms = query_timeout_ms
+        self.max_query_timeout_ms = max_query_timeout_ms
+        # Upper bounds on what a single query_database response may contain
+        self.max_result_rows = max_result_rows
+        self.max_result_bytes = max_result_bytes
+        # Statements accepted by one query_batch call
+        self.max_batch_statements = max_batch_statements
+        # Declared column types used by json-columns and arrow
+        self._column_types = DeclaredTypes()
+        # Guards of running stream_query calls by client-chosen stream id
+        self._streams: Dict[str, QueryGuard] = {}
+        # Rendered get_schema text keyed by PRAGMA schema_version
+        self._schema_cache: Dict[int, str] = {}
+        self._schema_cache_hits = 0
+        self._schema_cache_misses = 0
+        # A partitioned sales table (setup_db.py --partition) is attached to every
+        # connection as a view; the router scans partition files directly where it can
+        partitions = load_partitions(db_path)
+        # Read-mostly deployments can serve every query from an in-memory copy of the
+        # file; partition files are not copied, so partitioned layouts stay on disk
+        self.replica: Optional[MemoryReplica] = None
+        if replica and not partitions:
+            self.replica = MemoryReplica(db_path, interval=replica_interval)
+            self.replica.start()
+            read_only = True
+        # Engine profile first, explicit PRAGMAs may override it
+        self.profile = engine_pragmas(
+            journal_mode=journal_mode,
+            synchronous=synchronous,
+            cache_size=cache_size,
+            mmap_size=mmap_size,
+            temp_store=temp_store,
+            read_only=read_only or immutable,
+        )
+        # Every worker thread needs its own connection, so the pool is never smaller
+        pool_size = max(pool_size, max_workers or 0)
+        self.partitions: Optional[PartitionRouter] = None
+        if partitions:
+            self.partitions = PartitionRouter(
+                db_path,
+                partitions,
+                max_workers=pool_size,
+                pragmas=self.profile,
+                read_only=read_only,
+                immutable=immutable,
+            )
+        self.pool = SQLiteConnectionPool(
+            db_path,
+            size=pool_size,
+            pragmas={**self.profile, **(pragmas or {})},
+            max_idle_seconds=max_idle_seconds,
+            read_only=read_only,
+            immutable=immutable,
+            on_connect=self.partitions.attach if self.partitions else None,
+            cached_statements=cached_statements,
+            target=self.replica.target if self.replica else None,
+        )
+        self.executor = QueryExecutor(self.pool, max_workers=max_workers)
+        # query_database can run in worker processes to use more than one core; they
+        # read the file itself, so not with an in-memory replica or partitioned layout
+        self.processes: Optional[ProcessQueryPool] = None
+        if processes and self.replica is None and self.partitions is None:
+            worker_profile = engine_pragmas(
+                synchronous=synchronous,
+                cache_size=cache_size,
+                mmap_size=mmap_size,
+                temp_store=temp_store,
+                read_only=True,
+            )
+            self.processes = ProcessQueryPool(
+                db_path,
+                processes,
+                pragmas={**worker_profile, **(pragmas or {})},
+                immutable=immutable,
+                cached_statements=cached_statements,
+            )
+            self.processes.start()
+        # Tool calls beyond max_concurrent wait by priority class, then get rejected
+        self.admission = AdmissionController(
+            max_concurrent=max_concurrent or max(self.executor.max_workers, self.processes.workers if self.processes else 0),
+            max_queue=max_queue,
+            queue_timeout_ms=queue_timeout_ms,
+        )
+        self.cursors = CursorStore(
+            self.pool.open_connection,
+            ttl_seconds=cursor_ttl_seconds,
+            max_cursors=max_cursors,
+        )
+        # Results are cached until the database changes; 0 disables the cache. Queries
+        # on the replica see a new version only once a fresh copy is swapped in
+        self.data_version: Union[DataVersionMonitor, MemoryReplica]
+        if self.replica is not None:
+            self.data_version = self.replica
+        else:
+            self.data_version = DataVersionMonitor(
+                self.pool.open_connection,
+                db_path,
+                watch_paths=self.partitions.paths if self.partitions else (),
+            )
+        self.result_cache = ResultCache(result_cache_bytes) if result_cache_bytes > 0 else None
+        # Declared rollups ("incremental" or "triggers") answer matching GROUP BY queries;
+        # a partitioned sales table is left to the partition router
+        self.rollups: Optional[RollupManager] = None
+        if rollups and self.partitions is None:
+            self.rollups = RollupManager(
+                self.pool.open_connection,
+                load_rollups(rollup_definitions),
+                self.data_version.token,
+                mode=rollups,
+                read_only=self.pool.read_only,
+            )
+            self.rollups.start()
+        # Column statistics are kept current in the background; None or 0 disables them
+        self.column_stats: Optional[ColumnStatsStore] = None
+        if stats_interval:
+            # Rollup tables left in the file also stay out of the statistics when rollups are off
+            with contextlib.closing(self.pool.open_connection()) as conn:
+                stored = stored_tables(conn)
+            self.column_stats = ColumnStatsStore(
+                self.pool.open_connection,
+                self.data_version.token,
+                interval=stats_interval,
+                exclude=[MANIFEST_TABLE, *stored, *(self.rollups.tables if self.rollups else ())],
+            )
+            self.column_stats.start()
+        self.warm_status: Dict[str, Any] = {"state": "disabled"}
+        if warm_cache:
+            self.warm_status = {"state": "running"}
+            threading.Thread(target=self._warm_cache, name="sqlite-warmup", daemon=True).start()
         self.server = Server("sql-database-server")
         self.setup_handlers()
     
+    def _warm_cache(self):
+        """Pull the database file into the OS page cache and open the pool's connections."""
+        started = time.monotonic()
+        try:
+            warmed = warm_page_cache(self.db_path)
+            held = [self.pool.acquire() for _ in range(self.pool.size)]
+            for pooled in held:
+                self.pool.release(pooled)
+            self.warm_status = {
+                "state": "done",
+                "bytes": warmed,
+                "seconds": round(time.monotonic() - started, 3),
+            }
+        except Exception as e:
+            self.warm_status = {"state": "error", "error": str(e)}
+    
     def setup_handlers(self):
         """Set up MCP server handlers."""
         
@@ -43,11 +373,379 @@ class DatabaseMCPServer:
                             "query": {
                                 "type": "string",
                                 "description": "The SQL query to execute"
+                            },
+                            "params": {
+                                "type": ["array", "object"],
+                                "description": (
+                                    "Values bound to the query's placeholders: an array for ?, an object for "
+                                    ":name. Prefer these over literals in the SQL, so repeated queries reuse "
+                                    "the prepared statement"
+                                )
+                            },
+                            "page_size": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": "Return only the first page of rows plus a cursor for fetch_next"
+                            },
+                            "timeout_ms": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": "Cancel the query after this many milliseconds (defaults to the server setting)"
+                            },
+                            "max_rows": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": "Truncate the result after this many rows (capped by the server limit)"
+                            },
+                            "max_bytes": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": "Truncate the result before it exceeds this many bytes (capped by the server limit)"
+                            },
+                            "priority": {
+                                "type": "string",
+                                "enum": list(PRIORITIES),
+                                "description": (
+                                    "Admission class when the server is busy; interactive calls are admitted "
+                                    "before batch ones. Defaults to batch for csv, jsonl and arrow exports, interactive otherwise"
+                                )
+                            },
+                            "format": {
+                                "type": "string",
+                                "enum": list(FORMATS),
+                                "default": "text",
+                                "description": (
+                                    "Result format; json-columns returns column names, types and per-column "
+                                    "value arrays, arrow returns an Arrow IPC stream as an embedded resource"
+                                )
                             }
                         },
                         "required": ["query"]
                     }
                 ),
+                types.Tool(
+                    name="query_batch",
+                    description=(
+                        "Execute several SQL queries in one call. Results come back in order as JSON "
+                        "with per-statement timing and errors; one failing statement does not stop the others"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "queries": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "minItems": 1,
+                                "maxItems": self.max_batch_statements,
+                                "description": "The SQL queries to execute"
+                            },
+                            "params": {
+                                "type": "array",
+                                "items": {"type": ["array", "object", "null"]},
+                                "description": (
+                                    "Values bound to each query's placeholders, by position in queries: an "
+                                    "array for ?, an object for :name, or null for a query without any"
+                                )
+                            },
+                            "parallel": {
+                                "type": "boolean",
+                                "default": False,
+                                "description": (
+                                    "Run the queries concurrently on pooled connections. By default they run "
+                                    "one after another inside a single read transaction, so all results "
+                                    "come from the same snapshot and writes are rolled back"
+                                )
+                            },
+                            "timeout_ms": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": (
+                                    "Deadline per query when parallel, for the whole batch otherwise "
+                                    "(defaults to the server setting)"
+                                )
+                            },
+                            "max_rows": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": "Truncate each result after this many rows (capped by the server limit)"
+                            },
+                            "max_bytes": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": "Truncate each result before it exceeds this many bytes (capped by the server limit)"
+                            },
+                            "priority": {
+                                "type": "string",
+                                "enum": list(PRIORITIES),
+                                "description": (
+                                    "Admission class when the server is busy; interactive calls are admitted "
+                                    "before batch ones. Defaults to batch for batches, interactive otherwise"
+                                )
+                            },
+                            "format": {
+                                "type": "string",
+                                "enum": [fmt for fmt in FORMATS if fmt != "arrow"],
+                                "default": "text",
+                                "description": "Format of each result"
+                            }
+                        },
+                        "required": ["queries"]
+                    }
+                ),
+                types.Tool(
+                    name="stream_query",
+                    description=(
+                        "Execute a SQL query and stream its rows in chunks as progress notifications "
+                        "(the message holds the chunk) while the result is still being read; the "
+                        "response is a JSON summary. Needs a progress token, otherwise the rows are "
+                        "returned as by query_database"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "query": {
+                                "type": "string",
+                                "description": "The SQL query to execute"
+                            },
+                            "params": {
+                                "type": ["array", "object"],
+                                "description": (
+                                    "Values bound to the query's placeholders: an array for ?, an object for "
+                                    ":name. Prefer these over literals in the SQL, so repeated queries reuse "
+                                    "the prepared statement"
+                                )
+                            },
+                            "format": {
+                                "type": "string",
+                                "enum": list(STREAM_FORMATS),
+                                "default": "jsonl",
+                                "description": "Chunk format; concatenated chunks form the whole result"
+                            },
+                            "chunk_rows": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "default": FETCH_BATCH_SIZE,
+                                "description": "Rows per chunk"
+                            },
+                            "max_rows": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": "Stop after this many rows (streams are not capped by the server's result limits)"
+                            },
+                            "max_bytes": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": "Stop before the streamed output exceeds this many bytes"
+                            },
+                            "timeout_ms": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": "Cancel the query after this many milliseconds (defaults to the server setting)"
+                            },
+                            "priority": {
+                                "type": "string",
+                                "enum": list(PRIORITIES),
+                                "description": "Admission class when the server is busy; defaults to batch"
+                            },
+                            "stream_id": {
+                                "type": "string",
+                                "description": "Client-chosen id by which cancel_stream can stop this stream"
+                            }
+                        },
+                        "required": ["query"]
+                    }
+                ),
+                types.Tool(
+                    name="cancel_stream",
+                    description="Stop a running stream_query call by the stream_id it was started with",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "stream_id": {
+                                "type": "string",
+                                "description": "The stream_id passed to stream_query"
+                            }
+                        },
+                        "required": ["stream_id"]
+                    }
+                ),
+                types.Tool(
+                    name="sample_table",
+                    description=(
+                        "Return a few random rows of a table as examples of its real values. Sampling "
+                        "looks up random keys instead of sorting the table, and samples are reused until "
+                        "the data changes"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "table": {
+                                "type": "string",
+                                "description": "Table to sample"
+                            },
+                            "rows": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "maximum": MAX_SAMPLE_ROWS,
+                                "default": 5,
+                                "description": "Number of rows to sample"
+                            },
+                            "format": {
+                                "type": "string",
+                                "enum": list(FORMATS),
+                                "default": "text",
+                                "description": "Result format, as for query_database"
+                            }
+                        },
+                        "required": ["table"]
+                    }
+                ),
+                types.Tool(
+                    name="column_stats",
+                    description=(
+                        "Return precomputed column statistics: row count, null fraction, distinct count, "
+                        "min/max, most common values and equi-depth histograms for numeric and date columns. "
+                        "Useful for estimating how many rows a filter or join produces"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "table": {
+                                "type": "string",
+                                "description": "Only this table (defaults to all tables)"
+                            },
+                            "column": {
+                                "type": "string",
+                                "description": "Only this column of each returned table"
+                            },
+                            "wait_ms": {
+                                "type": "integer",
+                                "minimum": 0,
+                                "description": "Wait up to this long for the first computation after server start"
+                            }
+                        },
+                        "required": []
+                    }
+                ),
+                types.Tool(
+                    name="explain_query",
+                    description=(
+                        "Show how SQLite would execute a query without running it: the EXPLAIN QUERY PLAN "
+                        "tree as JSON, with each step classified as full_scan, index_search, covering_index, "
+                        "temp_btree or correlated_subquery, plus a summary of findings"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "query": {
+                                "type": "string",
+                                "description": "The SQL query to explain"
+                            },
+                            "timeout_ms": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": "Cancel planning after this many milliseconds (defaults to the server setting)"
+                            }
+                        },
+                        "required": ["query"]
+                    }
+                ),
+                types.Tool(
+                    name="profile_query",
+                    description=(
+                        "Run a read-only query the way query_database would (rollups, partition routing) "
+                        "and report wall-clock and CPU time, SQLite VM instructions, rows produced and "
+                        "bytes formatted, with time split into prepare, step and format. Bypasses the "
+                        "result cache; statements that write are rejected"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "query": {
+                                "type": "string",
+                                "description": "The SQL query to profile"
+                            },
+                            "params": {
+                                "type": ["array", "object"],
+                                "description": "Values bound to the query's placeholders: an array for ?, an object for :name"
+                            },
+                            "runs": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "maximum": MAX_PROFILE_RUNS,
+                                "default": 1,
+                                "description": "Run the query this many times and report the fastest run"
+                            },
+                            "timeout_ms": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": "Deadline for all runs together (defaults to the server setting)"
+                            },
+                            "priority": {
+                                "type": "string",
+                                "enum": list(PRIORITIES),
+                                "description": (
+                                    "Admission class when the server is busy; interactive calls are admitted "
+                                    "before batch ones. Defaults to batch for profiling, interactive otherwise"
+                                )
+                            },
+                            "format": {
+                                "type": "string",
+                                "enum": list(FORMATS),
+                                "default": "text",
+                                "description": "Result format whose formatting cost is measured"
+                            }
+                        },
+                        "required": ["query"]
+                    }
+                ),
+                types.Tool(
+                    name="fetch_next",
+                    description="Fetch the next page of a paginated query_database result",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "cursor": {
+                                "type": "string",
+                                "description": "Cursor token returned by the previous page"
+                            },
+                            "page_size": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": "Rows to return (defaults to the size of the first page)"
+                            },
+                            "priority": {
+                                "type": "string",
+                                "enum": list(PRIORITIES),
+                                "description": "Admission class when the server is busy (defaults to interactive)"
+                            },
+                            "timeout_ms": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": "Cancel the query after this many milliseconds (defaults to the server setting)"
+                            }
+                        },
+                        "required": ["cursor"]
+                    }
+                ),
+                types.Tool(
+                    name="server_stats",
+                    description="Report server counters such as result cache hits and misses",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {},
+                        "required": []
+                    }
+                ),
+                types.Tool(
+                    name="server_config",
+                    description="Report the SQLite engine settings and server limits actually in effect",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {},
+                        "required": []
+                    }
+                ),
                 types.Tool(
                     name="get_schema",
                     description="Get the database schema information including all tables and columns",
@@ -71,107 +769,1012 @@ class DatabaseMCPServer:
         @self.server.call_tool()
         async def handle_call_tool(
             name: str, arguments: dict[str, Any]
-        ) -> list[types.TextContent]:
+        ) -> list[types.TextContent | types.EmbeddedResource]:
             """Handle tool calls."""
             
-            if name == "query_database":
-                return await self._query_database(arguments.get("query", ""))
-            elif name == "get_schema":
-                return await self._get_schema()
-            elif name == "list_tables":
-                return await self._list_tables()
+            if name in ("server_stats", "server_config", "cancel_stream"):
+                # Monitoring and cancellation keep working while the server is saturated
+                return await self._call_tool(name, arguments)
+            try:
+                async with self.admission.admit(self._priority(name, arguments)):
+                    return await self._call_tool(name, arguments)
+            except AdmissionRejected as e:
+                return [types.TextContent(type="text", text=f"{e}. Retry after {e.retry_after_ms} ms.")]
+    
+    def _priority(self, name: str, arguments: dict[str, Any]) -> str:
+        """Pick the admission class of a tool call: explicit, or batch for bulk work and exports."""
+        if arguments.get("priority") in PRIORITIES:
+            return arguments["priority"]
+        if name in ("query_batch", "profile_query", "stream_query"):
+            return BATCH
+        if name == "query_database" and arguments.get("format") in EXPORT_FORMATS:
+            return BATCH
+        return INTERACTIVE
+    
+    async def _call_tool(
+        self, name: str, arguments: dict[str, Any]
+    ) -> list[types.TextContent | types.EmbeddedResource]:
+        """Dispatch a tool call to its implementation."""
+        if name == "query_database":
+            if arguments.get("page_size"):
+                return await self._query_page(
+                    arguments.get("query", ""),
+                    int(arguments["page_size"]),
+                    fmt=arguments.get("format", "text"),
+                    timeout_ms=arguments.get("timeout_ms"),
+                    params=arguments.get("params"),
+                )
+            return await self._query_database(
+                arguments.get("query", ""),
+                max_rows=arguments.get("max_rows"),
+                max_bytes=arguments.get("max_bytes"),
+                fmt=arguments.get("format", "text"),
+                timeout_ms=arguments.get("timeout_ms"),
+                params=arguments.get("params"),
+            )
+        elif name == "query_batch":
+            return await self._query_batch(
+                arguments.get("queries", []),
+                parallel=bool(arguments.get("parallel", False)),
+                max_rows=arguments.get("max_rows"),
+                max_bytes=arguments.get("max_bytes"),
+                fmt=arguments.get("format", "text"),
+                timeout_ms=arguments.get("timeout_ms"),
+                params=arguments.get("params"),
+            )
+        elif name == "stream_query":
+            return await self._stream_query(
+                arguments.get("query", ""),
+                fmt=arguments.get("format", "jsonl"),
+                chunk_rows=arguments.get("chunk_rows"),
+                max_rows=arguments.get("max_rows"),
+                max_bytes=arguments.get("max_bytes"),
+                timeout_ms=arguments.get("timeout_ms"),
+                params=arguments.get("params"),
+                stream_id=arguments.get("stream_id"),
+            )
+        elif name == "cancel_stream":
+            return await self._cancel_stream(arguments.get("stream_id", ""))
+        elif name == "sample_table":
+            return await self._sample_table(
+                arguments.get("table", ""),
+                rows=arguments.get("rows", 5),
+                fmt=arguments.get("format", "text"),
+            )
+        elif name == "column_stats":
+            return await self._column_stats(
+                arguments.get("table"),
+                arguments.get("column"),
+                wait_ms=arguments.get("wait_ms", 0),
+            )
+        elif name == "explain_query":
+            return await self._explain_query(arguments.get("query", ""), timeout_ms=arguments.get("timeout_ms"))
+        elif name == "profile_query":
+            return await self._profile_query(
+                arguments.get("query", ""),
+                runs=arguments.get("runs", 1),
+                fmt=arguments.get("format", "text"),
+                timeout_ms=arguments.get("timeout_ms"),
+                params=arguments.get("params"),
+            )
+        elif name == "fetch_next":
+            return await self._fetch_next(
+                arguments.get("cursor", ""),
+                arguments.get("page_size"),
+                timeout_ms=arguments.get("timeout_ms"),
+            )
+        elif name == "server_stats":
+            return await self._server_stats()
+        elif name == "server_config":
+            return await self._server_config()
+        elif name == "get_schema":
+            return await self._get_schema()
+        elif name == "list_tables":
+            return await self._list_tables()
+        else:
+            raise ValueError(f"Unknown tool: {name}")
+    
+    def close(self):
+        """Stop the worker threads and release pooled database connections."""
+        self.executor.shutdown()
+        if self.processes is not None:
+            self.processes.close()
+        self.cursors.close()
+        if self.column_stats is not None:
+            self.column_stats.close()
+        if self.rollups is not None:
+            self.rollups.close()
+        self.data_version.close()
+        if self.partitions is not None:
+            self.partitions.close()
+        self.pool.close()
+    
+    async def _query_database(
+        self,
+        query: str,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        fmt: str = "text",
+        timeout_ms: Optional[int] = None,
+        params: Any = None,
+    ) -> list[types.TextContent | types.EmbeddedResource]:
+        """Execute a SQL query against the database, binding params to its placeholders."""
+        guard = self._guard(timeout_ms)
+        try:
+            if fmt not in FORMATS:
+                raise ValueError(f"Unsupported result format: {fmt}")
+            
+            max_rows, max_bytes = self._budgets(max_rows, max_bytes)
+            if self.processes is not None:
+                result, cache_hit = await self._run_query_in_process(
+                    query, max_rows, max_bytes, fmt, guard, bind_params(params)
+                )
             else:
-                raise ValueError(f"Unknown tool: {name}")
+                result, cache_hit = await self.executor.run(
+                    self._run_query, query, max_rows, max_bytes, fmt, guard, bind_params(params), guard=guard
+                )
+            
+            metadata = result.metadata()
+            metadata["cached"] = cache_hit
+            return [
+                self._result_content(result, fmt),
+                types.TextContent(type="text", text=json.dumps(metadata)),
+            ]
+            
+        except QueryCancelled as e:
+            return [types.TextContent(type="text", text=str(e))]
+        except Exception as e:
+            error_msg = f"Database query error: {str(e)}"
+            return [types.TextContent(type="text", text=error_msg)]
+    
+    async def _run_query_in_process(
+        self,
+        query: str,
+        max_rows: int,
+        max_bytes: int,
+        fmt: str,
+        guard: QueryGuard,
+        params: Union[tuple, Dict[str, Any]] = (),
+    ) -> Tuple[FormattedResult, bool]:
+        """Serve a query from the result cache or run it in a worker process."""
+        normalized = normalize_sql(query)
+        cacheable = self.result_cache is not None and not is_volatile(normalized)
+        if cacheable:
+            key = (normalized, params_key(params), fmt, max_rows, max_bytes)
+            # Read the version before executing so a concurrent write invalidates the entry
+            version = self.data_version.token()
+            cached = self.result_cache.get(key, version)
+            if cached is not None:
+                return cached, True
+        
+        if self.rollups is not None:
+            # Reading the data version blocks, so it runs on a worker thread under the call's deadline
+            query = await self.executor.call(self._rewrite_for_rollups, query, guard, guard=guard)
+        # Workers are read-only, so nothing they return reflects a write
+        result = await self.processes.run(query, params, max_rows, max_bytes, fmt, guard)
+        if cacheable:
+            self.result_cache.put(key, version, result, result.bytes_returned)
+        return result, False
+    
+    def _rewrite_for_rollups(self, query: str, guard: QueryGuard) -> str:
+        """Rewrite a query to read a current rollup, unless the call's deadline has passed."""
+        guard.check()
+        query = self.rollups.rewrite(query) or query
+        guard.check()
+        return query
     
-    async def _query_database(self, query: str) -> list[types.TextContent]:
-        """Execute a SQL query against the database."""
+    def _budgets(self, max_rows: Optional[int], max_bytes: Optional[int]) -> Tuple[int, int]:
+        """Apply a caller's row and byte budgets; they may tighten the server limits but never loosen them."""
+        max_rows = min(int(max_rows), self.max_result_rows) if max_rows else self.max_result_rows
+        max_bytes = min(int(max_bytes), self.max_result_bytes) if max_bytes else self.max_result_bytes
+        return max_rows, max_bytes
+    
+    def _guard(self, timeout_ms: Optional[int]) -> QueryGuard:
+        """Create the deadline for one tool call, capped at the server maximum."""
+        timeout_ms = int(timeout_ms) if timeout_ms else self.query_timeout_ms
+        return QueryGuard(min(timeout_ms, self.max_query_timeout_ms) if timeout_ms else None)
+    
+    def _result_content(
+        self, result: FormattedResult, fmt: str
+    ) -> types.TextContent | types.EmbeddedResource:
+        """Wrap a formatted result as MCP content."""
+        if result.payload is not None:
+            # Binary results travel as a base64 blob in an embedded resource
+            return types.EmbeddedResource(
+                type="resource",
+                resource=types.BlobResourceContents(
+                    uri=AnyUrl("query://result.arrows"),
+                    mimeType=ARROW_MIME_TYPE,
+                    blob=base64.b64encode(result.payload).decode("ascii"),
+                ),
+            )
+        
+        text = result.text
+        if result.truncated and fmt == "text":
+            text += (
+                f"\n\n[Result truncated after {result.rows_returned} rows. "
+                "Refine the query or use page_size to read further.]"
+            )
+        return types.TextContent(type="text", text=text)
+    
+    def _run_query(
+        self,
+        conn: sqlite3.Connection,
+        query: str,
+        max_rows: int,
+        max_bytes: int,
+        fmt: str,
+        guard: Optional[QueryGuard] = None,
+        params: Union[tuple, Dict[str, Any]] = (),
+        use_cache: bool = True,
+        version: Optional[Tuple[int, ...]] = None,
+    ) -> Tuple[FormattedResult, bool]:
+        """
+        Serve a query from the result cache or execute it, on a worker thread.
+        
+        version pins the cache lookup to a data version already read by the caller,
+        e.g. the one a batch's read transaction started at.
+        """
+        normalized = normalize_sql(query)
+        cacheable = use_cache and self.result_cache is not None and not is_volatile(normalized)
+        if cacheable:
+            key = (normalized, params_key(params), fmt, max_rows, max_bytes)
+            if version is None:
+                # Read the version before executing so a concurrent write invalidates the entry
+                version = self.data_version.token()
+            cached = self.result_cache.get(key, version)
+            if cached is not None:
+                return cached, True
+        
+        changes = conn.total_changes
+        if guard is not None:
+            with guard.watch(conn):
+                result = self._execute_query(conn, query, max_rows, max_bytes, fmt, guard, params)
+        else:
+            result = self._execute_query(conn, query, max_rows, max_bytes, fmt, params=params)
+        
+        # Statements that modified rows are never cached, nor results from a replaced replica
+        if cacheable and conn.total_changes == changes and self._reads_current(conn):
+            self.result_cache.put(key, version, result, result.bytes_returned)
+        return result, False
+    
+    def _reads_current(self, conn: sqlite3.Connection) -> bool:
+        """Return False for a connection still reading a replica copy that has been replaced."""
+        return self.replica is None or self.replica.is_current(conn)
+    
+    def _execute_query(
+        self,
+        conn: sqlite3.Connection,
+        query: str,
+        max_rows: int,
+        max_bytes: int,
+        fmt: str = "text",
+        guard: Optional[QueryGuard] = None,
+        params: Union[tuple, Dict[str, Any]] = (),
+    ) -> FormattedResult:
+        """Run a query on a worker thread, streaming rows into the formatter."""
+        # Aggregates over a rollup's source read the current rollup table instead
+        if self.rollups is not None:
+            query = self.rollups.rewrite(query) or query
+        
+        # The partition router rewrites SQL text and does not carry bound parameters
+        if self.partitions is not None and not params:
+            routed = self.partitions.route(query)
+            if routed is not None:
+                try:
+                    return self._execute_routed(conn, routed, max_rows, max_bytes, fmt, guard)
+                except (Unroutable, sqlite3.OperationalError):
+                    # The sales view gives the same answer, only without pruning;
+                    # QueryCancelled is not an OperationalError and propagates
+                    pass
+        
+        return execute_formatted(conn, query, params, fmt, max_rows, max_bytes, self._column_types)
+    
+    def _execute_routed(
+        self,
+        conn: sqlite3.Connection,
+        routed: RoutedQuery,
+        max_rows: int,
+        max_bytes: int,
+        fmt: str,
+        guard: Optional[QueryGuard],
+    ) -> FormattedResult:
+        """Scan the pruned partitions in parallel and format the merged rows."""
+        # One row over the budget lets the formatter report truncation
+        with self.partitions.open_result(routed, guard, max_rows + 1) as cursor:
+            columns = cursor_columns(cursor)
+            column_types = self._declared_types(conn, columns) if fmt in ("json-columns", "arrow") else None
+            return format_result(columns, iter_batches(cursor), fmt, max_rows, max_bytes, column_types)
+    
+    def _declared_types(self, conn: sqlite3.Connection, columns: List[str]) -> List[Optional[str]]:
+        """Look up declared column types by result column name (see DeclaredTypes)."""
+        return self._column_types.lookup(conn, columns)
+    
+    async def _stream_query(
+        self,
+        query: str,
+        fmt: str = "jsonl",
+        chunk_rows: Optional[int] = None,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        timeout_ms: Optional[int] = None,
+        params: Any = None,
+        stream_id: Optional[str] = None,
+    ) -> list[types.TextContent | types.EmbeddedResource]:
+        """Execute a query and send its rows as progress notifications chunk by chunk."""
+        context = self.server.request_context
+        token = context.meta.progressToken if context.meta else None
+        if token is None:
+            # Nowhere to stream to; answer like query_database, within its budgets
+            return await self._query_database(query, max_rows, max_bytes, fmt, timeout_ms, params)
+        
+        guard = self._guard(timeout_ms)
+        if stream_id:
+            self._streams[stream_id] = guard
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            if fmt not in STREAM_FORMATS:
+                raise ValueError(f"Unsupported stream format: {fmt}")
+            params = bind_params(params)
+            chunk_rows = int(chunk_rows) if chunk_rows else FETCH_BATCH_SIZE
+            loop = asyncio.get_running_loop()
             
-            # Execute the query
-            cursor.execute(query)
+            def send(chunk: str, rows_sent: int):
+                # Blocks the worker until the chunk is written, so a slow client
+                # slows the cursor down instead of chunks piling up in memory
+                asyncio.run_coroutine_threadsafe(
+                    context.session.send_progress_notification(
+                        token, rows_sent, message=chunk, related_request_id=context.request_id
+                    ),
+                    loop,
+                ).result()
             
-            # Get column names
-            columns = [description[0] for description in cursor.description] if cursor.description else []
+            summary = await self.executor.run(
+                self._run_stream, query, fmt, chunk_rows, max_rows, max_bytes, guard, send, params, guard=guard
+            )
+            return [types.TextContent(type="text", text=json.dumps(summary))]
             
-            # Fetch results
-            rows = cursor.fetchall()
+        except QueryCancelled as e:
+            return [types.TextContent(type="text", text=str(e))]
+        except Exception as e:
+            error_msg = f"Database query error: {str(e)}"
+            return [types.TextContent(type="text", text=error_msg)]
+        finally:
+            if stream_id:
+                self._streams.pop(stream_id, None)
+    
+    async def _cancel_stream(self, stream_id: str) -> list[types.TextContent]:
+        """Cancel the running stream_query call started with stream_id."""
+        guard = self._streams.get(stream_id)
+        if guard is not None:
+            guard.cancel()
+        return [types.TextContent(type="text", text=json.dumps({"cancelled": guard is not None}))]
+    
+    def _run_stream(
+        self,
+        conn: sqlite3.Connection,
+        query: str,
+        fmt: str,
+        chunk_rows: int,
+        max_rows: Optional[int],
+        max_bytes: Optional[int],
+        guard: QueryGuard,
+        send: Callable[[str, int], None],
+        params: Union[tuple, Dict[str, Any]] = (),
+    ) -> Dict[str, Any]:
+        """Read the cursor on a worker thread, handing each formatted chunk to send."""
+        started = time.monotonic()
+        first_chunk_ms = None
+        chunks = rows = nbytes = 0
+        truncated = False
+        # Aggregates over a rollup's source read the current rollup table instead
+        if self.rollups is not None:
+            query = self.rollups.rewrite(query) or query
+        
+        # One row over the budget lets the chunker report truncation
+        routed_rows = max_rows + 1 if max_rows else None
+        with guard.watch(conn), self._open_rows(conn, query, params, guard, routed_rows) as (cursor, _):
+            batches = iter_batches(cursor, min(chunk_rows, FETCH_BATCH_SIZE))
+            for chunk in iter_chunks(cursor_columns(cursor), batches, fmt, chunk_rows, max_rows, max_bytes):
+                rows += chunk.rows_returned
+                nbytes += chunk.bytes_returned
+                truncated = chunk.truncated
+                if chunk.text:
+                    send(chunk.text, rows)
+                    chunks += 1
+                    if first_chunk_ms is None:
+                        first_chunk_ms = round((time.monotonic() - started) * 1000, 3)
+        return {
+            "rows_streamed": rows,
+            "chunks": chunks,
+            "bytes_streamed": nbytes,
+            "truncated": truncated,
+            "first_chunk_ms": first_chunk_ms,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 3),
+        }
+    
+    @contextlib.contextmanager
+    def _open_rows(
+        self,
+        conn: sqlite3.Connection,
+        query: str,
+        params: Union[tuple, Dict[str, Any]],
+        guard: QueryGuard,
+        max_rows: Optional[int],
+    ) -> Iterator[Tuple[sqlite3.Cursor, bool]]:
+        """
+        Yield a cursor over a query's rows and whether the partition router produced it.
+        
+        Routes the query as _execute_query does; max_rows is the router's row cap.
+        """
+        with contextlib.ExitStack() as stack:
+            cursor = None
+            if self.partitions is not None and not params:
+                routed = self.partitions.route(query)
+                if routed is not None:
+                    try:
+                        cursor = stack.enter_context(self.partitions.open_result(routed, guard, max_rows))
+                    except (Unroutable, sqlite3.OperationalError):
+                        pass
+            if cursor is not None:
+                yield cursor, True
+                return
+            cursor = conn.execute(query, params)
+            stack.callback(cursor.close)
+            yield cursor, False
+    
+    async def _query_batch(
+        self,
+        queries: List[str],
+        parallel: bool = False,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        fmt: str = "text",
+        timeout_ms: Optional[int] = None,
+        params: Optional[List[Any]] = None,
+    ) -> list[types.TextContent]:
+        """Execute several queries and return their results in order as one JSON document."""
+        started = time.monotonic()
+        try:
+            if not isinstance(queries, list) or not queries:
+                raise ValueError("queries must be a non-empty list of SQL strings")
+            if len(queries) > self.max_batch_statements:
+                raise ValueError(f"At most {self.max_batch_statements} queries per batch")
+            if fmt not in FORMATS or fmt == "arrow":
+                raise ValueError(f"Unsupported batch result format: {fmt}")
+            if params is None:
+                params = [None] * len(queries)
+            if not isinstance(params, list) or len(params) != len(queries):
+                raise ValueError("params must be a list with one entry per query")
+            bound = [bind_params(values) for values in params]
             
-            conn.close()
+            max_rows, max_bytes = self._budgets(max_rows, max_bytes)
+            if parallel:
+                # One deadline per statement; the executor bounds the concurrency
+                guards = [self._guard(timeout_ms) for _ in queries]
+                results = await asyncio.gather(*(
+                    self.executor.run(
+                        self._batch_statement, index, query, max_rows, max_bytes, fmt, guard, values, guard=guard
+                    )
+                    for index, (query, guard, values) in enumerate(zip(queries, guards, bound))
+                ))
+            else:
+                guard = self._guard(timeout_ms)
+                results = await self.executor.run(
+                    self._run_batch, queries, max_rows, max_bytes, fmt, guard, bound, guard=guard
+                )
             
-            # Format results
-            if not rows:
-                result = "No results found."
+            batch = {
+                "mode": "parallel" if parallel else "snapshot",
+                "statements": len(results),
+                "failed": sum(1 for result in results if not result["ok"]),
+                "elapsed_ms": round((time.monotonic() - started) * 1000, 3),
+                "results": results,
+            }
+            return [types.TextContent(type="text", text=json.dumps(batch, ensure_ascii=False))]
+            
+        except Exception as e:
+            error_msg = f"Database query error: {str(e)}"
+            return [types.TextContent(type="text", text=error_msg)]
+    
+    def _run_batch(
+        self,
+        conn: sqlite3.Connection,
+        queries: List[str],
+        max_rows: int,
+        max_bytes: int,
+        fmt: str,
+        guard: QueryGuard,
+        params: List[Union[tuple, Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        """Run a batch sequentially inside one read transaction, on a worker thread."""
+        before = self.data_version.token() if self.result_cache is not None else None
+        with conn.uncounted():
+            conn.execute("BEGIN")
+        try:
+            # Reading the schema starts the read transaction and fixes the snapshot
+            with conn.uncounted():
+                conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+            # Cached results are only valid if nothing changed before the snapshot began
+            pinned = before is not None and self.data_version.token() == before and self._reads_current(conn)
+            results = []
+            for index, (query, values) in enumerate(zip(queries, params)):
+                if guard.expired():
+                    # The batch deadline covers every statement; don't start new ones
+                    results.append({"index": index, "query": query, "ok": False,
+                                    "error": "Skipped: batch deadline exceeded or cancelled", "elapsed_ms": 0.0})
+                    continue
+                results.append(self._batch_statement(
+                    conn, index, query, max_rows, max_bytes, fmt, guard, values,
+                    use_cache=pinned, version=before if pinned else None,
+                ))
+            return results
+        finally:
+            conn.rollback()
+    
+    def _batch_statement(
+        self,
+        conn: sqlite3.Connection,
+        index: int,
+        query: str,
+        max_rows: int,
+        max_bytes: int,
+        fmt: str,
+        guard: QueryGuard,
+        params: Union[tuple, Dict[str, Any]] = (),
+        use_cache: bool = True,
+        version: Optional[Tuple[int, ...]] = None,
+    ) -> Dict[str, Any]:
+        """Run one statement of a batch and describe its outcome, capturing errors."""
+        started = time.monotonic()
+        entry: Dict[str, Any] = {"index": index, "query": query}
+        try:
+            result, cache_hit = self._run_query(
+                conn, query, max_rows, max_bytes, fmt, guard, params, use_cache=use_cache, version=version
+            )
+            entry["ok"] = True
+            entry["result"] = result.text
+            entry.update(result.metadata())
+            entry["cached"] = cache_hit
+        except QueryCancelled as e:
+            entry["ok"] = False
+            entry["error"] = str(e)
+        except Exception as e:
+            entry["ok"] = False
+            entry["error"] = f"Database query error: {str(e)}"
+        entry["elapsed_ms"] = round((time.monotonic() - started) * 1000, 3)
+        return entry
+    
+    async def _sample_table(self, table: str, rows: int = 5, fmt: str = "text") -> list[types.TextContent]:
+        """Return random example rows of a table, cached until the data changes."""
+        guard = self._guard(None)
+        try:
+            if fmt not in FORMATS:
+                raise ValueError(f"Unsupported result format: {fmt}")
+            rows = int(rows)
+            key = ("sample_table", table.lower(), rows, fmt)
+            version = self.data_version.token() if self.result_cache is not None else None
+            result = self.result_cache.get(key, version) if self.result_cache is not None else None
+            cache_hit = result is not None
+            if result is None:
+                result, method = await self.executor.run(self._run_sample, table, rows, fmt, guard, guard=guard)
+                if self.result_cache is not None:
+                    self.result_cache.put(key, version, (result, method), result.bytes_returned)
             else:
-                # Create a formatted table
-                result_lines = []
-                if columns:
-                    result_lines.append(" | ".join(columns))
-                    result_lines.append("-" * len(" | ".join(columns)))
-                
-                for row in rows:
-                    result_lines.append(" | ".join(str(cell) for cell in row))
-                
-                result = "\n".join(result_lines)
+                result, method = result
             
-            return [types.TextContent(type="text", text=result)]
+            metadata = {"table": table, "rows_sampled": result.rows_returned, "method": method, "cached": cache_hit}
+            return [
+                self._result_content(result, fmt),
+                types.TextContent(type="text", text=json.dumps(metadata)),
+            ]
             
+        except QueryCancelled as e:
+            return [types.TextContent(type="text", text=str(e))]
         except Exception as e:
             error_msg = f"Database query error: {str(e)}"
             return [types.TextContent(type="text", text=error_msg)]
     
+    def _run_sample(
+        self, conn: sqlite3.Connection, table: str, rows: int, fmt: str, guard: QueryGuard
+    ) -> Tuple[FormattedResult, str]:
+        """Sample a table on a worker thread and format the rows."""
+        with guard.watch(conn):
+            columns, sampled, method = sample_table(conn, table, rows, fetch=self._fetch)
+            column_types = self._declared_types(conn, columns) if fmt in ("json-columns", "arrow") else None
+        return format_result(columns, [sampled], fmt, column_types=column_types), method
+    
+    def _fetch(self, conn: sqlite3.Connection, query: str) -> Tuple[List[str], List[tuple]]:
+        """Run a small statement, scanning partition files directly where the router can."""
+        if self.partitions is not None:
+            routed = self.partitions.route(query)
+            if routed is not None:
+                try:
+                    with self.partitions.open_result(routed) as cursor:
+                        return cursor_columns(cursor), cursor.fetchall()
+                except Unroutable:
+                    pass
+        cursor = conn.execute(query)
+        try:
+            return cursor_columns(cursor), cursor.fetchall()
+        finally:
+            cursor.close()
+    
+    async def _column_stats(
+        self, table: Optional[str] = None, column: Optional[str] = None, wait_ms: int = 0
+    ) -> list[types.TextContent]:
+        """Return the background-computed column statistics as JSON."""
+        if self.column_stats is None:
+            return [types.TextContent(type="text", text="Column statistics are disabled on this server.")]
+        try:
+            if wait_ms:
+                # Waits on the default executor so no SQLite worker is held up
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.column_stats.wait_ready, int(wait_ms) / 1000
+                )
+            tables = self.column_stats.get(table)
+            if table and not tables:
+                raise ValueError(f"No statistics for table {table} (unknown table, or not computed yet)")
+            if column:
+                for name, entry in list(tables.items()):
+                    entry["columns"] = {
+                        key: stats for key, stats in entry["columns"].items() if key.lower() == column.lower()
+                    }
+                    if not entry["columns"]:
+                        del tables[name]
+            current = await self.executor.call(self.column_stats.is_current)
+            payload = {"current": current, "tables": tables}
+            return [types.TextContent(type="text", text=json.dumps(payload))]
+            
+        except Exception as e:
+            error_msg = f"Column statistics error: {str(e)}"
+            return [types.TextContent(type="text", text=error_msg)]
+    
+    async def _explain_query(self, query: str, timeout_ms: Optional[int] = None) -> list[types.TextContent]:
+        """Return the query plan tree and its summary as JSON."""
+        guard = self._guard(timeout_ms)
+        try:
+            plan = await self.executor.run(self._run_explain, query, guard, guard=guard)
+            plan = {"query": query, **plan}
+            return [types.TextContent(type="text", text=json.dumps(plan, indent=2))]
+            
+        except QueryCancelled as e:
+            return [types.TextContent(type="text", text=str(e))]
+        except Exception as e:
+            error_msg = f"Database query error: {str(e)}"
+            return [types.TextContent(type="text", text=error_msg)]
+    
+    def _run_explain(self, conn: sqlite3.Connection, query: str, guard: QueryGuard) -> Dict[str, Any]:
+        """Plan a query on a worker thread; planning a statement with many joins can take a while."""
+        with guard.watch(conn):
+            return explain_plan(conn, query)
+    
+    async def _profile_query(
+        self,
+        query: str,
+        runs: int = 1,
+        fmt: str = "text",
+        timeout_ms: Optional[int] = None,
+        params: Any = None,
+    ) -> list[types.TextContent]:
+        """Profile a query and return the fastest run's measurements as JSON."""
+        guard = self._guard(timeout_ms)
+        try:
+            if fmt not in FORMATS:
+                raise ValueError(f"Unsupported result format: {fmt}")
+            runs = max(1, min(int(runs or 1), MAX_PROFILE_RUNS))
+            params = bind_params(params)
+            
+            profiles = []
+            for _ in range(runs):
+                profiles.append(await self.executor.run(
+                    self._run_profile, query, self.max_result_rows, self.max_result_bytes, fmt, guard, params,
+                    guard=guard,
+                ))
+            
+            best = min(profiles, key=lambda profile: profile["wall_ms"])
+            report = {
+                "query": query,
+                "format": fmt,
+                "runs": runs,
+                **best,
+                "wall_ms_all": [profile["wall_ms"] for profile in profiles],
+            }
+            return [types.TextContent(type="text", text=json.dumps(report, indent=2))]
+            
+        except QueryCancelled as e:
+            return [types.TextContent(type="text", text=str(e))]
+        except Exception as e:
+            error_msg = f"Database query error: {str(e)}"
+            return [types.TextContent(type="text", text=error_msg)]
+    
+    def _run_profile(
+        self,
+        conn: sqlite3.Connection,
+        query: str,
+        max_rows: int,
+        max_bytes: int,
+        fmt: str,
+        guard: QueryGuard,
+        params: Union[tuple, Dict[str, Any]] = (),
+    ) -> Dict[str, Any]:
+        """
+        Execute and format a read-only query once, timing each phase, on a worker thread.
+        
+        The query takes query_database's path: a rollup rewrite, then partition
+        routing capped at the row budget. sqlite3 prepares a statement inside
+        execute(), so prepare time is measured separately by compiling EXPLAIN
+        QUERY PLAN for it (parse and plan, no execution) and subtracted from the
+        execute/fetch time to give step time. Rows beyond the result budgets are
+        still stepped through, so timings and counts cover the whole query.
+        """
+        original = query
+        if self.rollups is not None:
+            query = self.rollups.rewrite(query) or query
+        
+        with _query_only(conn):
+            try:
+                return self._profile_once(conn, query, max_rows, max_bytes, fmt, guard, params, original)
+            except sqlite3.OperationalError as e:
+                if "readonly" in str(e):
+                    raise ValueError("profile_query only runs read-only statements") from e
+                raise
+    
+    def _profile_once(
+        self,
+        conn: sqlite3.Connection,
+        query: str,
+        max_rows: int,
+        max_bytes: int,
+        fmt: str,
+        guard: QueryGuard,
+        params: Union[tuple, Dict[str, Any]],
+        original: str,
+    ) -> Dict[str, Any]:
+        """Time one run of an already rewritten query (see _run_profile)."""
+        started = time.perf_counter()
+        conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        prepare = time.perf_counter() - started
+        
+        stepping = 0.0
+        rows_produced = 0
+        
+        def timed_batches():
+            nonlocal stepping, rows_produced
+            while True:
+                fetch_started = time.perf_counter()
+                rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+                stepping += time.perf_counter() - fetch_started
+                if not rows:
+                    return
+                rows_produced += len(rows)
+                yield rows
+        
+        progress_before = guard.progress_calls
+        cpu_started = time.thread_time()
+        started = time.perf_counter()
+        routed_rows = max_rows + 1
+        with guard.watch(conn, PROFILE_INTERVAL), self._open_rows(conn, query, params, guard, routed_rows) as (
+            cursor, routed
+        ):
+            stepping = time.perf_counter() - started
+            
+            format_started = time.perf_counter()
+            stepping_before_format = stepping
+            columns = cursor_columns(cursor)
+            column_types = self._declared_types(conn, columns) if fmt in ("json-columns", "arrow") else None
+            batches = timed_batches()
+            result = format_result(columns, batches, fmt, max_rows, max_bytes, column_types)
+            formatting = time.perf_counter() - format_started - (stepping - stepping_before_format)
+            
+            # Step through whatever the budgets cut off
+            for _ in batches:
+                pass
+        wall = time.perf_counter() - started
+        cpu = time.thread_time() - cpu_started
+        
+        return {
+            "wall_ms": round(wall * 1000, 3),
+            "cpu_ms": round(cpu * 1000, 3),
+            "prepare_ms": round(prepare * 1000, 3),
+            "step_ms": round(max(stepping - prepare, 0.0) * 1000, 3),
+            "format_ms": round(formatting * 1000, 3),
+            "vm_steps": (guard.progress_calls - progress_before) * PROFILE_INTERVAL,
+            "vm_step_resolution": PROFILE_INTERVAL,
+            "rows_produced": rows_produced,
+            "rows_formatted": result.rows_returned,
+            "bytes_formatted": result.bytes_returned,
+            "truncated": result.truncated,
+            "rollup": query != original,
+            "routed": routed,
+        }
+    
+    async def _query_page(
+        self,
+        query: str,
+        page_size: int,
+        fmt: str = "text",
+        timeout_ms: Optional[int] = None,
+        params: Any = None,
+    ) -> list[types.TextContent | types.EmbeddedResource]:
+        """Execute a query and return its first page plus a cursor for the rest."""
+        guard = self._guard(timeout_ms)
+        try:
+            if fmt not in FORMATS:
+                raise ValueError(f"Unsupported result format: {fmt}")
+            token, server_cursor = await self.executor.call(
+                self._open_cursor, query, page_size, fmt, guard, bind_params(params), guard=guard
+            )
+            return await self._read_page(token, server_cursor, page_size, guard)
+            
+        except QueryCancelled as e:
+            return [types.TextContent(type="text", text=str(e))]
+        except Exception as e:
+            error_msg = f"Database query error: {str(e)}"
+            return [types.TextContent(type="text", text=error_msg)]
+    
+    def _open_cursor(
+        self,
+        query: str,
+        page_size: int,
+        fmt: str,
+        guard: Optional[QueryGuard] = None,
+        params: Union[tuple, Dict[str, Any]] = (),
+    ):
+        """Open a server-side cursor on a worker thread."""
+        token, server_cursor = self.cursors.open(query, page_size, guard, params)
+        server_cursor.fmt = fmt
+        if fmt in ("json-columns", "arrow"):
+            server_cursor.column_types = self._declared_types(server_cursor.conn, server_cursor.columns)
+        return token, server_cursor
+    
+    async def _fetch_next(
+        self, token: str, page_size: Optional[int] = None, timeout_ms: Optional[int] = None
+    ) -> list[types.TextContent | types.EmbeddedResource]:
+        """Return the next page of an open cursor."""
+        guard = self._guard(timeout_ms)
+        try:
+            server_cursor = self.cursors.get(token)
+            if server_cursor is None:
+                raise LookupError("Unknown or expired cursor")
+            return await self._read_page(token, server_cursor, int(page_size or server_cursor.page_size), guard)
+            
+        except QueryCancelled as e:
+            return [types.TextContent(type="text", text=str(e))]
+        except Exception as e:
+            error_msg = f"Cursor fetch error: {str(e)}"
+            return [types.TextContent(type="text", text=error_msg)]
+    
+    async def _read_page(
+        self, token: str, server_cursor, page_size: int, guard: Optional[QueryGuard] = None
+    ) -> list[types.TextContent | types.EmbeddedResource]:
+        """Fetch one page on a worker thread and describe where the cursor stands."""
+        rows, exhausted = await self.executor.call(
+            self.cursors.fetch, token, server_cursor, page_size, guard, guard=guard
+        )
+        page = {
+            "cursor": None if exhausted else token,
+            "rows_returned": len(rows),
+            "rows_fetched": server_cursor.rows_fetched,
+            "has_more": not exhausted,
+        }
+        return [
+            self._result_content(
+                format_result(
+                    server_cursor.columns,
+                    [rows],
+                    server_cursor.fmt,
+                    column_types=server_cursor.column_types,
+                ),
+                server_cursor.fmt,
+            ),
+            types.TextContent(type="text", text=json.dumps(page)),
+        ]
+    
+    async def _server_stats(self) -> list[types.TextContent]:
+        """Report cache, pool and cursor counters as JSON."""
+        stats = {
+            "result_cache": self.result_cache.stats() if self.result_cache else None,
+            "schema_cache": {
+                "hits": self._schema_cache_hits,
+                "misses": self._schema_cache_misses,
+            },
+            "pool": self.pool.stats(),
+            "open_cursors": len(self.cursors),
+            "admission": self.admission.stats(),
+            "partitions": self.partitions.stats() if self.partitions else None,
+            "column_stats": self.column_stats.stats() if self.column_stats else None,
+            "rollups": self.rollups.stats() if self.rollups else None,
+            "replica": self.replica.stats() if self.replica else None,
+            "processes": self.processes.stats() if self.processes else None,
+        }
+        return [types.TextContent(type="text", text=json.dumps(stats, indent=2))]
+    
+    async def _server_config(self) -> list[types.TextContent]:
+        """Report requested and effective engine settings as JSON."""
+        try:
+            effective = await self.executor.run(self._effective_pragmas)
+            config = {
+                "db_path": self.db_path,
+                "sqlite_version": sqlite3.sqlite_version,
+                "read_only": self.pool.read_only,
+                "immutable": self.pool.immutable,
+                "pool_size": self.pool.size,
+                "cached_statements": self.pool.cached_statements,
+                "workers": self.executor.max_workers,
+                "max_concurrent": self.admission.max_concurrent,
+                "max_queue": self.admission.max_queue,
+                "queue_timeout_ms": self.admission.queue_timeout_ms,
+                "requested_pragmas": self.pool.pragmas,
+                "effective_pragmas": effective,
+                "warm_cache": self.warm_status,
+                "partitions": len(self.partitions.partitions) if self.partitions else 0,
+                "rollups": self.rollups.mode if self.rollups else "off",
+                "replica": self.replica is not None,
+                "processes": self.processes.workers if self.processes else 0,
+                "query_timeout_ms": self.query_timeout_ms,
+                "max_query_timeout_ms": self.max_query_timeout_ms,
+                "max_result_rows": self.max_result_rows,
+                "max_result_bytes": self.max_result_bytes,
+                "result_cache_bytes": self.result_cache.max_bytes if self.result_cache else 0,
+            }
+            return [types.TextContent(type="text", text=json.dumps(config, indent=2))]
+            
+        except Exception as e:
+            error_msg = f"Configuration error: {str(e)}"
+            return [types.TextContent(type="text", text=error_msg)]
+    
+    def _effective_pragmas(self, conn: sqlite3.Connection) -> Dict[str, Any]:
+        """Read engine settings back from a pooled connection."""
+        names = ["journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store", "query_only", "page_size"]
+        effective = {}
+        for name in names:
+            # Some settings, e.g. mmap_size, report nothing for in-memory databases
+            row = conn.execute(f"PRAGMA {name}").fetchone()
+            effective[name] = row[0] if row else None
+        return effective
+    
     async def _get_schema(self) -> list[types.TextContent]:
         """Get the database schema information."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Get all tables
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = cursor.fetchall()
-            
-            schema_info = []
-            
-            for table in tables:
-                table_name = table[0]
-                schema_info.append(f"\nTable: {table_name}")
-                
-                # Get column information
-                cursor.execute(f"PRAGMA table_info({table_name});")
-                columns = cursor.fetchall()
-                
-                for column in columns:
-                    col_name = column[1]
-                    col_type = column[2]
-                    is_nullable = "NOT NULL" if column[3] else "NULL"
-                    is_pk = "PRIMARY KEY" if column[5] else ""
-                    
-                    col_info = f"  - {col_name} ({col_type}) {is_nullable} {is_pk}".strip()
-                    schema_info.append(col_info)
-            
-            conn.close()
-            
-            result = "\n".join(schema_info)
+            result = await self.executor.run(self._cached_schema)
             return [types.TextContent(type="text", text=result)]
             
         except Exception as e:
             error_msg = f"Schema retrieval error: {str(e)}"
             return [types.TextContent(type="text", text=error_msg)]
     
+    def _cached_schema(self, conn: sqlite3.Connection) -> str:
+        """Return the rendered schema, rebuilding it only after DDL changes."""
+        # schema_version lives in the database header and is bumped by every DDL change
+        schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        cached = self._schema_cache.get(schema_version)
+        if cached is not None:
+            self._schema_cache_hits += 1
+            return cached
+        
+        self._schema_cache_misses += 1
+        schema = self._build_schema(conn)
+        self._schema_cache = {schema_version: schema}
+        return schema
+    
+    def _build_schema(self, conn: sqlite3.Connection) -> str:
+        """Render the schema description on a worker thread."""
+        # Rollup tables are server bookkeeping, not tables to write queries against
+        return describe_schema(conn, exclude=stored_tables(conn))
+    
+    def _table_names(self, conn: sqlite3.Connection) -> List[str]:
+        """Return the database's tables other than rollup bookkeeping, on a worker thread."""
+        hidden = set(stored_tables(conn))
+        rows = conn.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
+        return [name for (name,) in rows if name not in hidden]
+    
     async def _list_tables(self) -> list[types.TextContent]:
         """List all tables in the database."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = cursor.fetchall()
-            
-            conn.close()
+            tables = await self.executor.run(self._table_names)
             
             if tables:
-                table_list = "\n".join([f"- {table[0]}" for table in tables])
+                table_list = "\n".join([f"- {table}" for table in tables])
                 result = f"Tables in database:\n{table_list}"
             else:
                 result = "No tables found in database."
@@ -182,26 +1785,232 @@ class DatabaseMCPServer:
             error_msg = f"Table listing error: {str(e)}"
             return [types.TextContent(type="text", text=error_msg)]
 
+def _env_flag(name: str) -> bool:
+    """Read a boolean setting from the environment."""
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "on")
 
-async def main():
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse server options; each falls back to an environment variable."""
+    workers = os.getenv("SQL_MCP_WORKERS")
+    parser = argparse.ArgumentParser(description="MCP server for SQL database operations")
+    parser.add_argument(
+        "--db-path",
+        default=os.getenv("SQL_MCP_DB_PATH", "sales.db"),
+        help="SQLite database file (SQL_MCP_DB_PATH)",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=("stdio", "http"),
+        default=os.getenv("SQL_MCP_TRANSPORT", "stdio"),
+        help="stdio serves one client as its subprocess; http serves many clients over "
+             "MCP streamable HTTP (SQL_MCP_TRANSPORT)",
+    )
+    parser.add_argument(
+        "--host",
+        default=os.getenv("SQL_MCP_HOST", "127.0.0.1"),
+        help="Address the http transport listens on (SQL_MCP_HOST)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=int(os.getenv("SQL_MCP_PORT", 8000)),
+        help="Port the http transport listens on; clients connect to http://HOST:PORT/mcp (SQL_MCP_PORT)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(workers) if workers else None,
+        help="Worker threads running SQLite queries (SQL_MCP_WORKERS)",
+    )
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=int(os.getenv("SQL_MCP_MAX_CONCURRENT", 0)) or None,
+        help="Tool calls executing at once; defaults to the worker count (SQL_MCP_MAX_CONCURRENT)",
+    )
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        default=int(os.getenv("SQL_MCP_MAX_QUEUE", 64)),
+        help="Tool calls allowed to wait for a slot before new ones are rejected (SQL_MCP_MAX_QUEUE)",
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        default=float(os.getenv("SQL_MCP_STATS_INTERVAL", 5.0)),
+        help="Seconds between column statistics refresh checks; 0 disables them (SQL_MCP_STATS_INTERVAL)",
+    )
+    parser.add_argument(
+        "--cached-statements",
+        type=int,
+        default=int(os.getenv("SQL_MCP_CACHED_STATEMENTS", DEFAULT_CACHED_STATEMENTS)),
+        help="Prepared statements kept per connection (SQL_MCP_CACHED_STATEMENTS)",
+    )
+    parser.add_argument(
+        "--rollups",
+        choices=["off", *ROLLUP_MODES],
+        default=os.getenv("SQL_MCP_ROLLUPS", "off"),
+        help="Maintain rollup tables and answer matching aggregates from them: incremental "
+             "refresh of appended rows, or triggers for exact upkeep under any write (SQL_MCP_ROLLUPS)",
+    )
+    parser.add_argument(
+        "--rollup-definitions",
+        default=os.getenv("SQL_MCP_ROLLUP_DEFINITIONS"),
+        help="JSON file declaring the rollups; defaults to sales by category, region and month "
+             "(SQL_MCP_ROLLUP_DEFINITIONS)",
+    )
+    parser.add_argument(
+        "--replica",
+        action="store_true",
+        default=_env_flag("SQL_MCP_REPLICA"),
+        help="Serve queries read-only from an in-memory copy of the database, refreshed when "
+             "the file changes (SQL_MCP_REPLICA)",
+    )
+    parser.add_argument(
+        "--replica-interval",
+        type=float,
+        default=float(os.getenv("SQL_MCP_REPLICA_INTERVAL", 1.0)),
+        help="Seconds between checks of the file for changes to copy (SQL_MCP_REPLICA_INTERVAL)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=int(os.getenv("SQL_MCP_PROCESSES", 0)),
+        help="Worker processes running query_database read-only, to use more than one core; "
+             "0 runs queries on the worker threads (SQL_MCP_PROCESSES)",
+    )
+    parser.add_argument(
+        "--read-only",
+        action="store_true",
+        default=_env_flag("SQL_MCP_READ_ONLY"),
+        help="Open the database read-only and reject writes (SQL_MCP_READ_ONLY)",
+    )
+    parser.add_argument(
+        "--immutable",
+        action="store_true",
+        default=_env_flag("SQL_MCP_IMMUTABLE"),
+        help="Treat the database as an unchanging snapshot: read-only without locking (SQL_MCP_IMMUTABLE)",
+    )
+    
+    # Engine profile; "default" keeps SQLite's own value for a setting
+    profile = parser.add_argument_group("engine profile")
+    profile.add_argument(
+        "--journal-mode",
+        default=os.getenv("SQL_MCP_JOURNAL_MODE", DEFAULT_PROFILE["journal_mode"]),
+        help="PRAGMA journal_mode, e.g. WAL (SQL_MCP_JOURNAL_MODE)",
+    )
+    profile.add_argument(
+        "--synchronous",
+        default=os.getenv("SQL_MCP_SYNCHRONOUS", DEFAULT_PROFILE["synchronous"]),
+        help="PRAGMA synchronous, e.g. NORMAL (SQL_MCP_SYNCHRONOUS)",
+    )
+    profile.add_argument(
+        "--cache-size",
+        default=os.getenv("SQL_MCP_CACHE_SIZE", DEFAULT_PROFILE["cache_size"]),
+        help="PRAGMA cache_size in pages, or KiB when negative (SQL_MCP_CACHE_SIZE)",
+    )
+    profile.add_argument(
+        "--mmap-size",
+        default=os.getenv("SQL_MCP_MMAP_SIZE", DEFAULT_PROFILE["mmap_size"]),
+        help="PRAGMA mmap_size in bytes (SQL_MCP_MMAP_SIZE)",
+    )
+    profile.add_argument(
+        "--temp-store",
+        default=os.getenv("SQL_MCP_TEMP_STORE", DEFAULT_PROFILE["temp_store"]),
+        help="PRAGMA temp_store: DEFAULT, FILE or MEMORY (SQL_MCP_TEMP_STORE)",
+    )
+    profile.add_argument(
+        "--warm-cache",
+        action="store_true",
+        default=_env_flag("SQL_MCP_WARM_CACHE"),
+        help="Read the database into the OS page cache at startup (SQL_MCP_WARM_CACHE)",
+    )
+    
+    args = parser.parse_args(argv)
+    for name in ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store"):
+        if str(getattr(args, name)).lower() in ("default", "none", ""):
+            setattr(args, name, None)
+    return args
+
+
+async def serve_http(db_server: DatabaseMCPServer, host: str, port: int, path: str = "/mcp"):
+    """
+    Serve MCP over streamable HTTP until interrupted.
+    
+    All clients share this process, so its connection pool, caches and column
+    statistics stay warm across sessions. Responses that send progress, such as
+    stream_query, are delivered as server-sent events.
+    """
+    import uvicorn
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+    
+    session_manager = StreamableHTTPSessionManager(app=db_server.server)
+    
+    async def handle_mcp(scope, receive, send):
+        await session_manager.handle_request(scope, receive, send)
+    
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        async with session_manager.run():
+            yield
+    
+    app = Starlette(routes=[Mount(path, app=handle_mcp)], lifespan=lifespan)
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning")
+    print(f"Serving MCP over streamable HTTP at http://{host}:{port}{path}", file=sys.stderr)
+    await uvicorn.Server(config).serve()
+
+
+async def main(argv: Optional[List[str]] = None):
     """Main function to run the MCP server."""
+    args = parse_args(argv)
+    
     # Initialize the database MCP server
-    db_server = DatabaseMCPServer()
-    
-    # Run the server using stdio transport
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await db_server.server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="sql-database-server",
-                server_version="0.1.0",
-                capabilities=db_server.server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+    db_server = DatabaseMCPServer(
+        db_path=args.db_path,
+        max_workers=args.workers,
+        read_only=args.read_only,
+        immutable=args.immutable,
+        journal_mode=args.journal_mode,
+        synchronous=args.synchronous,
+        cache_size=args.cache_size,
+        mmap_size=args.mmap_size,
+        temp_store=args.temp_store,
+        warm_cache=args.warm_cache,
+        max_concurrent=args.max_concurrent,
+        max_queue=args.max_queue,
+        stats_interval=args.stats_interval,
+        cached_statements=args.cached_statements,
+        rollups=None if args.rollups == "off" else args.rollups,
+        rollup_definitions=args.rollup_definitions,
+        replica=args.replica,
+        replica_interval=args.replica_interval,
+        processes=args.processes,
+    )
+    
+    try:
+        if args.transport == "http":
+            await serve_http(db_server, args.host, args.port)
+            return
+        
+        # Run the server using stdio transport
+        async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+            await db_server.server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="sql-database-server",
+                    server_version="0.1.0",
+                    capabilities=db_server.server.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={},
+                    ),
                 ),
-            ),
-        )
+            )
+    finally:
+        db_server.close()
 
 
 if __name__ == "__main__":
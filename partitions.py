@@ -0,0 +1,622 @@
+"""
+Time-Partitioned Sales Storage
+
+setup_db.py --partition month|year splits the sales table into one SQLite file per
+period and records them in the sales_partitions manifest of the main database,
+which keeps products plus an empty sales table as the schema of record.
+
+The MCP server reads such a layout in two ways:
+
+- Every pooled connection ATTACHes the partition files behind a TEMP VIEW named
+  sales (a UNION ALL over the partitions), so any query keeps working unchanged.
+- PartitionRouter handles the common shapes directly: it prunes partitions using
+  the sale_date predicates of the WHERE clause, runs the query on each remaining
+  partition in parallel worker connections and merges the partial results. Plain
+  row queries are concatenated; SUM/COUNT/MIN/MAX/TOTAL/AVG aggregates (with or
+  without GROUP BY) are re-aggregated. ORDER BY and LIMIT are applied after the
+  merge. Anything else returns None from route() and runs through the view.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.request import pathname2url
+
+from db_pool import QueryGuard, SQLiteConnectionPool
+from sql_tokens import (
+    SelectItem,
+    Token,
+    contains_aggregate,
+    expression_key,
+    parse_select_item,
+    span,
+    split_commas,
+    tokenize,
+)
+
+MANIFEST_TABLE = "sales_partitions"
+PARTITIONED_TABLE = "sales"
+DATE_COLUMN = "sale_date"
+GRANULARITIES = ("month", "year")
+
+# Schema name the main database is attached under on partition connections
+SHARED_SCHEMA = "shared"
+
+MANIFEST_DDL = f"""
+CREATE TABLE {MANIFEST_TABLE} (
+    name TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    lower_bound TEXT NOT NULL,
+    upper_bound TEXT NOT NULL
+)
+"""
+
+
+class Partition(NamedTuple):
+    """One partition file holding sales with lower <= sale_date < upper."""
+
+    name: str
+    path: str
+    lower: str
+    upper: str
+
+
+class Unroutable(Exception):
+    """Raised when a routed query turns out not to be mergeable; run it through the view."""
+
+
+def partition_for(sale_date: str, granularity: str) -> Tuple[str, str, str]:
+    """
+    Return (name, lower, upper) of the partition holding a sale_date.
+
+    Bounds are ISO dates; upper is exclusive, e.g. 2023_10 covers
+    '2023-10-01' <= sale_date < '2023-11-01'.
+    """
+    year = int(sale_date[:4])
+    if granularity == "year":
+        return f"{year:04d}", f"{year:04d}-01-01", f"{year + 1:04d}-01-01"
+    if granularity != "month":
+        raise ValueError(f"Unknown partition granularity: {granularity}")
+    month = int(sale_date[5:7])
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year:04d}_{month:02d}", f"{year:04d}-{month:02d}-01", f"{next_year:04d}-{next_month:02d}-01"
+
+
+def load_partitions(db_path: str) -> List[Partition]:
+    """Read the partition manifest of a database; empty when it is not partitioned."""
+    if not os.path.exists(db_path):
+        return []
+    uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (MANIFEST_TABLE,)
+        ).fetchone()
+        if not exists:
+            return []
+        rows = conn.execute(
+            f"SELECT name, path, lower_bound, upper_bound FROM {MANIFEST_TABLE} ORDER BY lower_bound"
+        ).fetchall()
+    finally:
+        conn.close()
+
+    # Partition paths are stored relative to the main database
+    base = os.path.dirname(os.path.abspath(db_path))
+    return [Partition(name, os.path.join(base, path), lower, upper) for name, path, lower, upper in rows]
+
+
+def max_attached() -> int:
+    """Databases one connection can attach, i.e. the most partitions the sales view can cover."""
+    conn = sqlite3.connect(":memory:")
+    try:
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if hasattr(conn, "getlimit") else 10
+    finally:
+        conn.close()
+
+
+def _attach_target(path: str, read_only: bool, immutable: bool) -> str:
+    if not read_only:
+        return path
+    uri = f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+    return uri + "&immutable=1" if immutable else uri
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def attach_partitions(
+    conn: sqlite3.Connection, partitions: Sequence[Partition], read_only: bool = False, immutable: bool = False
+):
+    """
+    Connection hook: ATTACH every partition and cover them with a TEMP VIEW sales.
+
+    The view shadows the empty main.sales table, because SQLite resolves unqualified
+    names in the temp schema first.
+    """
+    branches = []
+    for partition in partitions:
+        schema = _quote(f"part_{partition.name}")
+        conn.execute(f"ATTACH DATABASE ? AS {schema}", (_attach_target(partition.path, read_only, immutable),))
+        branches.append(f"SELECT * FROM {schema}.{PARTITIONED_TABLE}")
+    conn.execute(f"CREATE TEMP VIEW {PARTITIONED_TABLE} AS " + " UNION ALL ".join(branches))
+
+
+def attach_shared(conn: sqlite3.Connection, db_path: str, read_only: bool = False, immutable: bool = False):
+    """Connection hook for partition files: make products and other shared tables visible."""
+    conn.execute(f"ATTACH DATABASE ? AS {SHARED_SCHEMA}", (_attach_target(db_path, read_only, immutable),))
+
+
+# -- Query analysis ------------------------------------------------------------------
+
+# Shapes the router never splits: subqueries, compounds, windows, DISTINCT, HAVING, ...
+_UNSUPPORTED = {
+    "select", "with", "union", "intersect", "except", "over", "window", "distinct",
+    "having", "offset", "right", "full", "collate", "nulls",
+    "group_concat", "string_agg", "json_group_array", "json_group_object",
+}
+_DECOMPOSABLE = {"sum": "SUM", "count": "SUM", "total": "TOTAL", "min": "MIN", "max": "MAX", "avg": None}
+
+_COMPARISONS = {"<": "<", "<=": "<=", ">": ">", ">=": ">=", "=": "=", "==": "="}
+_MIRRORED = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "=": "="}
+
+
+def _literal(token: Token) -> Optional[str]:
+    if token.kind != "string":
+        return None
+    return token.text[1:-1].replace("''", "'")
+
+
+def date_constraints(where: List[Token]) -> List[Tuple[str, str]]:
+    """
+    Extract (operator, value) constraints on sale_date from a WHERE clause.
+
+    Only top-level conjuncts comparing sale_date with string literals count. A clause
+    containing OR, NOT, CASE or IIF yields no constraints, since its terms need not
+    hold for every row; ignoring a constraint only keeps more partitions.
+    """
+    if not where or any(token.is_word("or", "not", "case", "iif") for token in where):
+        return []
+
+    depth = where[0].depth
+    # Split into top-level conjuncts; BETWEEN's own AND stays inside its conjunct
+    conjuncts: List[List[Token]] = [[]]
+    between = False
+    for token in where:
+        if token.depth == depth and token.is_word("between"):
+            between = True
+        elif token.depth == depth and token.is_word("and"):
+            if between:
+                between = False
+            else:
+                conjuncts.append([])
+                continue
+        conjuncts[-1].append(token)
+
+    constraints: List[Tuple[str, str]] = []
+    for term in conjuncts:
+        # sale_date, or a qualified alias.sale_date, as the whole left operand
+        column = 3 if len(term) > 3 and term[1].text == "." else 1
+        if term and term[column - 1].name == DATE_COLUMN and (column == 1 or term[0].name):
+            op, rest = term[column] if len(term) > column else None, term[column + 1:]
+            if op is None:
+                continue
+            if op.text in _COMPARISONS and len(rest) == 1 and _literal(rest[0]) is not None:
+                constraints.append((_COMPARISONS[op.text], _literal(rest[0])))
+            elif op.is_word("between") and len(rest) == 3 and rest[1].is_word("and"):
+                low, high = _literal(rest[0]), _literal(rest[2])
+                if low is not None and high is not None:
+                    constraints.extend([(">=", low), ("<=", high)])
+            elif op.is_word("like", "glob") and len(rest) == 1 and _literal(rest[0]):
+                wildcards = "%_" if op.is_word("like") else "*?["
+                prefix = re.split("[" + re.escape(wildcards) + "]", _literal(rest[0]), maxsplit=1)[0]
+                if prefix:
+                    constraints.extend([(">=", prefix), ("<", prefix + "\U0010ffff")])
+            elif op.is_word("in") and len(rest) >= 3 and rest[0].text == "(" and rest[-1].text == ")":
+                values = [_literal(token) for token in rest[1:-1] if token.text != ","]
+                if values and all(value is not None for value in values):
+                    constraints.extend([(">=", min(values)), ("<=", max(values))])
+        elif (
+            len(term) in (3, 5)
+            and _literal(term[0]) is not None
+            and term[1].text in _COMPARISONS
+            and term[-1].name == DATE_COLUMN
+            and (len(term) == 3 or term[3].text == ".")
+        ):
+            # 'literal' < sale_date
+            constraints.append((_MIRRORED[_COMPARISONS[term[1].text]], _literal(term[0])))
+    return constraints
+
+
+def _may_match(partition: Partition, op: str, value: str) -> bool:
+    """Whether a partition may hold a sale_date satisfying `sale_date op value`."""
+    if op in (">", ">="):
+        return partition.upper > value
+    if op == "<":
+        return partition.lower < value
+    if op == "<=":
+        return partition.lower <= value
+    return partition.lower <= value < partition.upper
+
+
+def prune(partitions: Sequence[Partition], constraints: Sequence[Tuple[str, str]]) -> List[Partition]:
+    """Keep the partitions that may contain rows satisfying every constraint."""
+    return [p for p in partitions if all(_may_match(p, op, value) for op, value in constraints)]
+
+
+class RoutedQuery(NamedTuple):
+    """A query split into per-partition work plus a merge step."""
+
+    partitions: List[Partition]
+    # SQL run on every partition connection
+    partition_sql: str
+    # "concat" for row queries, "aggregate" for re-aggregated results
+    kind: str
+    items: List[SelectItem]
+    order_by: List[Tuple[List[Token], bool]]
+    limit: Optional[int]
+
+
+def route(query: str, partitions: Sequence[Partition]) -> Optional[RoutedQuery]:
+    """
+    Plan a query over a partitioned sales table, or return None to use the view.
+
+    Routable queries are a single SELECT whose FROM clause starts with sales (joined
+    to non-partitioned tables only), with no subqueries, compounds, window functions,
+    DISTINCT or HAVING, an ORDER BY over output columns and at most a plain LIMIT n.
+    """
+    tokens = tokenize(query)
+    while tokens and tokens[-1].text == ";":
+        tokens.pop()
+    if not tokens or not tokens[0].is_word("select"):
+        return None
+    if any(token.text == ";" for token in tokens):
+        return None
+    if any(token.name in _UNSUPPORTED for token in tokens[1:] if token.kind == "word"):
+        return None
+
+    # Clause boundaries at the top level
+    clauses: Dict[str, int] = {}
+    for index, token in enumerate(tokens):
+        if token.depth != 0 or token.kind != "word":
+            continue
+        word = token.text.lower()
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+        if word in ("from", "where", "limit"):
+            clauses.setdefault(word, index)
+        elif word in ("group", "order") and following is not None and following.is_word("by"):
+            clauses.setdefault(word, index)
+    order = ["from", "where", "group", "order", "limit"]
+    present = [name for name in order if name in clauses]
+    if "from" not in clauses or [clauses[name] for name in present] != sorted(clauses[name] for name in present):
+        return None
+
+    def clause(name: str, skip: int) -> List[Token]:
+        if name not in clauses:
+            return []
+        start = clauses[name] + skip
+        later = [clauses[other] for other in present if clauses[other] > clauses[name]]
+        return tokens[start:min(later) if later else len(tokens)]
+
+    # The partitioned table must drive the join, exactly once
+    from_tokens = clause("from", 1)
+    if not from_tokens or from_tokens[0].name != PARTITIONED_TABLE:
+        return None
+    references = [
+        index for index, token in enumerate(from_tokens)
+        if token.name == PARTITIONED_TABLE and (index + 1 >= len(from_tokens) or from_tokens[index + 1].text != ".")
+    ]
+    if len(references) != 1 or (len(from_tokens) > 1 and from_tokens[1].text == "."):
+        return None
+
+    items = [parse_select_item(query, part, 0) for part in split_commas(tokens[1:clauses["from"]], 0)]
+    if any(not item.expr for item in items):
+        return None
+
+    order_by = []
+    for term in split_commas(clause("order", 2), 0) if "order" in clauses else []:
+        descending = False
+        if term and term[-1].is_word("asc", "desc"):
+            descending = term[-1].is_word("desc")
+            term = term[:-1]
+        if not term:
+            return None
+        order_by.append((term, descending))
+
+    limit = None
+    if "limit" in clauses:
+        limit_tokens = clause("limit", 1)
+        if len(limit_tokens) != 1 or limit_tokens[0].kind != "number" or "." in limit_tokens[0].text:
+            return None
+        limit = int(limit_tokens[0].text)
+
+    where = clause("where", 1)
+    selected = prune(partitions, date_constraints(where)) if where else list(partitions)
+    if not selected and partitions:
+        # Keep one partition so aggregates without GROUP BY still return their row
+        selected = [partitions[0]]
+
+    group_by = split_commas(clause("group", 2), 0) if "group" in clauses else []
+    aggregated = any(item.aggregate for item in items) or group_by
+    if not aggregated:
+        if any(contains_aggregate(item.expr) for item in items):
+            return None
+        # Each partition sorts and cuts its own rows, so the merge can only re-sort on output columns
+        star = any(item.expr[-1].text == "*" for item in items)
+        for term, _ in order_by:
+            if _match_item(term, items) is None and not (star and _column_name(term)):
+                return None
+        return RoutedQuery(selected, query[:tokens[-1].end], "concat", items, order_by, limit)
+
+    # Every output is either a decomposable aggregate or a GROUP BY key
+    keys = [index for index, item in enumerate(items) if not item.aggregate]
+    for index in keys:
+        if contains_aggregate(items[index].expr) or any(t.text == "*" for t in items[index].expr):
+            return None
+    if any(item.aggregate and contains_aggregate(item.argument or []) for item in items):
+        return None
+
+    matched = set()
+    for term in group_by:
+        if not term:
+            return None
+        found = _match_item(term, items)
+        if found is None or items[found].aggregate:
+            return None
+        matched.add(found)
+    if matched != set(keys):
+        return None
+
+    # Partition query: keys as k<i>, partial aggregates as a<i>, AVG counts appended last
+    select, counts = [], []
+    for index, item in enumerate(items):
+        expression = span(query, item.expr)
+        if not item.aggregate:
+            select.append(f"{expression} AS k{index}")
+        elif item.aggregate == "avg":
+            argument = span(query, item.argument)
+            select.append(f"SUM({argument}) AS a{index}")
+            counts.append(f"COUNT({argument}) AS n{index}")
+        else:
+            select.append(f"{expression} AS a{index}")
+    body_end = clauses.get("group", clauses.get("order", clauses.get("limit")))
+    body = query[tokens[clauses["from"]].start:tokens[body_end].start if body_end is not None else tokens[-1].end]
+    partition_sql = f"SELECT {', '.join(select + counts)} {body.strip()}"
+    if keys:
+        partition_sql += " GROUP BY " + ", ".join(f"k{index}" for index in keys)
+    return RoutedQuery(selected, partition_sql, "aggregate", items, order_by, limit)
+
+
+def _column_name(tokens: List[Token]) -> Optional[str]:
+    """Column of a plain, optionally qualified, column reference."""
+    if len(tokens) == 1 or (len(tokens) == 3 and tokens[1].text == "." and tokens[0].name):
+        return tokens[-1].name
+    return None
+
+
+def _match_item(term: List[Token], items: List[SelectItem]) -> Optional[int]:
+    """Resolve an ORDER BY or GROUP BY term to a SELECT list position."""
+    if len(term) == 1 and term[0].kind == "number" and term[0].text.isdigit():
+        position = int(term[0].text) - 1
+        return position if 0 <= position < len(items) else None
+    for index, item in enumerate(items):
+        if item.alias is not None and len(term) == 1 and term[0].name == item.alias:
+            return index
+    key = expression_key(term)
+    for index, item in enumerate(items):
+        if expression_key(item.expr) == key:
+            return index
+    column = _column_name(term)
+    matches = [index for index, item in enumerate(items) if column and _column_name(item.expr) == column]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _order_positions(
+    order_by: List[Tuple[List[Token], bool]], items: List[SelectItem], names: List[str]
+) -> List[Tuple[int, bool]]:
+    """Map ORDER BY terms to output positions, using result names for SELECT * queries."""
+    # With a * in the SELECT list, item positions no longer line up with output columns
+    star = any(item.expr[-1].text == "*" for item in items)
+    positions = []
+    for term, descending in order_by:
+        found = None if star else _match_item(term, items)
+        if found is None:
+            column = _column_name(term)
+            candidates = [index for index, name in enumerate(names) if column and name.lower() == column]
+            if len(candidates) != 1:
+                raise Unroutable("ORDER BY term does not match a single output column")
+            found = candidates[0]
+        positions.append((found, descending))
+    return positions
+
+
+class PartitionRouter:
+    """Scatter-gather execution of routed queries over partition files."""
+
+    def __init__(
+        self,
+        db_path: str,
+        partitions: Sequence[Partition],
+        max_workers: int = 4,
+        pragmas: Optional[Dict[str, Any]] = None,
+        read_only: bool = False,
+        immutable: bool = False,
+    ):
+        """
+        Args:
+            db_path: Main database holding the manifest and the shared tables
+            partitions: Partitions from load_partitions
+            max_workers: Partitions scanned at the same time
+            pragmas: PRAGMA settings for partition connections (the server's profile)
+            read_only: Open partitions read-only
+            immutable: Open partitions as immutable snapshots
+        """
+        self.db_path = db_path
+        self.partitions = list(partitions)
+        self.read_only = read_only or immutable
+        self.immutable = immutable
+        self.pragmas = dict(pragmas or {})
+        self.max_workers = max_workers
+
+        limit = max_attached()
+        if len(self.partitions) > limit:
+            raise ValueError(
+                f"{len(self.partitions)} partitions exceed SQLite's limit of {limit} attached "
+                "databases needed for the sales view; use coarser partitions (setup_db.py --partition year)"
+            )
+
+        self._scanner = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sqlite-partition")
+        self._pools: Dict[str, SQLiteConnectionPool] = {}
+        self._lock = threading.Lock()
+
+        self.routed = 0
+        self.fallbacks = 0
+        self.partitions_scanned = 0
+        self.partitions_pruned = 0
+
+    def attach(self, conn: sqlite3.Connection):
+        """Connection hook for the server's pool (see attach_partitions)."""
+        attach_partitions(conn, self.partitions, self.read_only, self.immutable)
+
+    @property
+    def paths(self) -> List[str]:
+        return [partition.path for partition in self.partitions]
+
+    def route(self, query: str) -> Optional[RoutedQuery]:
+        """Plan a query, counting queries left to the view."""
+        routed = route(query, self.partitions)
+        with self._lock:
+            if routed is None:
+                self.fallbacks += 1
+            else:
+                self.routed += 1
+                self.partitions_scanned += len(routed.partitions)
+                self.partitions_pruned += len(self.partitions) - len(routed.partitions)
+        return routed
+
+    def _pool(self, partition: Partition) -> SQLiteConnectionPool:
+        with self._lock:
+            pool = self._pools.get(partition.name)
+            if pool is None:
+                pool = SQLiteConnectionPool(
+                    partition.path,
+                    size=self.max_workers,
+                    pragmas=self.pragmas,
+                    read_only=self.read_only,
+                    immutable=self.immutable,
+                    on_connect=partial(
+                        attach_shared, db_path=self.db_path, read_only=self.read_only, immutable=self.immutable
+                    ),
+                )
+                self._pools[partition.name] = pool
+            return pool
+
+    def _scan(
+        self, partition: Partition, sql: str, guard: Optional[QueryGuard], max_rows: Optional[int]
+    ) -> Tuple[List[str], List[tuple]]:
+        with self._pool(partition).connection() as conn:
+            if guard is not None:
+                with guard.watch(conn):
+                    cursor = conn.execute(sql)
+                    rows = cursor.fetchmany(max_rows) if max_rows is not None else cursor.fetchall()
+            else:
+                cursor = conn.execute(sql)
+                rows = cursor.fetchmany(max_rows) if max_rows is not None else cursor.fetchall()
+            names = [description[0] for description in cursor.description or []]
+            cursor.close()
+        return names, rows
+
+    @contextmanager
+    def open_result(
+        self, routed: RoutedQuery, guard: Optional[QueryGuard] = None, max_rows: Optional[int] = None
+    ) -> Iterator[sqlite3.Cursor]:
+        """
+        Run a routed query on its partitions in parallel and yield a cursor over the merged rows.
+
+        Row queries are cut at max_rows (pass the budget plus one so truncation
+        is still detected) or their LIMIT in every partition, which sorts its own
+        rows first, so at most that many rows per partition are merged.
+
+        Raises:
+            Unroutable: A row query has neither max_rows nor a LIMIT, so merging it
+                would hold the whole result (the view streams it instead), or the
+                ORDER BY cannot be applied to the merged columns
+        """
+        sql, cap = routed.partition_sql, None
+        if routed.kind == "concat":
+            caps = [value for value in (max_rows, routed.limit) if value is not None]
+            if not caps:
+                raise Unroutable("Row query without a row limit")
+            cap = min(caps)
+            if routed.limit is None:
+                sql += f" LIMIT {cap}"
+        futures = [self._scanner.submit(self._scan, partition, sql, guard, cap) for partition in routed.partitions]
+        # Partition order keeps unordered row queries in date order
+        results = [future.result() for future in futures]
+        names = results[0][0] if results else []
+
+        merge = sqlite3.connect(":memory:")
+        try:
+            columns = [f"c{index}" for index in range(len(names))]
+            merge.execute(f"CREATE TABLE partials ({', '.join(columns)})")
+            placeholders = ", ".join("?" for _ in columns)
+            for _, rows in results:
+                merge.executemany(f"INSERT INTO partials VALUES ({placeholders})", rows)
+
+            if routed.kind == "concat":
+                output_names = names
+                select = [f"{column} AS {_quote(name)}" for column, name in zip(columns, names)]
+                group = ""
+            else:
+                output_names = [item.name for item in routed.items]
+                position = {name: index for index, name in enumerate(names)}
+                select = []
+                for index, item in enumerate(routed.items):
+                    if not item.aggregate:
+                        expression = f"c{position[f'k{index}']}"
+                    elif item.aggregate == "avg":
+                        expression = f"CAST(SUM(c{position[f'a{index}']}) AS REAL) / SUM(c{position[f'n{index}']})"
+                    else:
+                        expression = f"{_DECOMPOSABLE[item.aggregate]}(c{position[f'a{index}']})"
+                    select.append(f"{expression} AS {_quote(item.name)}")
+                keys = [f"c{position[f'k{index}']}" for index, item in enumerate(routed.items) if not item.aggregate]
+                group = f" GROUP BY {', '.join(keys)}" if keys else ""
+
+            sql = f"SELECT {', '.join(select)} FROM partials{group}"
+            if routed.order_by:
+                ordering = _order_positions(routed.order_by, routed.items, output_names)
+                sql += " ORDER BY " + ", ".join(
+                    f"{index + 1}{' DESC' if descending else ''}" for index, descending in ordering
+                )
+            if routed.limit is not None:
+                sql += f" LIMIT {routed.limit}"
+
+            cursor = merge.execute(sql)
+            yield cursor
+            cursor.close()
+        finally:
+            merge.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return routing counters."""
+        with self._lock:
+            return {
+                "partitions": len(self.partitions),
+                "routed_queries": self.routed,
+                "view_queries": self.fallbacks,
+                "partitions_scanned": self.partitions_scanned,
+                "partitions_pruned": self.partitions_pruned,
+            }
+
+    def close(self):
+        self._scanner.shutdown(wait=True)
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.close()
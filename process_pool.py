@@ -0,0 +1,196 @@
+"""
+Process Query Pool
+
+sqlite3 releases the GIL while SQLite steps through a statement, but turning rows
+into Python objects and formatting them holds it, so one server process running
+aggregate-heavy queries for many clients tops out at about one core.
+ProcessQueryPool runs query_database statements in N worker processes instead.
+Each worker has a single read-only connection with the server pool's settings and
+returns the result already formatted in the requested format; the server keeps
+the result cache, admission control and MCP I/O.
+
+Workers are started with the spawn method, since forking a process that runs
+threads and holds SQLite connections is unsafe. The deadline of a tool call is
+enforced in the worker. A cancelled call sets a flag in shared memory that the
+worker's progress handler polls, so its statement stops as it would on a thread.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from db_pool import DEFAULT_CACHED_STATEMENTS, QueryCancelled, QueryGuard, SQLiteConnectionPool
+from result_formats import DeclaredTypes, FormattedResult, execute_formatted
+
+# Cancellation flags shared with the workers; calls beyond this many in flight
+# still run, only without client cancellation
+CANCEL_SLOTS = 256
+
+# Per-process state of a worker, set by _init_worker
+_pool: Optional[SQLiteConnectionPool] = None
+_flags: Any = None
+_declared_types: Optional[DeclaredTypes] = None
+
+
+def _init_worker(settings: Dict[str, Any], flags: Any):
+    global _pool, _flags, _declared_types
+    _pool = SQLiteConnectionPool(size=1, read_only=True, **settings)
+    _flags = flags
+    _declared_types = DeclaredTypes()
+
+
+class _WorkerGuard(QueryGuard):
+    """QueryGuard that also stops when the server sets the call's cancellation flag."""
+
+    def __init__(self, timeout_ms: Optional[int], slot: int):
+        super().__init__(timeout_ms)
+        self.slot = slot
+
+    def expired(self) -> bool:
+        if self.slot >= 0 and _flags[self.slot]:
+            self.cancelled = True
+        return super().expired()
+
+
+def _execute(
+    query: str, params: Any, max_rows: int, max_bytes: int, fmt: str, deadline: Optional[float], slot: int
+) -> FormattedResult:
+    """Run one query in a worker process and return the formatted result."""
+    # Wall-clock deadline, since monotonic clocks are not comparable across processes
+    timeout_ms = max(1, int((deadline - time.time()) * 1000)) if deadline is not None else None
+    guard = _WorkerGuard(timeout_ms, slot)
+    with _pool.connection() as conn, guard.watch(conn):
+        return execute_formatted(conn, query, params, fmt, max_rows, max_bytes, _declared_types)
+
+
+def _ready() -> bool:
+    return _pool is not None
+
+
+class ProcessQueryPool:
+    """Worker processes running read-only queries, each with its own connection."""
+
+    def __init__(
+        self,
+        db_path: str,
+        workers: int,
+        pragmas: Optional[Dict[str, Any]] = None,
+        immutable: bool = False,
+        cached_statements: int = DEFAULT_CACHED_STATEMENTS,
+    ):
+        """
+        Args:
+            db_path: Path to the SQLite database file
+            workers: Number of worker processes
+            pragmas: PRAGMA name/value pairs applied to each worker's connection
+            immutable: Open the file with immutable=1, e.g. for snapshots
+            cached_statements: Prepared statements each worker's connection keeps
+        """
+        if workers < 1:
+            raise ValueError("A process pool needs at least one worker")
+        self.workers = workers
+        context = multiprocessing.get_context("spawn")
+        self._flags = context.RawArray("b", CANCEL_SLOTS)
+        self._free: List[int] = list(range(CANCEL_SLOTS))
+        self._lock = threading.Lock()
+        settings = {
+            "db_path": db_path,
+            "pragmas": dict(pragmas or {}),
+            "immutable": immutable,
+            "cached_statements": cached_statements,
+        }
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(settings, self._flags),
+        )
+
+        self.submitted = 0
+        self.cancelled = 0
+        self.timed_out = 0
+        self.failed = 0
+
+    def start(self):
+        """Start every worker now rather than on the first queries."""
+        for _ in range(self.workers):
+            self._executor.submit(_ready)
+
+    def _acquire_slot(self) -> int:
+        with self._lock:
+            return self._free.pop() if self._free else -1
+
+    def _release_slot(self, slot: int):
+        if slot < 0:
+            return
+        with self._lock:
+            self._flags[slot] = 0
+            self._free.append(slot)
+
+    async def run(
+        self, query: str, params: Any, max_rows: int, max_bytes: int, fmt: str, guard: QueryGuard
+    ) -> FormattedResult:
+        """
+        Run a query in a worker process and await the formatted result.
+
+        Args:
+            query: The SQL query
+            params: Bound parameters, as for sqlite3 execute()
+            max_rows: Row budget of the result
+            max_bytes: Byte budget of the result
+            fmt: One of result_formats.FORMATS
+            guard: Deadline of the tool call; time spent queued for a worker counts
+        """
+        remaining = guard.deadline - time.monotonic() if guard.deadline is not None else None
+        deadline = time.time() + remaining if remaining is not None else None
+        slot = self._acquire_slot()
+        try:
+            future: Future = self._executor.submit(
+                _execute, query, params, max_rows, max_bytes, fmt, deadline, slot
+            )
+        except BaseException:
+            self._release_slot(slot)
+            raise
+        # The slot is reused only once the worker is done with it
+        future.add_done_callback(lambda _: self._release_slot(slot))
+        self.submitted += 1
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            if not future.cancel() and slot >= 0:
+                with self._lock:
+                    # A finished call has already handed its slot to another call
+                    if not future.done():
+                        self._flags[slot] = 1
+            raise
+        except QueryCancelled:
+            # Client cancellations arrive as CancelledError, so the worker hit the deadline
+            self.timed_out += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        """Return worker and call counters."""
+        with self._lock:
+            in_flight = CANCEL_SLOTS - len(self._free)
+        return {
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "in_flight": in_flight,
+            "cancelled": self.cancelled,
+            "timed_out": self.timed_out,
+            "failed": self.failed,
+        }
+
+    def close(self):
+        """Cancel queued calls, stop running statements and wait for the workers to exit."""
+        with self._lock:
+            for slot in range(CANCEL_SLOTS):
+                self._flags[slot] = 1
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,194 @@
+"""
+Query Result Cache
+
+This module caches formatted query results on the MCP server. Entries are keyed on
+whitespace/case-normalized SQL and dropped as soon as the database changes, which is
+detected through PRAGMA data_version (writes from any other connection or process)
+and the modification times of the database and its WAL file (files replaced or
+rewritten behind SQLite's back).
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+# String literals, quoted identifiers and comments, in the order SQLite lexes them
+_SQL_TOKEN = re.compile(
+    r"""
+    (?P<string>'(?:[^']|'')*')
+    | (?P<identifier>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+    | (?P<line_comment>--[^\n]*)
+    | (?P<block_comment>/\*.*?(?:\*/|$))
+    | (?P<space>\s+)
+    | (?P<other>[^'"`\[\s\-/]+|.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Functions whose results change between identical executions
+_VOLATILE = re.compile(
+    r"\b(random|randomblob|changes|total_changes|last_insert_rowid)\s*\(|'now'|\bcurrent_(date|time|timestamp)\b"
+)
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Normalize SQL text for use as a cache key.
+
+    Whitespace runs collapse to one space, comments are dropped, keywords and bare
+    identifiers are lower-cased and trailing semicolons are removed. String literals
+    and quoted identifiers are kept verbatim, so 'North' and 'north' stay distinct.
+    """
+    parts = []
+    pending_space = False
+    for match in _SQL_TOKEN.finditer(query):
+        kind = match.lastgroup
+        if kind in ("space", "line_comment", "block_comment"):
+            pending_space = True
+            continue
+        if pending_space and parts:
+            parts.append(" ")
+        pending_space = False
+        text = match.group()
+        parts.append(text.lower() if kind == "other" else text)
+
+    normalized = "".join(parts).strip()
+    while normalized.endswith(";"):
+        normalized = normalized[:-1].rstrip()
+    return normalized
+
+
+def is_volatile(normalized_query: str) -> bool:
+    """Return True when a normalized query calls non-deterministic functions."""
+    return bool(_VOLATILE.search(normalized_query))
+
+
+class DataVersionMonitor:
+    """Detects changes to the database file from any connection or process."""
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        db_path: str,
+        watch_paths: Sequence[str] = (),
+    ):
+        """
+        Args:
+            connect: Factory for the monitor's private connection
+            db_path: Database file whose (and whose -wal file's) mtime is watched
+            watch_paths: Further database files watched the same way, e.g. partitions
+
+        PRAGMA data_version is only comparable on a single connection, so the monitor
+        keeps its own instead of asking whichever pooled connection is at hand.
+        """
+        self.connect = connect
+        self.db_path = db_path
+        self.watch_paths = list(watch_paths)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _mtime(self, path: str) -> int:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return 0
+
+    def token(self) -> Tuple[int, ...]:
+        """Return a value that changes whenever the database content may have changed."""
+        with self._lock:
+            if self._conn is None:
+                self._conn = self.connect()
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        # data_version only sees the main file, attached files are tracked by mtime
+        mtimes = [
+            self._mtime(path + suffix)
+            for path in [self.db_path, *self.watch_paths]
+            for suffix in ("", "-wal")
+        ]
+        return (data_version, *mtimes)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class ResultCache:
+    """LRU cache of query results with a byte-size budget."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: Total size of cached results; least recently used entries are evicted
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, version: Hashable):
+        """Drop every entry when the database version moved. Caller must hold the lock."""
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Any]:
+        """Return the cached value for key at the given database version."""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, version: Hashable, value: Any, size: int):
+        """Cache a value computed at the given database version."""
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
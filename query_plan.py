@@ -0,0 +1,158 @@
+"""
+Query Plan Analysis
+
+This module runs EXPLAIN QUERY PLAN and turns SQLite's flat (id, parent, detail)
+rows into a JSON-serializable tree. Every node is classified by the kind of work it
+describes, and a summary lists the findings that usually matter for performance:
+tables read with a full scan, temporary B-trees built for sorting or grouping,
+correlated subqueries re-run per outer row and automatic (transient) indexes.
+"""
+
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+# Node kinds reported in the "kind" field
+FULL_SCAN = "full_scan"
+INDEX_SEARCH = "index_search"
+COVERING_INDEX = "covering_index"
+TEMP_BTREE = "temp_btree"
+CORRELATED_SUBQUERY = "correlated_subquery"
+OTHER = "other"
+
+# "SCAN sales", "SEARCH s USING INDEX idx_sales_date (sale_date>?)", older "SCAN TABLE sales AS s"
+_ACCESS = re.compile(
+    r"^(?P<op>SCAN|SEARCH)\s+(?!CONSTANT ROW|\d+ CONSTANT ROWS)(?:TABLE\s+)?(?P<table>\S+)(?:\s+AS\s+(?P<alias>\S+))?"
+    r"(?:\s+USING\s+(?P<using>.*))?$",
+    re.IGNORECASE,
+)
+# Automatic indexes have no name, only the constraint in parentheses
+_INDEX_NAME = re.compile(r"INDEX\s+(?P<index>[^\s(]\S*)", re.IGNORECASE)
+# "USE TEMP B-TREE FOR ORDER BY", or "UNION USING TEMP B-TREE" for compound selects
+_TEMP_BTREE = re.compile(
+    r"^(?:USE TEMP B-TREE FOR (?P<purpose>.+)|(?P<compound>.+) USING TEMP B-TREE)$", re.IGNORECASE
+)
+
+
+def classify(detail: str) -> Dict[str, Any]:
+    """
+    Classify one EXPLAIN QUERY PLAN detail string.
+
+    Returns:
+        Dictionary with "kind" plus, where they apply, "table", "index",
+        "automatic_index" and "purpose" (what a temp B-tree is for)
+    """
+    info: Dict[str, Any] = {"kind": OTHER}
+
+    access = _ACCESS.match(detail)
+    if access:
+        info["table"] = access.group("table")
+        using = (access.group("using") or "").upper()
+        index = _INDEX_NAME.search(access.group("using") or "")
+        if index:
+            info["index"] = index.group("index")
+        if "COVERING INDEX" in using:
+            info["kind"] = COVERING_INDEX
+        elif access.group("op").upper() == "SEARCH":
+            info["kind"] = INDEX_SEARCH
+        else:
+            # SCAN, possibly in index order, still visits every row
+            info["kind"] = FULL_SCAN
+        if "AUTOMATIC" in using:
+            info["automatic_index"] = True
+        return info
+
+    temp = _TEMP_BTREE.match(detail)
+    if temp:
+        info["kind"] = TEMP_BTREE
+        info["purpose"] = temp.group("purpose") or temp.group("compound")
+        return info
+
+    if detail.upper().startswith("CORRELATED "):
+        info["kind"] = CORRELATED_SUBQUERY
+    return info
+
+
+def build_plan_tree(rows: List[tuple]) -> List[Dict[str, Any]]:
+    """
+    Nest EXPLAIN QUERY PLAN rows under their parents.
+
+    Args:
+        rows: (id, parent, notused, detail) tuples in the order SQLite returned them
+
+    Returns:
+        Root nodes, each with "id", "parent", "detail", classification fields and "children"
+    """
+    nodes: Dict[int, Dict[str, Any]] = {}
+    roots: List[Dict[str, Any]] = []
+    for row in rows:
+        node_id, parent, detail = row[0], row[1], row[-1]
+        node = {"id": node_id, "parent": parent, "detail": detail}
+        node.update(classify(detail))
+        node["children"] = []
+        nodes[node_id] = node
+        parent_node = nodes.get(parent)
+        if parent_node is not None:
+            parent_node["children"].append(node)
+        else:
+            roots.append(node)
+    return roots
+
+
+def _walk(nodes: List[Dict[str, Any]]):
+    for node in nodes:
+        yield node
+        yield from _walk(node["children"])
+
+
+def summarize_plan(tree: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Count node kinds and list the findings worth acting on."""
+    counts = {kind: 0 for kind in (FULL_SCAN, INDEX_SEARCH, COVERING_INDEX, TEMP_BTREE, CORRELATED_SUBQUERY)}
+    full_scans: List[str] = []
+    findings: List[str] = []
+    for node in _walk(tree):
+        kind = node["kind"]
+        if kind in counts:
+            counts[kind] += 1
+        if kind == FULL_SCAN:
+            full_scans.append(node["table"])
+            findings.append(f"Full scan of {node['table']}")
+        elif kind == TEMP_BTREE:
+            findings.append(f"Temporary B-tree built for {node['purpose']}")
+        elif kind == CORRELATED_SUBQUERY:
+            findings.append(f"{node['detail'].capitalize()} runs once per outer row")
+        if node.get("automatic_index"):
+            findings.append(f"Automatic index built on {node['table']} for this query; a permanent index may help")
+    return {"counts": counts, "full_scans": full_scans, "findings": findings}
+
+
+def explain_plan(conn: sqlite3.Connection, query: str) -> Dict[str, Any]:
+    """
+    Run EXPLAIN QUERY PLAN for a single statement.
+
+    The statement is only prepared, never executed, so this is cheap even for
+    expensive queries.
+
+    Returns:
+        Dictionary with the "plan" tree and its "summary"
+    """
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+    tree = build_plan_tree(rows)
+    return {"plan": tree, "summary": summarize_plan(tree)}
+
+
+def format_plan(plan: Dict[str, Any], indent: str = "  ") -> str:
+    """Render an explain_plan result as an indented outline, e.g. for LLM prompts."""
+    lines: List[str] = []
+
+    def render(nodes: List[Dict[str, Any]], depth: int):
+        for node in nodes:
+            lines.append(f"{indent * depth}- {node['detail']} [{node['kind']}]")
+            render(node["children"], depth + 1)
+
+    render(plan["plan"], 0)
+    findings: Optional[List[str]] = plan.get("summary", {}).get("findings")
+    if findings:
+        lines.append("Findings:")
+        lines.extend(f"{indent}- {finding}" for finding in findings)
+    return "\n".join(lines)
@@ -0,0 +1,159 @@
+"""
+In-Memory Replica
+
+For read-mostly deployments the server can answer every query from a copy of the
+database held in memory. MemoryReplica copies the file with the SQLite backup API
+into a named shared-cache in-memory database, which pooled connections open by
+URI, so no query reads the disk. A background thread watches the file's data
+version and mtime; when they move, it copies the file into a fresh in-memory
+database and swaps the URI. Queries already running finish on the copy they
+started on, the pool closes their connections when they come back, and SQLite
+frees an old copy with its last connection.
+
+The replica is read-only and lags writes to the file by up to one refresh
+interval. A refresh briefly holds two copies in memory.
+"""
+
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.request import pathname2url
+
+from query_cache import DataVersionMonitor
+
+# Names of in-memory databases are process-wide, so every copy gets a new one
+_copies = itertools.count(1)
+
+
+class MemoryReplica:
+    """Shared-cache in-memory copy of a database file, refreshed in the background."""
+
+    def __init__(self, db_path: str, interval: float = 1.0):
+        """
+        Args:
+            db_path: Database file to copy
+            interval: Seconds between checks of the file's data version
+        """
+        self.db_path = db_path
+        self.interval = interval
+        # Watches the file itself; the replica's own version is its generation
+        self.monitor = DataVersionMonitor(self._connect_source, db_path)
+
+        self._uri: Optional[str] = None
+        self._keeper: Optional[sqlite3.Connection] = None
+        self._version: Optional[Tuple[int, ...]] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.generation = 0
+        self.bytes = 0
+        self.refreshes = 0
+        self.last_refresh_ms = 0.0
+        self.refreshed_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def _connect_source(self) -> sqlite3.Connection:
+        uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def start(self):
+        """Load the first copy, then keep it current in the background."""
+        self.refresh(force=True)
+        self._thread = threading.Thread(target=self._run, name="memory-replica", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+                self.last_error = None
+            except sqlite3.Error as e:
+                self.last_error = str(e)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Copy the file into a new in-memory database if it changed, and swap to it.
+
+        Returns:
+            True if a new copy was loaded
+        """
+        with self._refresh_lock:
+            # Read before copying, so a write during the copy triggers another refresh
+            version = self.monitor.token()
+            if not force and version == self._version:
+                return False
+
+            started = time.monotonic()
+            uri = f"file:sql-mcp-replica-{os.getpid()}-{next(_copies)}?mode=memory&cache=shared"
+            copy = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            try:
+                source = self._connect_source()
+                try:
+                    # Backup into an in-memory database requires matching page sizes
+                    page_size = source.execute("PRAGMA page_size").fetchone()[0]
+                    copy.execute(f"PRAGMA page_size = {int(page_size)}")
+                    source.backup(copy)
+                finally:
+                    source.close()
+                page_count = copy.execute("PRAGMA page_count").fetchone()[0]
+            except BaseException:
+                copy.close()
+                raise
+
+            with self._lock:
+                previous = self._keeper
+                self._keeper, self._uri, self._version = copy, uri, version
+                self.generation += 1
+            if previous is not None:
+                # Connections still reading the old copy keep it alive until they close
+                previous.close()
+
+            self.bytes = page_count * page_size
+            self.refreshes += 1
+            self.refreshed_at = time.time()
+            self.last_refresh_ms = round((time.monotonic() - started) * 1000, 3)
+            return True
+
+    def target(self) -> str:
+        """Return the URI of the current copy, for SQLiteConnectionPool(target=...)."""
+        with self._lock:
+            if self._uri is None:
+                raise RuntimeError("Memory replica is not loaded")
+            return self._uri
+
+    def token(self) -> Tuple[int, ...]:
+        """Return a value that changes whenever a new copy is swapped in (cf. DataVersionMonitor)."""
+        with self._lock:
+            return (self.generation,)
+
+    def is_current(self, conn: sqlite3.Connection) -> bool:
+        """Return True if conn (opened by the pool) reads the current copy."""
+        with self._lock:
+            return getattr(conn, "target", None) == self._uri
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the copy's size and refresh counters."""
+        return {
+            "generation": self.generation,
+            "bytes": self.bytes,
+            "refreshes": self.refreshes,
+            "last_refresh_ms": self.last_refresh_ms,
+            "refreshed_at": round(self.refreshed_at, 3) if self.refreshed_at else None,
+            "last_error": self.last_error,
+        }
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._refresh_lock, self._lock:
+            if self._keeper is not None:
+                self._keeper.close()
+                self._keeper = None
+            self._uri = None
+        self.monitor.close()
@@ -0,0 +1,553 @@
+"""
+Query Result Formatting
+
+This module turns SQLite cursors into tool responses incrementally. Rows are pulled
+with fetchmany and written straight into one output buffer, so a result never exists
+as a full list of tuples, a list of per-row strings and a joined string at once.
+Row and byte budgets cap how much of a result is formatted, and the returned
+metadata says whether the output was truncated.
+
+Supported formats are the pipe-separated text table, CSV, JSON Lines and
+"json-columns", a columnar JSON document that clients can load into a DataFrame
+without parsing text. The "arrow" format produces an Arrow IPC stream for large
+extracts; it needs pyarrow.
+
+The line-oriented formats (text, CSV, JSON Lines) can also be produced in chunks
+with iter_chunks, so a result is sent while the cursor is still being read.
+"""
+
+import base64
+import csv
+import io
+import json
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is only needed for the arrow format
+    pa = None
+
+# Rows pulled from SQLite per fetchmany call
+FETCH_BATCH_SIZE = 500
+
+
+class FormattedResult:
+    """Formatted query output plus truncation metadata."""
+
+    def __init__(
+        self,
+        text: str,
+        rows_returned: int,
+        rows_total: Optional[int],
+        truncated: bool,
+        bytes_returned: int,
+        payload: Optional[bytes] = None,
+        max_bytes_exceeded: bool = False,
+    ):
+        self.text = text
+        # Binary output (arrow format) instead of text
+        self.payload = payload
+        self.rows_returned = rows_returned
+        # Only known when the whole result was read
+        self.rows_total = rows_total
+        self.truncated = truncated
+        self.bytes_returned = bytes_returned
+        # The output is larger than max_bytes even without rows
+        self.max_bytes_exceeded = max_bytes_exceeded
+
+    def metadata(self) -> Dict[str, Any]:
+        """Return the truncation metadata as a JSON-serializable dict."""
+        return {
+            "rows_returned": self.rows_returned,
+            "rows_total": self.rows_total,
+            "truncated": self.truncated,
+            "bytes_returned": self.bytes_returned,
+            "max_bytes_exceeded": self.max_bytes_exceeded,
+        }
+
+
+def iter_batches(cursor: sqlite3.Cursor, batch_size: int = FETCH_BATCH_SIZE) -> Iterator[List[tuple]]:
+    """Yield non-empty row batches from a cursor until it is exhausted."""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def cursor_columns(cursor: sqlite3.Cursor) -> List[str]:
+    """Return the column names of a cursor's result."""
+    return [description[0] for description in cursor.description] if cursor.description else []
+
+
+def _json_default(value: Any) -> Any:
+    """Encode values the json module cannot handle (SQLite BLOBs)."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+_encode_json = json.JSONEncoder(ensure_ascii=False, default=_json_default).encode
+
+
+def storage_class(value: Any) -> Optional[str]:
+    """Return the SQLite storage class of a Python value returned by sqlite3."""
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return "INTEGER"
+    if isinstance(value, float):
+        return "REAL"
+    if isinstance(value, str):
+        return "TEXT"
+    return "BLOB"
+
+
+def _affinity(declared: str) -> str:
+    """Return the SQLite type affinity of a declared column type."""
+    declared = declared.upper()
+    if "INT" in declared:
+        return "INTEGER"
+    if "CHAR" in declared or "CLOB" in declared or "TEXT" in declared:
+        return "TEXT"
+    if "BLOB" in declared or not declared:
+        return "BLOB"
+    if "REAL" in declared or "FLOA" in declared or "DOUB" in declared:
+        return "REAL"
+    return "NUMERIC"
+
+
+def _resolve_type(declared: Optional[str], classes: Iterable[str]) -> Optional[str]:
+    """
+    Return the type to report for a result column.
+
+    Declared types are looked up by column name, so an aliased expression such as
+    AVG(quantity) AS quantity gets the type of the table column. The declared type
+    is kept only if the column's values have the storage class its affinity
+    produces; otherwise the type is inferred from the values.
+
+    Args:
+        declared: Declared SQLite type, or None
+        classes: Storage classes of the column's non-NULL values
+    """
+    classes = set(classes)
+    if declared:
+        affinity = _affinity(declared)
+        if affinity in ("BLOB", "NUMERIC") or classes <= {affinity}:
+            return declared
+    if len(classes) == 1:
+        return classes.pop()
+    if classes == {"INTEGER", "REAL"}:
+        return "REAL"
+    return None
+
+
+class _ResultWriter:
+    """Base class for the incremental writers used by format_result."""
+
+    # Writers producing bytes instead of text set this
+    binary = False
+    header = ""
+
+    def measure(self, encoded: Any) -> int:
+        """UTF-8 size an encoded row adds to the output."""
+        return len(encoded.encode("utf-8"))
+
+    def output_size(self, output: Any, counted: int) -> int:
+        """UTF-8 size of the final output, given the header and row sizes counted while writing."""
+        return counted
+
+
+class _TextWriter(_ResultWriter):
+    """Pipe-separated text table, the historical query_database output."""
+
+    def __init__(self, columns: Sequence[str], column_types: Sequence[Optional[str]]):
+        self.buffer = io.StringIO()
+        self.first_line = True
+        self.header = ""
+        if columns:
+            header = " | ".join(columns)
+            self.header = f"{header}\n{'-' * len(header)}"
+            self.buffer.write(self.header)
+            self.first_line = False
+
+    def encode(self, row: Sequence[Any]) -> str:
+        line = " | ".join(str(cell) for cell in row)
+        return line if self.first_line else "\n" + line
+
+    def append(self, line: str, row: Sequence[Any]):
+        self.buffer.write(line)
+        self.first_line = False
+
+    def getvalue(self, rows_returned: int, truncated: bool) -> str:
+        if rows_returned == 0 and not truncated:
+            return "No results found."
+        return self.buffer.getvalue()
+
+
+class _CsvWriter(_ResultWriter):
+    """RFC 4180 CSV with a header row."""
+
+    def __init__(self, columns: Sequence[str], column_types: Sequence[Optional[str]]):
+        self.buffer = io.StringIO()
+        self.line = io.StringIO()
+        self.writer = csv.writer(self.line, lineterminator="\n")
+        self.header = self.encode(columns) if columns else ""
+        self.buffer.write(self.header)
+
+    def encode(self, row: Sequence[Any]) -> str:
+        self.line.seek(0)
+        self.line.truncate()
+        self.writer.writerow(row)
+        return self.line.getvalue()
+
+    def append(self, line: str, row: Sequence[Any]):
+        self.buffer.write(line)
+
+    def getvalue(self, rows_returned: int, truncated: bool) -> str:
+        return self.buffer.getvalue()
+
+
+class _JsonLinesWriter(_ResultWriter):
+    """One JSON object per row, keyed by column name."""
+
+    def __init__(self, columns: Sequence[str], column_types: Sequence[Optional[str]]):
+        self.columns = list(columns)
+        self.buffer = io.StringIO()
+        self.header = ""
+
+    def encode(self, row: Sequence[Any]) -> str:
+        return _encode_json(dict(zip(self.columns, row))) + "\n"
+
+    def append(self, line: str, row: Sequence[Any]):
+        self.buffer.write(line)
+
+    def getvalue(self, rows_returned: int, truncated: bool) -> str:
+        return self.buffer.getvalue()
+
+
+class _JsonColumnsWriter(_ResultWriter):
+    """Column names, SQLite types and one value array per column."""
+
+    def __init__(self, columns: Sequence[str], column_types: Sequence[Optional[str]]):
+        self.columns = list(columns)
+        self.types = list(column_types) if column_types else [None] * len(self.columns)
+        # Cells are kept JSON-encoded per column and joined once at the end
+        self.values: List[List[str]] = [[] for _ in self.columns]
+        # Storage classes seen per column, checked against the declared types
+        self.classes: List[set] = [set() for _ in self.columns]
+        # The budget starts from the empty document; types are counted at their longest
+        # resolution, since inferred storage classes may replace NULL or short declared types
+        budget_types = [declared if declared and len(declared) >= 7 else "INTEGER" for declared in self.types]
+        self.header = self._document(budget_types, [[] for _ in self.columns])
+
+    def encode(self, row: Sequence[Any]) -> List[str]:
+        return [_encode_json(cell) for cell in row]
+
+    def measure(self, cells: List[str]) -> int:
+        # Cells plus the ", " separators between them in the final arrays
+        return sum(len(cell.encode("utf-8")) + 2 for cell in cells)
+
+    def append(self, cells: List[str], row: Sequence[Any]):
+        for index, cell in enumerate(cells):
+            self.values[index].append(cell)
+            if row[index] is not None:
+                self.classes[index].add(storage_class(row[index]))
+
+    def _document(self, types: Sequence[Optional[str]], values: List[List[str]]) -> str:
+        prefix = _encode_json({"columns": self.columns, "types": types})
+        data = ", ".join("[" + ", ".join(column) + "]" for column in values)
+        return f'{prefix[:-1]}, "data": [{data}]}}'
+
+    def getvalue(self, rows_returned: int, truncated: bool) -> str:
+        types = [_resolve_type(declared, classes) for declared, classes in zip(self.types, self.classes)]
+        return self._document(types, self.values)
+
+    def output_size(self, output: str, counted: int) -> int:
+        # The counted size is an upper bound; report what was actually written
+        return len(output.encode("utf-8"))
+
+
+# Arrow types for declared SQLite column types
+_ARROW_TYPES = {
+    "INTEGER": "int64",
+    "REAL": "float64",
+    "TEXT": "string",
+    "BLOB": "binary",
+}
+
+# Storage classes of the Arrow types pyarrow infers from sqlite3 values
+_STORAGE_CLASSES = {"int64": "INTEGER", "double": "REAL", "string": "TEXT", "binary": "BLOB"}
+
+
+class _ArrowWriter(_ResultWriter):
+    """Arrow IPC stream holding the result as one record batch."""
+
+    binary = True
+
+    def __init__(self, columns: Sequence[str], column_types: Sequence[Optional[str]]):
+        if pa is None:
+            raise RuntimeError("The arrow format requires pyarrow (pip install pyarrow)")
+        self.columns = list(columns)
+        self.types = list(column_types) if column_types else [None] * len(self.columns)
+        self.values: List[List[Any]] = [[] for _ in self.columns]
+
+    def encode(self, row: Sequence[Any]) -> Sequence[Any]:
+        return row
+
+    def measure(self, row: Sequence[Any]) -> int:
+        # Approximate Arrow buffer size: fixed width for numbers, length plus offset otherwise
+        size = 0
+        for cell in row:
+            if isinstance(cell, (str, bytes)):
+                size += len(cell) + 4
+            else:
+                size += 8
+        return size
+
+    def append(self, row: Sequence[Any], raw: Sequence[Any]):
+        for index, cell in enumerate(row):
+            self.values[index].append(cell)
+
+    def _array(self, values: List[Any], declared: Optional[str]):
+        """Build one Arrow column typed by its values, falling back to strings for mixed-type columns."""
+        try:
+            array = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # SQLite columns may mix storage classes; keep them readable as text
+            return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+        inferred = _STORAGE_CLASSES.get(str(array.type))
+        arrow_type = _ARROW_TYPES.get(_resolve_type(declared, [inferred] if inferred else []) or "")
+        if arrow_type is not None and array.type != pa.type_for_alias(arrow_type):
+            try:
+                # Safe casts raise instead of truncating or overflowing
+                array = array.cast(arrow_type, safe=True)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                pass
+        return array
+
+    def getvalue(self, rows_returned: int, truncated: bool) -> bytes:
+        arrays = [self._array(values, declared) for values, declared in zip(self.values, self.types)]
+        self.values = []
+        # Column names may repeat in joins, so the schema is built positionally
+        schema = pa.schema([pa.field(name, array.type) for name, array in zip(self.columns, arrays)])
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, schema) as stream:
+            stream.write_batch(pa.record_batch(arrays, schema=schema))
+        return sink.getvalue().to_pybytes()
+
+
+_WRITERS = {
+    "text": _TextWriter,
+    "csv": _CsvWriter,
+    "json-columns": _JsonColumnsWriter,
+    "jsonl": _JsonLinesWriter,
+    "arrow": _ArrowWriter,
+}
+
+# MIME type of arrow results embedded in MCP resources
+ARROW_MIME_TYPE = "application/vnd.apache.arrow.stream"
+
+FORMATS = tuple(_WRITERS)
+
+# Formats whose output can be split into chunks that concatenate to the whole result
+STREAM_FORMATS = ("text", "csv", "jsonl")
+
+
+def format_result(
+    columns: Sequence[str],
+    batches: Iterable[Sequence[tuple]],
+    fmt: str = "text",
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    column_types: Optional[Sequence[Optional[str]]] = None,
+) -> FormattedResult:
+    """
+    Format rows in the requested format within row and byte budgets.
+
+    Args:
+        columns: Result column names
+        batches: Iterable of row batches, e.g. iter_batches(cursor)
+        fmt: One of FORMATS ("text", "csv", "json-columns", "jsonl", "arrow")
+        max_rows: Stop after this many rows (None for no limit)
+        max_bytes: Stop before the output exceeds this many UTF-8 bytes (None for no limit)
+        column_types: Declared SQLite type per column, used by json-columns and arrow
+
+    Returns:
+        FormattedResult with the formatted output and truncation metadata
+    """
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unsupported result format: {fmt} (expected one of {', '.join(FORMATS)})")
+
+    writer = _WRITERS[fmt](columns, column_types or [None] * len(columns))
+    size = len(writer.header.encode("utf-8"))
+    measure = writer.measure
+    rows_returned = 0
+    truncated = False
+    batch_iter = iter(batches)
+
+    for batch in batch_iter:
+        for row in batch:
+            if max_rows is not None and rows_returned >= max_rows:
+                truncated = True
+                break
+
+            encoded = writer.encode(row)
+            row_size = measure(encoded)
+            if max_bytes is not None and size + row_size > max_bytes:
+                truncated = True
+                break
+
+            writer.append(encoded, row)
+            size += row_size
+            rows_returned += 1
+
+        if truncated:
+            break
+
+        if max_rows is not None and rows_returned >= max_rows:
+            # Budget used up exactly at a batch boundary: peek for more rows
+            for next_batch in batch_iter:
+                if next_batch:
+                    truncated = True
+                    break
+            break
+
+    rows_total = None if truncated else rows_returned
+    output = writer.getvalue(rows_returned, truncated)
+    if writer.binary:
+        return FormattedResult("", rows_returned, rows_total, truncated, len(output), payload=output)
+    size = writer.output_size(output, size)
+    # Only a header larger than the whole budget (e.g. json-columns names and types) gets here
+    exceeded = max_bytes is not None and size > max_bytes
+    return FormattedResult(output, rows_returned, rows_total, truncated, size, max_bytes_exceeded=exceeded)
+
+
+def iter_chunks(
+    columns: Sequence[str],
+    batches: Iterable[Sequence[tuple]],
+    fmt: str = "jsonl",
+    chunk_rows: int = FETCH_BATCH_SIZE,
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> Iterator[FormattedResult]:
+    """
+    Format rows incrementally, yielding one FormattedResult per chunk.
+
+    Concatenating the chunk texts gives the same output as format_result. Each
+    chunk reports its own rows and bytes; the last one is always yielded, may be
+    empty, and carries the truncated flag.
+
+    Args:
+        columns: Result column names
+        batches: Iterable of row batches, e.g. iter_batches(cursor)
+        fmt: One of STREAM_FORMATS ("text", "csv", "jsonl")
+        chunk_rows: Rows per chunk
+        max_rows: Stop after this many rows in total (None for no limit)
+        max_bytes: Stop before the output exceeds this many UTF-8 bytes in total (None for no limit)
+    """
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(f"Unsupported stream format: {fmt} (expected one of {', '.join(STREAM_FORMATS)})")
+
+    writer = _WRITERS[fmt](columns, [None] * len(columns))
+    size = len(writer.header.encode("utf-8"))
+    chunk_size = size
+    measure = writer.measure
+    rows_returned = 0
+    chunk_count = 0
+    truncated = False
+
+    def flush(rows: int, nbytes: int, last: bool) -> FormattedResult:
+        text = writer.getvalue(rows_returned, truncated and last)
+        writer.buffer = io.StringIO()
+        return FormattedResult(text, rows, None, truncated and last, nbytes)
+
+    for batch in batches:
+        for row in batch:
+            if max_rows is not None and rows_returned >= max_rows:
+                truncated = True
+                break
+
+            encoded = writer.encode(row)
+            row_size = measure(encoded)
+            if max_bytes is not None and size + row_size > max_bytes:
+                truncated = True
+                break
+
+            writer.append(encoded, row)
+            size += row_size
+            chunk_size += row_size
+            rows_returned += 1
+            chunk_count += 1
+            if chunk_count >= chunk_rows:
+                yield flush(chunk_count, chunk_size, False)
+                chunk_count = 0
+                chunk_size = 0
+
+        if truncated:
+            break
+
+    yield flush(chunk_count, chunk_size, True)
+
+
+class DeclaredTypes:
+    """Declared column types by result column name, reloaded when the schema changes."""
+
+    def __init__(self):
+        # (schema_version, lower-cased column name -> declared type)
+        self._cached: Optional[tuple] = None
+
+    def lookup(self, conn: sqlite3.Connection, columns: Sequence[str]) -> List[Optional[str]]:
+        """
+        Look up declared column types by result column name.
+
+        sqlite3 does not expose sqlite3_column_decltype, so result columns are matched
+        against table columns by name. Names declared with different types in different
+        tables, and computed columns, are left as None for the formatter to infer. A
+        name match may still be an alias of an expression, so the writers keep a
+        declared type only if the column's values agree with it.
+        """
+        schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        cached = self._cached
+        if cached is None or cached[0] != schema_version:
+            declared: Dict[str, Optional[str]] = {}
+            for name, col_type in conn.execute(
+                "SELECT p.name, p.type FROM sqlite_master AS m "
+                "JOIN pragma_table_info(m.name) AS p WHERE m.type = 'table'"
+            ):
+                key = name.lower()
+                if key in declared and declared[key] != col_type:
+                    declared[key] = None
+                else:
+                    declared[key] = col_type or None
+            cached = (schema_version, declared)
+            self._cached = cached
+        return [cached[1].get(column.lower()) for column in columns]
+
+
+def execute_formatted(
+    conn: sqlite3.Connection,
+    query: str,
+    params: Any = (),
+    fmt: str = "text",
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    declared_types: Optional[DeclaredTypes] = None,
+) -> FormattedResult:
+    """
+    Execute a query and format its rows batch by batch within the budgets.
+
+    declared_types supplies column types for json-columns and arrow; without it
+    they are inferred from the values.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        columns = cursor_columns(cursor)
+        column_types = None
+        if declared_types is not None and fmt in ("json-columns", "arrow"):
+            column_types = declared_types.lookup(conn, columns)
+        return format_result(columns, iter_batches(cursor), fmt, max_rows, max_bytes, column_types)
+    finally:
+        cursor.close()
@@ -0,0 +1,145 @@
+"""
+Table Sampling
+
+This module picks a few random rows from a table without reading all of it.
+ORDER BY RANDOM() sorts the whole table to return a handful of rows; instead,
+random keys are drawn from the range of the table's rowid (or INTEGER PRIMARY KEY)
+and looked up with one IN query, so the cost grows with the sample size, not the
+table size. If deleted rows leave too few hits, the sample is topped up with the
+rows following a random key. Tables without such a key fall back to their first rows.
+"""
+
+import random
+import sqlite3
+from typing import Callable, List, Optional, Tuple
+
+# Largest sample a caller may ask for
+MAX_SAMPLE_ROWS = 100
+
+# Keys drawn per missing row; extra keys cover gaps left by deleted rows
+_OVERSAMPLE = 2
+_ROUNDS = 3
+
+# (columns, rows) of a statement
+Fetch = Callable[[sqlite3.Connection, str], Tuple[List[str], List[tuple]]]
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _fetch(conn: sqlite3.Connection, sql: str) -> Tuple[List[str], List[tuple]]:
+    cursor = conn.execute(sql)
+    try:
+        return [description[0] for description in cursor.description or []], cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def sample_key(conn: sqlite3.Connection, table: str) -> Optional[str]:
+    """
+    Return the column to sample a table by, or None when it has no integer key.
+
+    The key is the INTEGER PRIMARY KEY column if there is one, else rowid. It is
+    looked up on the main schema's table, so a TEMP VIEW of the same name (as
+    for partitioned tables) is sampled by its underlying table's key.
+    """
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE", (table,)
+    ).fetchone()
+    if row is None:
+        return None
+    primary_key = [
+        (name, (col_type or "").upper())
+        for name, col_type, pk in conn.execute(
+            "SELECT name, type, pk FROM pragma_table_info(?, 'main') WHERE pk > 0", (table,)
+        )
+    ]
+    if len(primary_key) == 1 and primary_key[0][1] == "INTEGER":
+        return _quote(primary_key[0][0])
+    if "WITHOUT ROWID" in (row[0] or "").upper():
+        return None
+    return "rowid"
+
+
+def sample_table(
+    conn: sqlite3.Connection,
+    table: str,
+    rows: int = 5,
+    rng: Optional[random.Random] = None,
+    fetch: Fetch = _fetch,
+) -> Tuple[List[str], List[tuple], str]:
+    """
+    Sample up to rows random rows of a table.
+
+    Args:
+        conn: Connection to read from
+        table: Table or view name
+        rows: Sample size, at most MAX_SAMPLE_ROWS
+        rng: Random source, e.g. seeded for reproducible samples
+        fetch: Runs a statement and returns (columns, rows); lets the caller
+            route statements, e.g. to partition files
+
+    Returns:
+        Column names, sampled rows in key order and the method used
+        ("key_range" or "first_rows")
+
+    Raises:
+        ValueError: The table does not exist or rows is out of range
+    """
+    if not 1 <= rows <= MAX_SAMPLE_ROWS:
+        raise ValueError(f"rows must be between 1 and {MAX_SAMPLE_ROWS}")
+    if conn.execute("SELECT 1 FROM pragma_table_info(?)", (table,)).fetchone() is None:
+        raise ValueError(f"No such table: {table}")
+    rng = rng or random.Random()
+    source = _quote(table)
+
+    key = sample_key(conn, table)
+    if key is None:
+        columns, sampled = fetch(conn, f"SELECT * FROM {source} LIMIT {rows}")
+        return columns, sampled, "first_rows"
+
+    # Separate statements: SQLite answers a lone MIN or MAX of a key from the
+    # B-tree edge, but scans the table for both at once
+    _, low = fetch(conn, f"SELECT MIN({key}) FROM {source}")
+    _, high = fetch(conn, f"SELECT MAX({key}) FROM {source}")
+    low, high = low[0][0], high[0][0]
+    if low is None:
+        columns, _ = fetch(conn, f"SELECT * FROM {source} LIMIT 0")
+        return columns, [], "key_range"
+
+    select = f"SELECT {key}, * FROM {source}"
+    if high - low + 1 <= rows * _OVERSAMPLE * _ROUNDS:
+        # Small key range: read it whole and sample in memory
+        columns, found = fetch(conn, f"{select} WHERE {key} BETWEEN {low} AND {high}")
+        found = rng.sample(found, min(rows, len(found)))
+    else:
+        tried = set()
+        found = []
+        columns = []
+        for _ in range(_ROUNDS):
+            missing = rows - len(found)
+            keys = set()
+            while len(keys) < missing * _OVERSAMPLE:
+                candidate = rng.randint(low, high)
+                if candidate not in tried:
+                    keys.add(candidate)
+            tried |= keys
+            columns, hits = fetch(conn, f"{select} WHERE {key} IN ({', '.join(map(str, keys))})")
+            found.extend(rng.sample(hits, min(missing, len(hits))))
+            if len(found) >= rows:
+                break
+        if len(found) < rows:
+            # Keys too sparse for the draws: take the next rows in key order after a random key
+            seen = {row[0] for row in found}
+            start = rng.randint(low, high)
+            for condition in (f"{key} >= {start}", f"{key} < {start}"):
+                _, hits = fetch(conn, f"{select} WHERE {condition} ORDER BY {key} LIMIT {rows}")
+                found.extend(row for row in hits if row[0] not in seen)
+                seen.update(row[0] for row in hits)
+                if len(found) >= rows:
+                    break
+            found = found[:rows]
+
+    found.sort(key=lambda row: row[0])
+    return columns[1:], [row[1:] for row in found], "key_range"
@@ -1,39 +1,40 @@
+import argparse
+import glob
+import os
 import sqlite3
 from datetime import datetime
 
-def setup_database():
-    """Create and populate the SQLite database with sample data."""
-    # Connect to SQLite database (creates file if it doesn't exist)
-    conn = sqlite3.connect('sales.db')
-    cursor = conn.cursor()
-    
-    # Drop tables if they exist (for clean setup)
-    cursor.execute('DROP TABLE IF EXISTS sales')
-    cursor.execute('DROP TABLE IF EXISTS products')
-    
-    # Create products table
-    cursor.execute('''
-        CREATE TABLE products (
-            product_id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL,
-            category TEXT NOT NULL,
-            price REAL NOT NULL
-        )
-    ''')
-    
-    # Create sales table
-    cursor.execute('''
-        CREATE TABLE sales (
-            sale_id INTEGER PRIMARY KEY,
-            product_id INTEGER,
-            quantity INTEGER NOT NULL,
-            sale_date TEXT NOT NULL,
-            region TEXT NOT NULL,
-            FOREIGN KEY (product_id) REFERENCES products (product_id)
-        )
-    ''')
+from partitions import GRANULARITIES, MANIFEST_DDL, MANIFEST_TABLE, max_attached, partition_for
+
+SALES_COLUMNS = '''
+        sale_id INTEGER PRIMARY KEY,
+        product_id INTEGER,
+        quantity INTEGER NOT NULL,
+        sale_date TEXT NOT NULL,
+        region TEXT NOT NULL'''
+
+SALES_DDL = f'''
+    CREATE TABLE sales ({SALES_COLUMNS},
+        FOREIGN KEY (product_id) REFERENCES products (product_id)
+    )
+'''
+
+# Products live in the main database, so the partition copy has no foreign key
+PARTITION_SALES_DDL = f'''
+    CREATE TABLE sales ({SALES_COLUMNS}
+    )
+'''
+
+def setup_database(db_path: str = 'sales.db', partition: str = None):
+    """
+    Create and populate the SQLite database with sample data.
     
-    # Insert sample products
+    Args:
+        db_path: Database file to create
+        partition: "month" or "year" to store sales in one file per period
+            (see partitions.py); None keeps a single sales table
+    """
+    # Sample products
     products_data = [
         (1, 'Laptop', 'Electronics', 999.99),
         (2, 'Mouse', 'Electronics', 29.99),
@@ -44,12 +45,7 @@ def setup_database():
         (7, 'Notebook', 'Stationery', 4.99)
     ]
     
-    cursor.executemany('''
-        INSERT INTO products (product_id, name, category, price)
-        VALUES (?, ?, ?, ?)
-    ''', products_data)
-    
-    # Insert sample sales
+    # Sample sales
     sales_data = [
         (1, 1, 2, '2023-10-15', 'North'),
         (2, 2, 5, '2023-10-16', 'South'),
@@ -65,18 +61,128 @@ def setup_database():
         (12, 4, 3, '2023-11-02', 'West')
     ]
     
+    # Refuse a layout the server cannot open before anything is dropped or written
+    if partition:
+        check_partition_count(sales_data, partition)
+    
+    # Connect to SQLite database (creates file if it doesn't exist)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    # Drop tables if they exist (for clean setup)
+    cursor.execute('DROP TABLE IF EXISTS sales')
+    cursor.execute('DROP TABLE IF EXISTS products')
+    cursor.execute(f'DROP TABLE IF EXISTS {MANIFEST_TABLE}')
+    
+    # Create products table
+    cursor.execute('''
+        CREATE TABLE products (
+            product_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            price REAL NOT NULL
+        )
+    ''')
+    
+    # Create sales table (left empty as the schema of record when partitioned)
+    cursor.execute(SALES_DDL)
+    
+    # Insert sample products
     cursor.executemany('''
-        INSERT INTO sales (sale_id, product_id, quantity, sale_date, region)
-        VALUES (?, ?, ?, ?, ?)
-    ''', sales_data)
+        INSERT INTO products (product_id, name, category, price)
+        VALUES (?, ?, ?, ?)
+    ''', products_data)
+    
+    if partition:
+        partitions = write_partitions(db_path, sales_data, partition)
+        cursor.execute(MANIFEST_DDL)
+        cursor.executemany(
+            f'INSERT INTO {MANIFEST_TABLE} (name, path, lower_bound, upper_bound) VALUES (?, ?, ?, ?)',
+            partitions
+        )
+    else:
+        cursor.executemany('''
+            INSERT INTO sales (sale_id, product_id, quantity, sale_date, region)
+            VALUES (?, ?, ?, ?, ?)
+        ''', sales_data)
     
     # Commit changes and close connection
     conn.commit()
     conn.close()
     
-    print("Database setup complete! Created sales.db with sample data.")
+    print(f"Database setup complete! Created {db_path} with sample data.")
     print("Tables created: products, sales")
     print(f"Inserted {len(products_data)} products and {len(sales_data)} sales records.")
+    if partition:
+        print(f"Sales are stored in {len(partitions)} {partition} partitions under {partition_dir(db_path)}/")
+
+def partition_dir(db_path: str) -> str:
+    """Directory holding the partition files of a database."""
+    return os.path.splitext(db_path)[0] + '_partitions'
+
+def group_by_partition(sales_data: list, granularity: str) -> dict:
+    """Group sales rows by (name, lower bound, upper bound) of their partition."""
+    by_partition = {}
+    for row in sales_data:
+        by_partition.setdefault(partition_for(row[3], granularity), []).append(row)
+    return by_partition
+
+def check_partition_count(sales_data: list, granularity: str):
+    """
+    Raise ValueError if the rows need more partitions than the server can attach.
+    
+    The server covers the partitions with a view over attached databases, so it
+    refuses to start with more of them than SQLite allows one connection.
+    """
+    count, limit = len(group_by_partition(sales_data, granularity)), max_attached()
+    if count > limit:
+        raise ValueError(
+            f"The sales data spans {count} {granularity} partitions, more than the {limit} databases "
+            "SQLite can attach; use a coarser --partition"
+        )
+
+def write_partitions(db_path: str, sales_data: list, granularity: str) -> list:
+    """
+    Write sales rows into one database file per period.
+    
+    Returns:
+        Manifest rows (name, path relative to the main database, lower bound, upper bound)
+    
+    Raises:
+        ValueError: The rows need more partitions than the server can attach
+    """
+    check_partition_count(sales_data, granularity)
+    directory = partition_dir(db_path)
+    os.makedirs(directory, exist_ok=True)
+    for stale in glob.glob(os.path.join(directory, 'sales_*.db')):
+        os.remove(stale)
+    
+    manifest = []
+    for (name, lower, upper), rows in sorted(group_by_partition(sales_data, granularity).items()):
+        path = os.path.join(directory, f'sales_{name}.db')
+        part = sqlite3.connect(path)
+        part.execute(PARTITION_SALES_DDL)
+        part.execute('CREATE INDEX idx_sales_sale_date ON sales (sale_date)')
+        part.executemany(
+            'INSERT INTO sales (sale_id, product_id, quantity, sale_date, region) VALUES (?, ?, ?, ?, ?)',
+            rows
+        )
+        part.commit()
+        part.close()
+        relative = os.path.relpath(path, os.path.dirname(os.path.abspath(db_path)))
+        manifest.append((name, relative, lower, upper))
+    return manifest
 
 if __name__ == "__main__":
-    setup_database()
+    parser = argparse.ArgumentParser(description="Create the sample sales database")
+    parser.add_argument("--db-path", default="sales.db", help="Database file to create")
+    parser.add_argument(
+        "--partition",
+        choices=GRANULARITIES,
+        help="Store sales in one SQLite file per month or year, routed by the MCP server"
+    )
+    args = parser.parse_args()
+    try:
+        setup_database(args.db_path, args.partition)
+    except ValueError as e:
+        parser.error(str(e))
@@ -46,12 +46,20 @@ Optimization techniques to consider:
 Rules:
 - Maintain the same query logic and results
 - Only suggest realistic optimizations for SQLite
+- Base index and join advice on the query plan when one is given
+- Use the column statistics to estimate how selective filters and joins are
 - Explain each optimization clearly
 - If no optimization is needed, say so
 
 Database Schema:
 {schema}
 
+Query Plan (EXPLAIN QUERY PLAN):
+{plan}
+
+Column Statistics:
+{stats}
+
 Original Query:
 {query}"""),
             ("human", "Please optimize this SQL query and explain your optimizations.")
@@ -72,18 +80,26 @@ Provide analysis on:
 Database Schema:
 {schema}
 
+Query Plan (EXPLAIN QUERY PLAN):
+{plan}
+
+Column Statistics:
+{stats}
+
 Query to analyze:
 {query}"""),
             ("human", "Please analyze this SQL query for performance characteristics.")
         ])
     
-    def optimize_query(self, query: str, schema: str) -> Dict[str, str]:
+    def optimize_query(self, query: str, schema: str, plan: str = "", stats: str = "") -> Dict[str, str]:
         """
         Optimize a SQL query and return optimization details.
         
         Args:
             query: The SQL query to optimize
             schema: Database schema information
+            plan: Query plan outline from query_plan.format_plan, if available
+            stats: Column statistics outline from column_stats.format_stats, if available
             
         Returns:
             Dictionary with optimization results
@@ -93,7 +109,9 @@ Query to analyze:
             optimization_chain = self.optimization_prompt | self.llm
             optimization_result = optimization_chain.invoke({
                 "query": query,
-                "schema": schema
+                "schema": schema,
+                "plan": plan or "Not available",
+                "stats": stats or "Not available"
             })
             
             # Parse the optimization response
@@ -119,13 +137,15 @@ Query to analyze:
                 "status": "error"
             }
     
-    def analyze_query(self, query: str, schema: str) -> Dict[str, str]:
+    def analyze_query(self, query: str, schema: str, plan: str = "", stats: str = "") -> Dict[str, str]:
         """
         Analyze a SQL query for performance characteristics.
         
         Args:
             query: The SQL query to analyze
             schema: Database schema information
+            plan: Query plan outline from query_plan.format_plan, if available
+            stats: Column statistics outline from column_stats.format_stats, if available
             
         Returns:
             Dictionary with analysis results
@@ -134,7 +154,9 @@ Query to analyze:
             analysis_chain = self.analysis_prompt | self.llm
             analysis_result = analysis_chain.invoke({
                 "query": query,
-                "schema": schema
+                "schema": schema,
+                "plan": plan or "Not available",
+                "stats": stats or "Not available"
             })
             
             return {
@@ -0,0 +1,160 @@
+"""
+SQL Tokenizer
+
+A small lexer for the query rewriters (the partition router and rollups). It
+splits SQL into tokens tagged with their parenthesis depth, so callers can find
+top-level clauses, split lists on commas and parse SELECT list entries without a
+full SQL parser. Anything the helpers do not understand is left for the caller
+to reject.
+"""
+
+import re
+from typing import List, NamedTuple, Optional
+
+# Aggregates with one argument that the rewriters can re-aggregate
+AGGREGATES = frozenset({"sum", "count", "total", "min", "max", "avg"})
+
+_TOKEN = re.compile(
+    r"""
+    (?P<string>'(?:[^']|'')*')
+    | (?P<identifier>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+    | (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+    | (?P<space>\s+)
+    | (?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<op><=|>=|<>|!=|==|\|\||.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+class Token(NamedTuple):
+    """One lexeme; depth counts the parentheses it is nested in."""
+
+    kind: str
+    text: str
+    start: int
+    end: int
+    depth: int
+
+    @property
+    def name(self) -> Optional[str]:
+        """Lower-cased identifier for words and quoted identifiers."""
+        if self.kind == "word":
+            return self.text.lower()
+        if self.kind == "identifier":
+            return self.text[1:-1].lower()
+        return None
+
+    def is_word(self, *words: str) -> bool:
+        return self.kind == "word" and self.text.lower() in words
+
+
+def tokenize(query: str) -> List[Token]:
+    """Split a query into tokens, dropping whitespace and comments."""
+    tokens = []
+    depth = 0
+    for match in _TOKEN.finditer(query):
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        text = match.group()
+        if text == ")":
+            depth -= 1
+        tokens.append(Token(kind, text, match.start(), match.end(), depth))
+        if text == "(":
+            depth += 1
+    return tokens
+
+
+def split_commas(tokens: List[Token], depth: int) -> List[List[Token]]:
+    """Split tokens on the commas at the given depth, e.g. a SELECT list into its entries."""
+    parts: List[List[Token]] = [[]]
+    for token in tokens:
+        if token.text == "," and token.depth == depth:
+            parts.append([])
+        else:
+            parts[-1].append(token)
+    return parts
+
+
+def span(query: str, tokens: List[Token]) -> str:
+    """Return the query text covered by a run of tokens."""
+    return query[tokens[0].start:tokens[-1].end]
+
+
+def expression_key(tokens: List[Token]) -> str:
+    """Comparable form of an expression: lower-cased tokens without whitespace."""
+    return "".join(token.text.lower() for token in tokens)
+
+
+# Words that end an expression rather than introduce an alias
+_NOT_ALIAS = {"null", "end", "true", "false", "current_date", "current_time", "current_timestamp"}
+_OPERATOR_WORDS = {"is", "not", "and", "or", "like", "glob", "in", "case", "when", "then", "else", "between", "escape"}
+
+
+class SelectItem(NamedTuple):
+    """One SELECT list entry."""
+
+    expr: List[Token]
+    alias: Optional[str]
+    name: str
+    aggregate: Optional[str]
+    argument: Optional[List[Token]]
+
+
+def parse_select_item(query: str, tokens: List[Token], depth: int) -> SelectItem:
+    """Parse one SELECT list entry at the given depth into expression, alias, name and aggregate."""
+    alias = None
+    expr = tokens
+    if len(tokens) >= 3 and tokens[-2].is_word("as") and tokens[-1].name:
+        alias, expr = tokens[-1].name, tokens[:-2]
+    elif (
+        len(tokens) >= 2
+        and tokens[-1].name
+        and tokens[-1].name not in _NOT_ALIAS
+        and tokens[-1].name not in _OPERATOR_WORDS
+        and (
+            tokens[-2].text == ")"
+            or tokens[-2].kind in ("string", "number")
+            or (tokens[-2].name and tokens[-2].name not in _OPERATOR_WORDS)
+        )
+    ):
+        alias, expr = tokens[-1].name, tokens[:-1]
+
+    if alias is not None:
+        raw = tokens[-1].text
+        name = raw[1:-1] if tokens[-1].kind == "identifier" else raw
+    elif expr[-1].name and (len(expr) == 1 or (len(expr) == 3 and expr[1].text == ".")):
+        # Plain column references are named after the column
+        raw = expr[-1].text
+        name = raw[1:-1] if expr[-1].kind == "identifier" else raw
+    else:
+        name = span(query, expr)
+
+    aggregate = argument = None
+    if (
+        len(expr) >= 3
+        and expr[0].kind == "word"
+        and expr[0].text.lower() in AGGREGATES
+        and expr[1].text == "("
+        and expr[-1].text == ")"
+        and not any(token.text == "," and token.depth == depth + 1 for token in expr[2:-1])
+        and not any(token.text == ")" and token.depth == depth for token in expr[2:-1])
+    ):
+        aggregate, argument = expr[0].text.lower(), expr[2:-1]
+    return SelectItem(expr, alias, name, aggregate, argument)
+
+
+def contains_aggregate(tokens: List[Token]) -> bool:
+    """True when an aggregate call (one argument) appears anywhere in an expression."""
+    for index, token in enumerate(tokens[:-1]):
+        if token.kind == "word" and token.text.lower() in AGGREGATES and tokens[index + 1].text == "(":
+            inner_depth = tokens[index + 1].depth + 1
+            end = next(
+                (j for j in range(index + 2, len(tokens)) if tokens[j].text == ")" and tokens[j].depth == inner_depth - 1),
+                len(tokens),
+            )
+            if not any(t.text == "," and t.depth == inner_depth for t in tokens[index + 2:end]):
+                return True
+    return False
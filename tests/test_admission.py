@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from admission import BATCH, INTERACTIVE, AdmissionController, AdmissionRejected
+
+
+async def hold(controller, priority, order, release):
+    async with controller.admit(priority):
+        order.append(priority)
+        await release.wait()
+
+
+def test_interactive_calls_are_admitted_before_earlier_batch_calls():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1)
+        order = []
+        blocker = asyncio.Event()
+        first = asyncio.create_task(hold(controller, BATCH, order, blocker))
+        await asyncio.sleep(0)
+
+        done = asyncio.Event()
+        done.set()
+        waiting = []
+        for priority in (BATCH, INTERACTIVE, BATCH, INTERACTIVE):
+            waiting.append(asyncio.create_task(hold(controller, priority, order, done)))
+            await asyncio.sleep(0)
+        assert controller.stats()["queue_depth"] == 4
+
+        blocker.set()
+        await asyncio.gather(first, *waiting)
+        return order
+
+    assert asyncio.run(scenario()) == [BATCH, INTERACTIVE, INTERACTIVE, BATCH, BATCH]
+
+
+def test_batch_work_leaves_a_slot_for_interactive_calls():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=2)
+        order = []
+        release = asyncio.Event()
+        batch = [asyncio.create_task(hold(controller, BATCH, order, release)) for _ in range(2)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(hold(controller, INTERACTIVE, order, release))
+        await asyncio.sleep(0)
+        admitted = list(order)
+        release.set()
+        await asyncio.gather(*batch, interactive)
+        return admitted
+
+    assert asyncio.run(scenario()) == [BATCH, INTERACTIVE]
+
+
+def test_full_queue_and_queue_timeout_are_rejected():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout_ms=50)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(controller, INTERACTIVE, [], release))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(hold(controller, INTERACTIVE, [], release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected, match="queue is full") as full:
+            async with controller.admit(INTERACTIVE):
+                pass
+        with pytest.raises(AdmissionRejected, match="waited 50 ms"):
+            await queued
+        release.set()
+        await running
+        return full.value.retry_after_ms, controller.stats()
+
+    retry_after_ms, stats = asyncio.run(scenario())
+    assert retry_after_ms >= 50
+    assert stats["queue_depth"] == 0
@@ -0,0 +1,99 @@
+import sqlite3
+
+import pytest
+
+from column_stats import ColumnStatsStore, compute_table_stats, format_stats
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "stats.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE sales (sale_id INTEGER PRIMARY KEY, region TEXT, quantity INTEGER, sale_date TEXT);
+        CREATE TABLE products (product_id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE bookkeeping (x INTEGER);
+        """
+    )
+    conn.executemany(
+        "INSERT INTO sales VALUES (?, ?, ?, ?)",
+        [
+            (i, None if i % 10 == 0 else ("North", "South", "North", "East")[i % 4], i % 7, f"2023-{i % 12 + 1:02d}-01")
+            for i in range(1, 101)
+        ],
+    )
+    conn.executemany("INSERT INTO products VALUES (?, ?)", [(i, f"p{i}") for i in range(1, 6)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_table_stats(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        stats = compute_table_stats(conn, "sales", top_k=2, buckets=4)
+    finally:
+        conn.close()
+
+    assert stats["rows"] == 100
+    columns = stats["columns"]
+    assert (columns["sale_id"]["distinct"], columns["sale_id"]["top_values"]) == (100, [])
+    region = columns["region"]
+    assert (region["kind"], region["null_frac"], region["distinct"]) == ("other", 0.1, 3)
+    assert region["top_values"] == [["North", 40], ["East", 25]] and "histogram" not in region
+
+    quantity = columns["quantity"]
+    assert (quantity["kind"], quantity["min"], quantity["max"]) == ("numeric", 0, 6)
+    assert [bucket[2] for bucket in quantity["histogram"]] == [25, 25, 25, 25]
+    assert columns["sale_date"]["kind"] == "date"
+    assert columns["sale_date"]["histogram"][0][0] == "2023-01-01"
+
+
+def test_store_recomputes_only_changed_tables(db_path):
+    store = ColumnStatsStore(
+        lambda: sqlite3.connect(db_path), version=lambda: version, interval=60, exclude=["BOOKKEEPING"]
+    )
+    version = 1
+
+    def write(sql):
+        conn = sqlite3.connect(db_path)
+        conn.execute(sql)
+        conn.commit()
+        conn.close()
+
+    try:
+        store.refresh()
+        assert sorted(store.get()) == ["products", "sales"]
+        assert store.stats()["tables_computed"] == 2 and store.is_current()
+
+        write("INSERT INTO products VALUES (6, 'p6')")
+        store.refresh()
+        # Nothing is read until the data version moves
+        assert store.get("products")["products"]["rows"] == 5
+
+        version = 2
+        store.refresh()
+        assert store.get("PRODUCTS")["products"]["rows"] == 6
+        assert (store.stats()["tables_computed"], store.stats()["tables_unchanged"]) == (3, 1)
+
+        write("DROP TABLE sales")
+        version = 3
+        store.refresh()
+        assert list(store.get()) == ["products"]
+    finally:
+        store.close()
+
+
+def test_format_stats_outline(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        stats = compute_table_stats(conn, "products")
+    finally:
+        conn.close()
+
+    assert format_stats({"products": stats}) == "\n".join([
+        "products (5 rows)",
+        "  - product_id INTEGER: 0% null, 5 distinct, range 1..5, bucket upper bounds 1 | 2 | 3 | 4",
+        "  - name TEXT: 0% null, 5 distinct, range 'p1'..'p5'",
+    ])
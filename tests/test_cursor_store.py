@@ -0,0 +1,81 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from cursor_store import CursorStore
+from db_pool import QueryGuard
+from mcp_server import DatabaseMCPServer
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "cursors.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def store(db_path):
+    store = CursorStore(lambda: sqlite3.connect(db_path), max_cursors=2)
+    yield store
+    store.close()
+
+
+def test_pages_end_with_the_last_row(store):
+    token, cursor = store.open("SELECT x FROM t ORDER BY x", page_size=5)
+    assert store.fetch(token, cursor, 5) == ([(i,) for i in range(5)], False)
+    # The read-ahead row tells an exactly full last page apart from a longer result
+    assert store.fetch(token, cursor, 5) == ([(i,) for i in range(5, 10)], True)
+    assert cursor.closed and store.get(token) is None and len(store) == 0
+
+
+def test_guarded_fetch_of_the_last_page_closes_the_cursor(store):
+    token, cursor = store.open("SELECT x FROM t", page_size=20, guard=QueryGuard(5_000))
+    assert store.fetch(token, cursor, 20, guard=QueryGuard(5_000)) == ([(i,) for i in range(10)], True)
+    assert cursor.closed and len(store) == 0
+
+def test_least_recently_used_cursor_is_evicted(store):
+    first, first_cursor = store.open("SELECT x FROM t", page_size=1)
+    second, _ = store.open("SELECT x FROM t", page_size=1)
+    assert store.get(first) is first_cursor
+    third, _ = store.open("SELECT x FROM t", page_size=1)
+    assert store.get(second) is None
+    assert store.get(first) is not None and store.get(third) is not None
+
+
+def test_expired_cursor_is_closed(store):
+    store.ttl_seconds = 0
+    token, cursor = store.open("SELECT x FROM t", page_size=1)
+    assert store.get(token) is None and cursor.closed
+    with pytest.raises(LookupError):
+        store.fetch(token, cursor, 1)
+
+
+def test_query_page_and_fetch_next_read_the_whole_result(db_path):
+    server = DatabaseMCPServer(db_path=db_path, pool_size=1, max_workers=1, stats_interval=0)
+
+    async def scenario():
+        contents = await server._query_page("SELECT x FROM t ORDER BY x", 4, fmt="jsonl")
+        pages = [contents]
+        while json.loads(contents[1].text)["has_more"]:
+            contents = await server._fetch_next(json.loads(contents[1].text)["cursor"])
+            pages.append(contents)
+        gone = await server._fetch_next(json.loads(pages[0][1].text)["cursor"])
+        return pages, gone[0].text
+
+    try:
+        pages, gone = asyncio.run(scenario())
+    finally:
+        server.close()
+
+    rows = [json.loads(line)["x"] for contents in pages for line in contents[0].text.splitlines()]
+    assert rows == list(range(10))
+    assert [json.loads(contents[1].text)["rows_fetched"] for contents in pages] == [4, 8, 10]
+    assert json.loads(pages[-1][1].text)["cursor"] is None
+    assert gone == "Cursor fetch error: Unknown or expired cursor"
@@ -0,0 +1,116 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from db_pool import QueryCancelled, QueryExecutor, QueryGuard, SQLiteConnectionPool, engine_pragmas
+
+# Runs until interrupted
+ENDLESS = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "pool.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_statement_cache_counts_only_client_statements(db_path):
+    pool = SQLiteConnectionPool(
+        db_path, size=1, pragmas={"cache_size": -2048}, read_only=True, health_check_interval=0
+    )
+    try:
+        with pool.connection() as conn:
+            for value in range(3):
+                conn.execute("SELECT COUNT(*) FROM t WHERE x > ?", (value,)).fetchone()
+            conn.execute("PRAGMA schema_version").fetchone()
+        # The idle connection is health-checked on the next acquire
+        with pool.connection() as conn:
+            conn.execute("SELECT COUNT(*) FROM t WHERE x > ?", (5,)).fetchone()
+        assert pool.statement_cache.stats() == {"hits": 3, "misses": 1, "hit_rate": 0.75}
+    finally:
+        pool.close()
+
+
+def test_engine_profile_is_applied_to_pooled_connections(db_path):
+    pragmas = engine_pragmas("WAL", "NORMAL", -2048, 0, "MEMORY")
+    assert list(pragmas)[0] == "journal_mode"
+    assert "journal_mode" not in engine_pragmas("WAL", "NORMAL", read_only=True)
+
+    pool = SQLiteConnectionPool(db_path, size=1, pragmas=pragmas, health_check_interval=0)
+    try:
+        with pool.connection() as conn:
+            settings = [conn.execute(f"PRAGMA {name}").fetchone()[0] for name in pragmas]
+        assert settings == ["wal", 1, -2048, 0, 2]
+    finally:
+        pool.close()
+
+
+def test_pragma_values_are_not_interpolated_unchecked(db_path):
+    pool = SQLiteConnectionPool(db_path, size=1, pragmas={"cache_size": "0; DROP TABLE t"}, health_check_interval=0)
+    try:
+        with pytest.raises(ValueError, match="Invalid PRAGMA setting"):
+            with pool.connection():
+                pass
+    finally:
+        pool.close()
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (10,)
+    conn.close()
+
+def test_guard_interrupts_statement_at_deadline(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        with pytest.raises(QueryCancelled, match=r"\(timeout\)"):
+            with QueryGuard(50).watch(conn):
+                conn.execute(ENDLESS).fetchone()
+        # The connection stays usable once the guard is gone
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (10,)
+    finally:
+        conn.close()
+
+
+def test_guard_cancel_interrupts_running_statement(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    guard = QueryGuard()
+    timer = threading.Timer(0.05, guard.cancel)
+    timer.start()
+    try:
+        with pytest.raises(QueryCancelled, match="cancelled by client"):
+            with guard.watch(conn):
+                conn.execute(ENDLESS).fetchone()
+    finally:
+        timer.cancel()
+        conn.close()
+
+
+def test_executor_cancels_guard_of_cancelled_task(db_path):
+    pool = SQLiteConnectionPool(db_path, size=1, read_only=True)
+    executor = QueryExecutor(pool, max_workers=1)
+    guard = QueryGuard()
+
+    def endless(conn):
+        with guard.watch(conn):
+            return conn.execute(ENDLESS).fetchone()
+
+    async def scenario():
+        task = asyncio.ensure_future(executor.run(endless, guard=guard))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The worker is free again rather than stuck on the abandoned statement
+        return await asyncio.wait_for(executor.run(lambda conn: conn.execute("SELECT 1").fetchone()), 5)
+
+    try:
+        assert asyncio.run(scenario()) == (1,)
+        assert guard.cancelled
+    finally:
+        executor.shutdown()
+        pool.close()
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from mcp_client import DatabaseMCPClient
+
+SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mcp_server.py")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server_url(tmp_path):
+    db_path = str(tmp_path / "http.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(100)])
+    conn.commit()
+    conn.close()
+
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, SERVER, "--db-path", db_path, "--transport", "http", "--port", str(port),
+         "--stats-interval", "0"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 20
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    pytest.fail("HTTP server did not start")
+                time.sleep(0.1)
+        yield f"http://127.0.0.1:{port}/mcp"
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def test_clients_share_one_warm_server(server_url):
+    async def session(query):
+        async with DatabaseMCPClient(server_url=server_url) as client:
+            frame = await client.query_dataframe(query)
+            stream = client.stream_query("SELECT x FROM t ORDER BY x", format="csv", chunk_rows=30)
+            chunks = [chunk async for chunk in stream]
+        return frame, chunks, stream.summary
+
+    first, chunks, summary = asyncio.run(session("SELECT SUM(x) AS total FROM t"))
+    second, _, _ = asyncio.run(session("select sum(x) as total from t"))
+
+    assert first["total"].tolist() == second["total"].tolist() == [4950]
+    # The second session is served from the cache the first one filled
+    assert (first.attrs["cached"], second.attrs["cached"]) == (False, True)
+    # Progress notifications arrive over server-sent events
+    assert "".join(chunks).split()[1:] == [str(x) for x in range(100)]
+    assert (summary["rows_streamed"], summary["chunks"]) == (100, 4)
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+from mcp.server.lowlevel.server import request_ctx
+
+from mcp_server import DatabaseMCPServer, describe_schema
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "server.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(100)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def server(db_path):
+    server = DatabaseMCPServer(db_path=db_path, pool_size=1, max_workers=1, stats_interval=0)
+    yield server
+    server.close()
+
+
+def text(contents):
+    return contents[0].text
+
+
+def test_schema_is_cached_until_ddl_from_any_connection(server, db_path):
+    first = text(asyncio.run(server._get_schema()))
+    assert text(asyncio.run(server._get_schema())) == first
+    assert (server._schema_cache_hits, server._schema_cache_misses) == (1, 1)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE added (y TEXT)")
+    conn.close()
+    updated = text(asyncio.run(server._get_schema()))
+    assert "Table: added" not in first and "Table: added\n- y (TEXT) NULL" in updated
+    assert server._schema_cache_misses == 2
+
+def test_schema_lists_columns_indexes_and_composite_foreign_keys():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(
+        """
+        CREATE TABLE regions (code TEXT, country TEXT, name TEXT NOT NULL, PRIMARY KEY (code, country));
+        CREATE TABLE stores (store_id INTEGER PRIMARY KEY, code TEXT, country TEXT, opened DATE,
+                             FOREIGN KEY (code, country) REFERENCES regions (code, country));
+        CREATE UNIQUE INDEX stores_code ON stores (code, country);
+        CREATE INDEX stores_open ON stores (opened) WHERE opened IS NOT NULL;
+        """
+    )
+    try:
+        assert describe_schema(conn, exclude=["REGIONS"]) == "\n".join([
+            "",
+            "Table: stores",
+            "- store_id (INTEGER) NULL PRIMARY KEY",
+            "- code (TEXT) NULL",
+            "- country (TEXT) NULL",
+            "- opened (DATE) NULL",
+            "- INDEX stores_open ON (opened) (partial)",
+            "- UNIQUE INDEX stores_code ON (code, country)",
+            "- FOREIGN KEY (code, country) REFERENCES regions (code, country)",
+        ])
+        assert "- code (TEXT) NULL PRIMARY KEY\n- country (TEXT) NULL PRIMARY KEY" in describe_schema(conn)
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize("mode", ["read_only", "immutable"])
+def test_read_only_modes_refuse_writes(db_path, mode):
+    server = DatabaseMCPServer(db_path=db_path, pool_size=1, max_workers=1, stats_interval=0, **{mode: True})
+    try:
+        rejected = text(asyncio.run(server._query_database("INSERT INTO t VALUES (100)")))
+        count = text(asyncio.run(server._query_database("SELECT COUNT(*) FROM t")))
+    finally:
+        server.close()
+
+    assert rejected == "Database query error: attempt to write a readonly database"
+    assert count.endswith("100")
+
+# Runs far longer than the test timeouts below
+SLOW_QUERY = "WITH RECURSIVE c(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM c) SELECT COUNT(*) FROM c"
+
+
+def test_event_loop_keeps_running_during_a_query(server):
+    async def scenario():
+        query = asyncio.create_task(server._query_database(SLOW_QUERY, timeout_ms=300))
+        ticks = 0
+        while not query.done():
+            await asyncio.sleep(0.01)
+            ticks += 1
+        return ticks, text(query.result())
+
+    ticks, result = asyncio.run(scenario())
+    assert ticks >= 10
+    assert result.startswith("Query cancelled") and "timeout" in result
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_batch_returns_every_outcome_in_order(server, parallel):
+    queries = ["SELECT COUNT(*) FROM t WHERE x < ?", "SELECT * FROM missing", "SELECT MAX(x) FROM t"]
+    batch = json.loads(text(asyncio.run(
+        server._query_batch(queries, parallel=parallel, fmt="csv", params=[[10], None, None])
+    )))
+    assert (batch["mode"], batch["statements"], batch["failed"]) == ("parallel" if parallel else "snapshot", 3, 1)
+    results = batch["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert results[0]["result"] == "COUNT(*)\n10\n" and results[2]["result"] == "MAX(x)\n99\n"
+    assert results[1]["error"] == "Database query error: no such table: missing"
+
+
+def test_batch_deadline_skips_remaining_statements(server):
+    batch = json.loads(text(asyncio.run(
+        server._query_batch([SLOW_QUERY, "SELECT 1"], timeout_ms=100)
+    )))
+    first, second = batch["results"]
+    assert first["error"].startswith("Query cancelled") and not second["ok"]
+    assert second["error"] == "Skipped: batch deadline exceeded or cancelled"
+
+    invalid = text(asyncio.run(server._query_batch(["SELECT 1"], params=[[1], [2]])))
+    assert invalid == "Database query error: params must be a list with one entry per query"
+
+def test_profile_query_rejects_writes_and_restores_the_connection(server):
+    async def scenario():
+        rejected = text(await server._profile_query("DELETE FROM t"))
+        profile = json.loads(text(await server._profile_query("SELECT x FROM t WHERE x < ?", params=[10])))
+        return rejected, profile
+
+    rejected, profile = asyncio.run(scenario())
+    assert "only runs read-only statements" in rejected
+    assert (profile["rows_produced"], profile["rollup"], profile["routed"]) == (10, False, False)
+    with server.pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (100,)
+        assert conn.execute("PRAGMA query_only").fetchone() == (0,)
+
+
+def test_profile_reports_the_fastest_run_and_work_done(db_path):
+    server = DatabaseMCPServer(db_path=db_path, pool_size=1, max_workers=1, stats_interval=0, max_result_rows=5)
+    try:
+        small = json.loads(text(asyncio.run(server._profile_query("SELECT x FROM t", runs=50))))
+        large = json.loads(text(asyncio.run(server._profile_query(
+            "WITH RECURSIVE c(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM c WHERE n < 10000) SELECT COUNT(*) FROM c"
+        ))))
+    finally:
+        server.close()
+
+    assert small["runs"] == len(small["wall_ms_all"]) == 10
+    assert small["wall_ms"] == min(small["wall_ms_all"])
+    # Every row is stepped through, only the budget is formatted
+    assert (small["rows_produced"], small["rows_formatted"], small["truncated"]) == (100, 5, True)
+    assert 0 < small["vm_steps"] < large["vm_steps"]
+
+def test_truncated_columns_result_carries_its_metadata(db_path):
+    server = DatabaseMCPServer(db_path=db_path, pool_size=1, max_workers=1, stats_interval=0, max_result_rows=5)
+    try:
+        contents = asyncio.run(server._query_database("SELECT x FROM t", fmt="json-columns"))
+    finally:
+        server.close()
+
+    payload = json.loads(contents[0].text)
+    metadata = json.loads(contents[1].text)
+    assert payload["data"] == [[0, 1, 2, 3, 4]]
+    assert (metadata["rows_returned"], metadata["truncated"]) == (5, True)
+
+
+def test_rollup_rewrite_for_worker_processes_runs_under_the_deadline(db_path):
+    server = DatabaseMCPServer(
+        db_path=db_path, pool_size=1, max_workers=1, stats_interval=0, rollups="incremental", processes=1
+    )
+    rewrite = server.rollups.rewrite
+
+    def slow_rewrite(query):
+        time.sleep(0.2)
+        return rewrite(query)
+
+    server.rollups.rewrite = slow_rewrite
+    try:
+        cancelled = text(asyncio.run(server._query_database("SELECT COUNT(*) FROM t", timeout_ms=50)))
+        answered = text(asyncio.run(server._query_database("SELECT COUNT(*) FROM t", timeout_ms=5_000)))
+    finally:
+        server.close()
+
+    assert cancelled.startswith("Query cancelled") and "timeout" in cancelled
+    assert answered.endswith("100")
+
+
+class ProgressSession:
+    """Stands in for the MCP session, recording the chunks a stream sends."""
+
+    def __init__(self, on_chunk=None):
+        self.chunks = []
+        self.on_chunk = on_chunk
+
+    async def send_progress_notification(self, token, progress, message=None, related_request_id=None):
+        self.chunks.append(message)
+        if self.on_chunk is not None:
+            await self.on_chunk()
+
+
+def stream(server, session, **arguments):
+    context = SimpleNamespace(meta=SimpleNamespace(progressToken="progress"), session=session, request_id=1)
+
+    async def scenario():
+        request_ctx.set(context)
+        return text(await server._stream_query("SELECT x FROM t ORDER BY x", fmt="jsonl", **arguments))
+
+    return asyncio.run(scenario())
+
+
+def test_stream_sends_chunks_and_stops_at_max_rows(server):
+    session = ProgressSession()
+    summary = json.loads(stream(server, session, chunk_rows=10, max_rows=25))
+    rows = [json.loads(line)["x"] for chunk in session.chunks for line in chunk.splitlines()]
+    assert rows == list(range(25))
+    assert (summary["rows_streamed"], summary["chunks"], summary["truncated"]) == (25, 3, True)
+
+
+def test_cancel_stream_stops_the_query_and_frees_the_connection(server):
+    async def cancel():
+        assert json.loads(text(await server._cancel_stream("s1"))) == {"cancelled": True}
+
+    session = ProgressSession(cancel)
+    result = stream(server, session, chunk_rows=5, stream_id="s1")
+    assert result.startswith("Query cancelled") and "cancelled by client" in result
+    assert len(session.chunks) == 1 and server._streams == {}
+    assert json.loads(text(asyncio.run(server._cancel_stream("s1")))) == {"cancelled": False}
+    assert text(asyncio.run(server._query_database("SELECT COUNT(*) FROM t"))).endswith("100")
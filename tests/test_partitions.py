@@ -0,0 +1,117 @@
+import os
+import sqlite3
+
+import pytest
+
+from partitions import MANIFEST_DDL, MANIFEST_TABLE, PartitionRouter, Unroutable, load_partitions
+from setup_db import SALES_DDL, partition_dir, write_partitions
+
+QUERIES = [
+    "SELECT * FROM sales",
+    "SELECT * FROM sales WHERE sale_date >= '2023-03-01' ORDER BY sale_id",
+    "SELECT region, SUM(quantity) AS q, AVG(quantity), COUNT(*) FROM sales GROUP BY region ORDER BY region",
+    "SELECT p.category, SUM(s.quantity * p.price) AS revenue FROM sales s JOIN products p "
+    "ON p.product_id = s.product_id WHERE s.sale_date BETWEEN '2023-02-01' AND '2023-04-30' "
+    "GROUP BY p.category ORDER BY revenue DESC",
+    "SELECT COUNT(*), MIN(sale_date), MAX(sale_date) FROM sales",
+    "SELECT * FROM sales ORDER BY quantity DESC, sale_id LIMIT 3",
+    "SELECT * FROM sales WHERE sale_date = '2025-01-01'",
+]
+
+
+@pytest.fixture
+def router(tmp_path):
+    db_path = str(tmp_path / "sales.db")
+    sales = [
+        (i, i % 6 + 1, i % 5 + 1, f"2023-{i % 6 + 1:02d}-{i % 28 + 1:02d}", ("North", "South", "East", "West")[i % 4])
+        for i in range(1, 2001)
+    ]
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE products (product_id INTEGER PRIMARY KEY, name TEXT, category TEXT, price REAL)")
+    conn.executemany(
+        "INSERT INTO products VALUES (?, ?, ?, ?)",
+        [(i, f"p{i}", ("Electronics", "Furniture", "Stationery")[i % 3], 2.5 * i) for i in range(1, 7)],
+    )
+    conn.execute(SALES_DDL)
+    conn.execute(MANIFEST_DDL)
+    conn.executemany(
+        f"INSERT INTO {MANIFEST_TABLE} (name, path, lower_bound, upper_bound) VALUES (?, ?, ?, ?)",
+        write_partitions(db_path, sales, "month"),
+    )
+    conn.commit()
+    conn.close()
+
+    router = PartitionRouter(db_path, load_partitions(db_path), max_workers=2)
+    yield router
+    router.close()
+
+
+def _normalized(rows, ordered):
+    rows = [tuple(round(value, 6) if isinstance(value, float) else value for value in row) for row in rows]
+    return rows if ordered else sorted(rows, key=repr)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_routed_query_matches_sales_view(router, query):
+    conn = sqlite3.connect(router.db_path)
+    router.attach(conn)
+    try:
+        expected = conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
+    routed = router.route(query)
+    assert routed is not None
+    with router.open_result(routed, max_rows=10_000) as cursor:
+        actual = cursor.fetchall()
+
+    assert _normalized(actual, "ORDER BY" in query) == _normalized(expected, "ORDER BY" in query)
+
+
+def test_date_filter_prunes_partitions(router):
+    routed = router.route("SELECT COUNT(*) FROM sales WHERE sale_date >= '2023-05-01'")
+    with router.open_result(routed) as cursor:
+        assert cursor.fetchone() == (666,)
+    assert router.stats()["partitions_pruned"] == 4
+
+
+def test_ordered_row_query_reads_at_most_max_rows_per_partition(router):
+    query = "SELECT sale_id, quantity FROM sales ORDER BY quantity DESC, sale_id"
+    conn = sqlite3.connect(router.db_path)
+    router.attach(conn)
+    try:
+        expected = conn.execute(query + " LIMIT 11").fetchall()
+    finally:
+        conn.close()
+
+    routed = router.route(query)
+    scanned = []
+    scan = router._scan
+
+    def counting_scan(*args):
+        names, rows = scan(*args)
+        scanned.append(len(rows))
+        return names, rows
+
+    router._scan = counting_scan
+    with router.open_result(routed, max_rows=11) as cursor:
+        assert cursor.fetchmany(11) == expected
+    assert len(scanned) == 6 and max(scanned) == 11
+
+
+def test_row_query_without_limit_is_left_to_the_view(router):
+    routed = router.route("SELECT * FROM sales ORDER BY sale_id")
+    with pytest.raises(Unroutable):
+        with router.open_result(routed):
+            pass
+    # Sorting on a column the merge cannot see is not routed at all
+    assert router.route("SELECT sale_id FROM sales ORDER BY quantity") is None
+
+
+def test_layout_beyond_attach_limit_is_refused(tmp_path):
+    db_path = str(tmp_path / "sales.db")
+    sales = [(month, 1, 1, f"2023-{month:02d}-01", "North") for month in range(1, 13)]
+    with pytest.raises(ValueError, match="coarser --partition"):
+        write_partitions(db_path, sales, "month")
+    assert not os.path.exists(partition_dir(db_path))
+    assert len(write_partitions(db_path, sales, "year")) == 1
@@ -0,0 +1,70 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from db_pool import QueryCancelled, QueryGuard
+from process_pool import ProcessQueryPool
+
+# Runs until interrupted
+ENDLESS = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+# Long enough for the worker to poll its cancellation flag
+COUNT = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000) SELECT COUNT(*) FROM n"
+
+
+@pytest.fixture
+def pool(tmp_path):
+    path = str(tmp_path / "pool.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    conn.commit()
+    conn.close()
+    pool = ProcessQueryPool(path, 1)
+    yield pool
+    pool.close()
+
+
+def run(pool, query, timeout_ms=None):
+    return pool.run(query, (), 100, 1 << 20, "text", QueryGuard(timeout_ms))
+
+
+def test_cancel_after_completion_does_not_cancel_next_call(pool):
+    async def scenario():
+        await run(pool, "SELECT 1")
+        task = asyncio.ensure_future(run(pool, "SELECT COUNT(*) FROM t"))
+        await asyncio.sleep(0)
+        # Block the loop until the worker is done and the slot is free again, then
+        # cancel before the task sees the result
+        while pool.stats()["in_flight"]:
+            time.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The next call gets the same slot
+        return await run(pool, COUNT, timeout_ms=10_000)
+
+    result = asyncio.run(scenario())
+    assert result.text.splitlines()[-1] == "100000"
+    assert pool.stats()["cancelled"] == 1
+
+
+def test_client_cancel_stops_running_statement(pool):
+    async def scenario():
+        task = asyncio.ensure_future(run(pool, ENDLESS))
+        await asyncio.sleep(1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await run(pool, "SELECT COUNT(*) FROM t", timeout_ms=10_000)
+
+    result = asyncio.run(scenario())
+    assert result.text.splitlines()[-1] == "10"
+
+
+def test_deadline_counts_as_timeout(pool):
+    with pytest.raises(QueryCancelled):
+        asyncio.run(run(pool, ENDLESS, timeout_ms=200))
+    stats = pool.stats()
+    assert (stats["timed_out"], stats["failed"], stats["in_flight"]) == (1, 0, 0)
@@ -0,0 +1,77 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from mcp_server import DatabaseMCPServer
+from query_cache import DataVersionMonitor, ResultCache, is_volatile, normalize_sql
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "cache.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def query(server, sql):
+    contents = asyncio.run(server._query_database(sql))
+    return contents[0].text, json.loads(contents[1].text)["cached"]
+
+
+def test_normalized_sql_keeps_literals():
+    assert normalize_sql("SELECT  *\nFROM t -- all\nWHERE r = 'North';") == "select * from t where r = 'North'"
+    assert normalize_sql("select * from t where r = 'north'") != normalize_sql("SELECT * FROM t WHERE r = 'North'")
+    assert is_volatile(normalize_sql("SELECT RANDOM() FROM t"))
+
+
+def test_write_from_another_connection_invalidates_cached_results(db_path):
+    server = DatabaseMCPServer(db_path=db_path, pool_size=1, max_workers=1, stats_interval=0)
+    try:
+        first = query(server, "SELECT COUNT(*) FROM t")
+        second = query(server, "select count(*)  from t;")
+
+        writer = sqlite3.connect(db_path)
+        writer.execute("INSERT INTO t VALUES (10)")
+        writer.commit()
+        writer.close()
+        after_write = query(server, "SELECT COUNT(*) FROM t")
+    finally:
+        server.close()
+
+    assert first[1] is False and second == (first[0], True)
+    assert after_write[1] is False and after_write[0].endswith("11")
+
+
+def test_data_version_token_moves_on_commit(db_path):
+    monitor = DataVersionMonitor(lambda: sqlite3.connect(db_path), db_path)
+    try:
+        before = monitor.token()
+        assert monitor.token() == before
+        writer = sqlite3.connect(db_path)
+        writer.execute("DELETE FROM t")
+        writer.commit()
+        writer.close()
+        assert monitor.token() != before
+    finally:
+        monitor.close()
+
+
+def test_entries_are_dropped_on_version_change_and_evicted_by_size():
+    cache = ResultCache(max_bytes=10)
+    cache.put("a", 1, "A", 4)
+    cache.put("b", 1, "B", 4)
+    assert cache.get("a", 1) == "A"
+    cache.put("c", 1, "C", 4)
+    # "b" was least recently used
+    assert (cache.get("b", 1), cache.get("a", 1), cache.get("c", 1)) == (None, "A", "C")
+
+    assert cache.get("a", 2) is None
+    assert cache.stats()["invalidations"] == 1 and cache.stats()["entries"] == 0
+    cache.put("huge", 2, "H", 11)
+    assert cache.get("huge", 2) is None
@@ -0,0 +1,76 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from mcp_server import DatabaseMCPServer
+from replica import MemoryReplica
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "replica.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def insert(db_path, value):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO t VALUES (?)", (value,))
+    conn.commit()
+    conn.close()
+
+
+class TargetConnection(sqlite3.Connection):
+    """Records the copy it opened, as pooled connections do."""
+
+    target = None
+
+
+def connect(replica):
+    conn = sqlite3.connect(replica.target(), uri=True, factory=TargetConnection)
+    conn.target = replica.target()
+    return conn
+
+
+def test_copy_is_swapped_only_when_the_file_changes(db_path):
+    replica = MemoryReplica(db_path, interval=60)
+    try:
+        assert replica.refresh(force=True) and not replica.refresh()
+        old = connect(replica)
+        token = replica.token()
+
+        insert(db_path, 10)
+        assert replica.refresh() and replica.token() != token
+        new = connect(replica)
+        # Connections opened earlier keep reading the copy they started on
+        assert old.execute("SELECT COUNT(*) FROM t").fetchone() == (10,) and not replica.is_current(old)
+        assert new.execute("SELECT COUNT(*) FROM t").fetchone() == (11,) and replica.is_current(new)
+        old.close()
+        new.close()
+    finally:
+        replica.close()
+
+
+def test_server_answers_from_the_replica_until_it_is_refreshed(db_path):
+    server = DatabaseMCPServer(
+        db_path=db_path, pool_size=1, max_workers=1, stats_interval=0, replica=True, replica_interval=60
+    )
+
+    def count():
+        return asyncio.run(server._query_database("SELECT COUNT(*) FROM t"))[0].text.splitlines()[-1]
+
+    try:
+        assert count() == "10"
+        insert(db_path, 10)
+        assert count() == "10"
+        server.replica.refresh()
+        assert count() == "11"
+        rejected = asyncio.run(server._query_database("DELETE FROM t"))[0].text
+    finally:
+        server.close()
+    assert rejected.startswith("Database query error")
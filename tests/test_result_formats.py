@@ -0,0 +1,88 @@
+import json
+import sqlite3
+
+import pytest
+
+from result_formats import DeclaredTypes, execute_formatted
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(
+        """
+        CREATE TABLE sales (sale_id INTEGER PRIMARY KEY, region TEXT, quantity INTEGER, price REAL);
+        INSERT INTO sales VALUES (1, 'North', 1, 2.5), (2, 'North', 2, 3.0), (3, 'South', 2, 1.5),
+                                 (4, 'South', 3, NULL), (5, 'East', 4, 4.0);
+        """
+    )
+    yield conn
+    conn.close()
+
+
+def json_columns(conn, query):
+    result = execute_formatted(conn, query, (), "json-columns", declared_types=DeclaredTypes())
+    return json.loads(result.text)
+
+
+def test_json_columns_declared_types(conn):
+    document = json_columns(conn, "SELECT sale_id, region, quantity, price FROM sales")
+    assert document["types"] == ["INTEGER", "TEXT", "INTEGER", "REAL"]
+
+
+def test_json_columns_aliased_expression_is_typed_by_value(conn):
+    document = json_columns(conn, "SELECT region, AVG(quantity) AS quantity FROM sales GROUP BY region ORDER BY region")
+    assert document["types"] == ["TEXT", "REAL"]
+    assert document["data"][1] == [4.0, 1.5, 2.5]
+
+
+def test_json_columns_computed_columns_are_inferred(conn):
+    document = json_columns(conn, "SELECT COUNT(*) AS n, GROUP_CONCAT(region) AS regions, NULL AS missing FROM sales")
+    assert document["types"] == ["INTEGER", "TEXT", None]
+
+
+
+def test_json_columns_header_counts_against_max_bytes(conn):
+    query = "SELECT sale_id, region, COUNT(*) AS n FROM sales GROUP BY sale_id"
+    tiny = execute_formatted(conn, query, (), "json-columns", max_bytes=10, declared_types=DeclaredTypes())
+    assert (tiny.rows_returned, tiny.truncated, tiny.max_bytes_exceeded) == (0, True, True)
+    assert tiny.bytes_returned == len(tiny.text.encode("utf-8")) > 10
+
+    # Inferred types are longer than the NULL they start from, and still fit the budget
+    budget = len(execute_formatted(conn, query + " LIMIT 2", (), "json-columns").text.encode("utf-8"))
+    for max_bytes in range(budget - 20, budget + 20):
+        result = execute_formatted(conn, query, (), "json-columns", max_bytes=max_bytes)
+        assert result.bytes_returned == len(result.text.encode("utf-8"))
+        assert result.bytes_returned <= max_bytes and not result.max_bytes_exceeded
+
+def arrow_table(conn, query):
+    pa = pytest.importorskip("pyarrow")
+    result = execute_formatted(conn, query, (), "arrow", declared_types=DeclaredTypes())
+    return pa.ipc.open_stream(result.payload).read_all()
+
+
+def test_arrow_declared_types(conn):
+    table = arrow_table(conn, "SELECT sale_id, region, price FROM sales")
+    assert [str(field.type) for field in table.schema] == ["int64", "string", "double"]
+
+
+def test_arrow_aliased_expression_keeps_fractions(conn):
+    table = arrow_table(conn, "SELECT region, AVG(quantity) AS quantity FROM sales GROUP BY region ORDER BY region")
+    assert str(table.schema.field("quantity").type) == "double"
+    assert table.column("quantity").to_pylist() == [4.0, 1.5, 2.5]
+
+
+def test_arrow_integral_floats_are_not_typed_integer(conn):
+    table = arrow_table(conn, "SELECT CAST(quantity AS REAL) AS quantity FROM sales")
+    assert str(table.schema.field("quantity").type) == "double"
+
+
+def test_arrow_null_column_takes_declared_type(conn):
+    table = arrow_table(conn, "SELECT price FROM sales WHERE price IS NULL")
+    assert str(table.schema.field("price").type) == "double"
+    assert table.column("price").to_pylist() == [None]
+
+
+def test_arrow_mixed_storage_classes_fall_back_to_text(conn):
+    table = arrow_table(conn, "SELECT quantity FROM sales UNION ALL SELECT 'many'")
+    assert str(table.schema.field("quantity").type) == "string"
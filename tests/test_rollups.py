@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import time
+
+import pytest
+
+from rollups import INCREMENTAL, MODES, RollupManager, load_rollups, stored_tables
+
+QUERIES = [
+    "SELECT p.category, s.region, strftime('%Y-%m', s.sale_date) AS month, SUM(s.quantity), "
+    "SUM(s.quantity * p.price), COUNT(*) FROM sales AS s JOIN products AS p ON s.product_id = p.product_id "
+    "GROUP BY 1, 2, 3",
+    "SELECT region, SUM(quantity) FROM sales WHERE region <> 'East' GROUP BY region",
+    "SELECT product_id, COUNT(*), AVG(quantity) FROM sales GROUP BY product_id",
+    "SELECT substr(sale_date, 1, 7) AS m, SUM(quantity) FROM sales GROUP BY m",
+    "SELECT strftime('%Y-%m', sale_date) AS m, region, COUNT(*) FROM sales GROUP BY m, region",
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "rollups.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE products (product_id INTEGER PRIMARY KEY, name TEXT, category TEXT, price REAL);
+        CREATE TABLE sales (
+            sale_id INTEGER PRIMARY KEY, product_id INTEGER, quantity INTEGER, sale_date DATE, region TEXT
+        );
+        """
+    )
+    conn.executemany(
+        "INSERT INTO products VALUES (?, ?, ?, ?)",
+        [(i, f"p{i}", ("Electronics", "Furniture", "Stationery")[i % 3], 2.5 * i) for i in range(1, 7)],
+    )
+    conn.executemany(
+        "INSERT INTO sales (product_id, quantity, sale_date, region) VALUES (?, ?, ?, ?)",
+        [
+            (i % 6 + 1, i % 5 + 1, f"2023-{i % 12 + 1:02d}-{i % 28 + 1:02d}", ("North", "South", "East", "West")[i % 4])
+            for i in range(2000)
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture(params=MODES)
+def manager(request, db_path):
+    monitor = sqlite3.connect(db_path, check_same_thread=False)
+
+    def version():
+        return monitor.execute("PRAGMA data_version").fetchone()[0], os.stat(db_path).st_mtime_ns
+
+    manager = RollupManager(
+        lambda: sqlite3.connect(db_path, check_same_thread=False), load_rollups(), version, request.param
+    )
+    manager.refresh()
+    yield manager
+    manager.close()
+    monitor.close()
+
+
+def rows(conn, query):
+    return sorted((tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+                   for row in conn.execute(query)), key=repr)
+
+
+def assert_equivalent(manager, conn):
+    for query in QUERIES:
+        rewritten = manager.rewrite(query)
+        assert rewritten is not None, query
+        assert rows(conn, rewritten) == rows(conn, query), query
+
+
+@pytest.mark.parametrize(
+    "write",
+    [
+        "INSERT INTO sales (product_id, quantity, sale_date, region) "
+        "SELECT product_id, quantity, '2024-01-05', 'North' FROM sales LIMIT 300",
+        "UPDATE sales SET quantity = quantity + 10 WHERE region = 'North'",
+        "UPDATE sales SET region = 'East' WHERE sale_id % 7 = 0",
+        "DELETE FROM sales WHERE sale_id % 5 = 0",
+        "UPDATE products SET category = 'Furniture', price = price * 2 WHERE product_id = 1",
+        # strftime and substr disagree on dates that are not ISO text
+        "INSERT INTO sales (product_id, quantity, sale_date, region) VALUES (2, 4, '10/15/2023', 'West')",
+    ],
+)
+def test_rewritten_queries_match_base_query_after_writes(manager, db_path, write):
+    conn = sqlite3.connect(db_path)
+    try:
+        assert_equivalent(manager, conn)
+        conn.execute(write)
+        conn.commit()
+        manager.refresh()
+        assert_equivalent(manager, conn)
+    finally:
+        conn.close()
+
+
+def test_incremental_appends_inserts_without_rebuilding(db_path):
+    monitor = sqlite3.connect(db_path, check_same_thread=False)
+    manager = RollupManager(
+        lambda: sqlite3.connect(db_path, check_same_thread=False),
+        load_rollups(),
+        lambda: (monitor.execute("PRAGMA data_version").fetchone()[0], os.stat(db_path).st_mtime_ns),
+        INCREMENTAL,
+    )
+    manager.refresh()
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("INSERT INTO sales (product_id, quantity, sale_date, region) VALUES (1, 3, '2024-02-01', 'West')")
+        conn.commit()
+        manager.refresh()
+        assert_equivalent(manager, conn)
+        stats = manager.stats()["rollups"]["sales_by_category_region_month"]
+        assert (stats["rebuilds"], stats["rows_appended"]) == (1, 1)
+    finally:
+        conn.close()
+        manager.close()
+        monitor.close()
+
+
+def test_stored_tables_lists_rollup_bookkeeping(manager, db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        assert sorted(stored_tables(conn)) == sorted(manager.tables)
+    finally:
+        conn.close()
+
+
+def test_stale_rollup_is_skipped_until_background_refresh(manager, db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("INSERT INTO sales (product_id, quantity, sale_date, region) VALUES (1, 3, '2024-02-01', 'West')")
+        conn.commit()
+        # The query path never refreshes; it runs against the source tables instead
+        assert manager.rewrite(QUERIES[1]) is None
+        assert manager.stats()["stale"] == 1
+
+        manager.start()
+        deadline = time.monotonic() + 5
+        while manager.rewrite(QUERIES[1]) is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert_equivalent(manager, conn)
+    finally:
+        conn.close()
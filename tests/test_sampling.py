@@ -0,0 +1,66 @@
+import random
+import sqlite3
+
+import pytest
+
+from sampling import MAX_SAMPLE_ROWS, _fetch, sample_table
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(
+        """
+        CREATE TABLE sales (sale_id INTEGER PRIMARY KEY, region TEXT);
+        CREATE TABLE tags (name TEXT PRIMARY KEY, n INTEGER) WITHOUT ROWID;
+        CREATE TABLE empty (x INTEGER);
+        """
+    )
+    conn.executemany("INSERT INTO sales VALUES (?, ?)", [(i, f"r{i % 4}") for i in range(1, 10_001)])
+    conn.executemany("INSERT INTO tags VALUES (?, ?)", [(f"t{i}", i) for i in range(20)])
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("rows", [0, MAX_SAMPLE_ROWS + 1])
+def test_sample_size_out_of_range_is_refused(conn, rows):
+    with pytest.raises(ValueError, match="rows must be between"):
+        sample_table(conn, "sales", rows)
+
+
+def test_unknown_table_is_refused(conn):
+    with pytest.raises(ValueError, match="No such table"):
+        sample_table(conn, "missing")
+
+
+def test_sample_reads_a_few_keys_not_the_table(conn):
+    statements = []
+
+    def fetch(conn, sql):
+        statements.append(sql)
+        return _fetch(conn, sql)
+
+    columns, rows, method = sample_table(conn, "sales", 10, rng=random.Random(7), fetch=fetch)
+    assert (columns, method) == (["sale_id", "region"], "key_range")
+    assert len(rows) == 10 and len(set(rows)) == 10
+    assert rows == sorted(rows) and all(region == f"r{key % 4}" for key, region in rows)
+    # MIN, MAX and one IN lookup of at most 20 keys
+    assert len(statements) == 3 and statements[-1].count(",") <= 20
+
+
+def test_sparse_keys_still_fill_the_sample(conn):
+    conn.execute("DELETE FROM sales WHERE sale_id % 10 != 0")
+    for seed in range(20):
+        _, rows, _ = sample_table(conn, "sales", 5, rng=random.Random(seed))
+        assert len(rows) == len(set(rows)) == 5 and all(key % 10 == 0 for key, _ in rows)
+
+
+def test_small_and_keyless_tables(conn):
+    conn.execute("DELETE FROM sales WHERE sale_id > 3")
+    _, rows, method = sample_table(conn, "sales", 10)
+    assert (rows, method) == ([(1, "r1"), (2, "r2"), (3, "r3")], "key_range")
+
+    _, rows, method = sample_table(conn, "tags", 4)
+    assert (len(rows), method) == (4, "first_rows")
+
+    assert sample_table(conn, "empty", 5) == (["x"], [], "key_range")